@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+token 估算、成本核算与预算控制
+
+monitor.py 与 crawlers/hotwords_crawler.py 共用这一份单价和预算逻辑：
+热词爬虫以脚本方式运行时直接 import costs，monitor.py 通过 crawlers.costs 导入。
+"""
+
+import os
+import threading
+import time
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符约 1 个 token，其他字符约 4 个一个 token"""
+    text = text or ""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class CostBudget:
+    """
+    按平台单价把 token 用量折算为成本，并在派发查询前检查每日/单次预算
+    
+    监测和热词爬虫共用这一份单价与预算逻辑。调用前 reserve() 按预计用量预留额度，
+    预计会超出预算时拒绝并停止派发；已花费（含预留）超过预算的 soft_ratio 后，
+    每次派发前等待 throttle_delay 秒降低速度。调用完成后 settle() 按实际（或估算）
+    用量结算，并交给 on_usage 回调持久化。多线程并发调用时共享一把锁。
+    """
+    
+    # 每百万 token 单价（元）：(输入, 输出)，可用环境变量 {PLATFORM}_TOKEN_PRICE="输入,输出" 覆盖
+    PRICES = {
+        "kimi": (12.0, 12.0),
+        "doubao": (0.8, 2.0),
+        "qianwen": (2.4, 9.6),
+        "deepseek": (2.0, 8.0),
+        "wenxin": (30.0, 90.0),
+        "hunyuan": (0.8, 2.0),
+        "zhipu": (5.0, 5.0),
+        "yuanbao": (0.8, 2.0),
+    }
+    
+    def __init__(self, daily_budget=None, run_budget=None, spent_today=0.0,
+                 soft_ratio=0.8, throttle_delay=1.0, prices=None, on_usage=None):
+        self.daily_budget = daily_budget
+        self.run_budget = run_budget
+        self.soft_ratio = soft_ratio
+        self.throttle_delay = throttle_delay
+        self.prices = dict(self.env_prices(), **(prices or {}))
+        self._lock = threading.Lock()
+        self.begin_run(spent_today, on_usage)
+    
+    @classmethod
+    def env_prices(cls, env=None):
+        """内置单价，按环境变量 {PLATFORM}_TOKEN_PRICE 覆盖；格式不对时沿用内置值"""
+        env = os.environ if env is None else env
+        prices = {}
+        for platform, default in cls.PRICES.items():
+            value = env.get(f"{platform.upper()}_TOKEN_PRICE")
+            try:
+                prices[platform] = tuple(float(v) for v in value.split(",")) if value else default
+            except ValueError:
+                prices[platform] = default
+            if len(prices[platform]) != 2:
+                prices[platform] = default
+        return prices
+    
+    def begin_run(self, spent_today=0.0, on_usage=None):
+        """开始新的任务：重置本次花费，spent_today 为今天此前已记录的花费"""
+        with self._lock:
+            self.spent_today = spent_today
+            self.on_usage = on_usage
+            self.spent = 0.0
+            self.reserved = 0.0
+            self.calls = 0
+            self.estimated_calls = 0
+            self.rejected = 0
+            self.tokens = {"prompt": 0, "completion": 0}
+            self.completion_stats = {}
+            self.stopped = False
+    
+    def cost(self, platform, prompt_tokens, completion_tokens):
+        price_in, price_out = self.prices.get(platform, (0.0, 0.0))
+        return (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+    
+    def expected_cost(self, platform, prompt_tokens):
+        """预计成本，输出长度取该平台已完成调用的平均值，没有样本时按输入长度估计"""
+        total, count = self.completion_stats.get(platform, (0, 0))
+        completion = total / count if count else max(prompt_tokens, 100)
+        return self.cost(platform, prompt_tokens, completion)
+    
+    def headroom(self):
+        """(剩余额度, 已用比例)，已用含预留额度；未设置预算时返回 (None, 0)"""
+        used = self.spent + self.reserved
+        limits = []
+        if self.daily_budget:
+            limits.append((self.daily_budget, self.spent_today + used))
+        if self.run_budget:
+            limits.append((self.run_budget, used))
+        if not limits:
+            return None, 0.0
+        remaining = min(limit - used for limit, used in limits)
+        ratio = max(used / limit for limit, used in limits)
+        return remaining, ratio
+    
+    def reserve(self, platform, prompt_tokens):
+        """派发前预留额度，返回预留金额；超出预算时返回 None，接近上限时先等待再返回"""
+        with self._lock:
+            expected = self.expected_cost(platform, prompt_tokens)
+            remaining, ratio = self.headroom()
+            if remaining is not None and expected > remaining:
+                self.rejected += 1
+                self.stopped = True
+                return None
+            self.reserved += expected
+        
+        if ratio >= self.soft_ratio and self.throttle_delay:
+            time.sleep(self.throttle_delay)
+        return expected
+    
+    def settle(self, platform, reserved, prompt_tokens, completion_tokens, estimated=False, model=None):
+        """按实际用量结算一次调用并释放预留额度，返回用量记录"""
+        usage = {
+            "platform": platform,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self.cost(platform, prompt_tokens, completion_tokens),
+            "estimated": estimated,
+        }
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - reserved)
+            self.spent += usage["cost"]
+            self.calls += 1
+            self.estimated_calls += 1 if estimated else 0
+            self.tokens["prompt"] += prompt_tokens
+            self.tokens["completion"] += completion_tokens
+            total, count = self.completion_stats.get(platform, (0, 0))
+            self.completion_stats[platform] = (total + completion_tokens, count + 1)
+            on_usage = self.on_usage
+        if on_usage:
+            on_usage(usage)
+        return usage
+    
+    def release(self, reserved):
+        """调用未发生（如认证失败）时释放预留额度"""
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - reserved)
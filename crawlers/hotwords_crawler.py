@@ -11,9 +11,19 @@ import json
 import os
 import random
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Callable
 import time
 import logging
+import hashlib
+import sqlite3
+import threading
+import queue
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 成本记账与 monitor.py 共用同一份单价、token估算和预算逻辑
+from costs import CostBudget, estimate_tokens
+from minhash import MinHasher, MinHashIndex
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,33 +31,85 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ========== 飞书配置 - 从环境变量读取 ==========
-FEISHU_APP_ID = os.getenv('FEISHU_APP_ID')
-FEISHU_APP_SECRET = os.getenv('FEISHU_SECRET')
-FEISHU_BASE_ID = os.getenv('FEISHU_BASEID')
-TABLE_TRENDS = os.getenv('TABLE_TRENDS')
-TABLE_SKU = os.getenv('TABLE_SKU')
-
-# ========== AI平台API配置 ==========
-KIMI_API_KEY = os.getenv('KIMI_API_KEY')
-DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
-YUANBAO_API_KEY = os.getenv('YUANBAO_API_KEY')
-QIANWEN_API_KEY = os.getenv('QIANWEN_API_KEY')
-WENXIN_API_KEY = os.getenv('WENXIN_API_KEY')
-DOUBAO_API_KEY = os.getenv('DOUBAO_API_KEY')
-
-# 验证必要配置
-required_vars = [
-    ('FEISHU_APP_ID', FEISHU_APP_ID),
-    ('FEISHU_SECRET', FEISHU_APP_SECRET),
-    ('FEISHU_BASE_ID', FEISHU_BASE_ID),
-    ('TABLE_TRENDS', TABLE_TRENDS),
-]
+# 兼容OpenAI接口的平台: 平台ID -> (显示名称, 接口地址, 模型)
+AI_PLATFORM_ENDPOINTS = {
+    'kimi': ('Kimi', 'https://api.moonshot.cn/v1/chat/completions', 'kimi-chat'),
+    'deepseek': ('DeepSeek', 'https://api.deepseek.com/v1/chat/completions', 'deepseek-chat'),
+    'yuanbao': ('元宝', 'https://api.baichuan-ai.com/v1/chat/completions', 'Baichuan4'),
+    'qianwen': ('千问', 'https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions', 'qwen-turbo'),
+    'doubao': ('豆包', 'https://ark.cn-beijing.volces.com/api/v3/chat/completions', 'doubao-pro-32k'),
+}
+
+# 是否使用流式(SSE)响应，边接收边解析
+AI_STREAM = os.getenv('AI_STREAM', 'true').lower() not in ('0', 'false', 'no')
+
+# ========== AI分析分片配置 ==========
+# 每个分片提示词中原始数据部分的token预算（粗略估算）
+ANALYSIS_CHUNK_TOKENS = int(os.getenv('ANALYSIS_CHUNK_TOKENS', '1500'))
+# 并发分析的最大线程数
+ANALYSIS_MAX_WORKERS = int(os.getenv('ANALYSIS_MAX_WORKERS', '6'))
+
+# ========== AI分析缓存配置 ==========
+AI_CACHE_FILE = os.getenv('AI_CACHE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_cache.db'))
+# 缓存有效期（秒），默认24小时
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(24 * 3600)))
+# 缓存最大体积（字节），超出后按最近最少使用淘汰
+AI_CACHE_MAX_BYTES = int(os.getenv('AI_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# ========== 熔断器配置 ==========
+CIRCUIT_STATE_FILE = os.getenv('CIRCUIT_STATE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'circuit_state.json'))
+# 连续失败多少次后熔断
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+# 熔断冷却时间（秒），探测失败后翻倍，直到上限
+CIRCUIT_COOLDOWN = float(os.getenv('CIRCUIT_COOLDOWN', '1800'))
+CIRCUIT_MAX_COOLDOWN = float(os.getenv('CIRCUIT_MAX_COOLDOWN', str(24 * 3600)))
+
+# ========== 流水线配置 ==========
+# 各阶段之间队列的容量，队列满时上游阶段阻塞（背压）
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '100'))
+
+# AI平台ID -> 飞书中的平台来源名称
+AI_PLATFORM_LABELS = {
+    'kimi': 'Kimi',
+    'deepseek': 'DeepSeek',
+    'yuanbao': '元宝',
+    'qianwen': '千问',
+    'wenxin': '文心一言',
+    'doubao': '豆包',
+}
+
+# ========== 限流配置（按主机） ==========
+# 每秒请求数上限与令牌桶容量
+RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS', '5'))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '5'))
+# 初始并发数与并发上限（AIMD在两者之间自适应调整）
+RATE_LIMIT_CONCURRENCY = float(os.getenv('RATE_LIMIT_CONCURRENCY', '4'))
+RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv('RATE_LIMIT_MAX_CONCURRENCY', '8'))
+
+# ========== 本地存储配置 ==========
+# 热词本地库，默认与 monitor.db 放在同一目录
+HOTWORDS_DB_FILE = os.getenv('HOTWORDS_DB_FILE', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'hotwords.db'))
+# 批量写入的条数
+STORE_BATCH_SIZE = int(os.getenv('STORE_BATCH_SIZE', '200'))
 
-for var_name, var_value in required_vars:
-    if not var_value:
-        logger.error(f"缺少必要的环境变量: {var_name}")
-        raise ValueError(f"环境变量 {var_name} 未设置")
+# ========== 趋势计算配置 ==========
+# EWMA水平值与斜率的平滑系数
+TREND_ALPHA = float(os.getenv('TREND_ALPHA', '0.5'))
+TREND_BETA = float(os.getenv('TREND_BETA', '0.3'))
+# 相对斜率在 ±该比例内视为平稳
+TREND_FLAT_BAND = float(os.getenv('TREND_FLAT_BAND', '0.03'))
+# 热度相对水平值涨幅同时超过比例和绝对值时判定为飙升
+TREND_SURGE_RATIO = float(os.getenv('TREND_SURGE_RATIO', '0.4'))
+TREND_SURGE_MIN_DELTA = float(os.getenv('TREND_SURGE_MIN_DELTA', '15'))
+
+# ========== 成本与预算配置 ==========
+# 各平台token单价见 monitor.CostBudget.PRICES，可用 {PLATFORM}_TOKEN_PRICE="输入,输出" 覆盖
+# 每日与单次任务的成本上限（元），0 表示不限
+AI_DAILY_BUDGET = float(os.getenv('AI_DAILY_BUDGET', '0'))
+AI_RUN_BUDGET = float(os.getenv('AI_RUN_BUDGET', '0'))
+# 花费超过预算的该比例后，每次调用前等待 AI_BUDGET_THROTTLE_DELAY 秒降速
+AI_BUDGET_SOFT_RATIO = float(os.getenv('AI_BUDGET_SOFT_RATIO', '0.8'))
+AI_BUDGET_THROTTLE_DELAY = float(os.getenv('AI_BUDGET_THROTTLE_DELAY', '2'))
 
 # ========== 公开数据源配置 ==========
 PUBLIC_DATA_SOURCES = {
@@ -58,37 +120,331 @@ PUBLIC_DATA_SOURCES = {
 }
 
 
+# ========== 运行时配置 - 首次使用时从环境变量读取 ==========
+class CrawlerConfig:
+    """飞书、AI平台和数据源配置
+    
+    延迟到首次使用时读取，导入模块不再要求环境变量齐全；
+    各接口地址可通过环境变量覆盖，便于指向代理或本地模拟服务。
+    """
+    
+    def __init__(self, env: Dict[str, str] = None):
+        env = os.environ if env is None else env
+        
+        # 飞书配置
+        self.feishu_app_id = env.get('FEISHU_APP_ID')
+        self.feishu_app_secret = env.get('FEISHU_SECRET')
+        self.feishu_base_id = env.get('FEISHU_BASEID')
+        self.table_trends = env.get('TABLE_TRENDS')
+        self.table_sku = env.get('TABLE_SKU')
+        self.feishu_api_base = env.get('FEISHU_API_BASE', 'https://open.feishu.cn').rstrip('/')
+        
+        # AI平台API密钥与地址
+        self.api_keys = {
+            platform: env.get(f'{platform.upper()}_API_KEY')
+            for platform in AI_PLATFORM_LABELS
+        }
+        self.ai_urls = {
+            platform: env.get(f'{platform.upper()}_API_URL', url)
+            for platform, (_, url, _) in AI_PLATFORM_ENDPOINTS.items()
+        }
+        self.wenxin_api_base = env.get('WENXIN_API_BASE', 'https://aip.baidubce.com').rstrip('/')
+        # 各平台token单价，{PLATFORM}_TOKEN_PRICE="输入,输出" 覆盖内置值
+        self.token_prices = CostBudget.env_prices(env)
+        
+        # 公开数据源地址
+        self.source_urls = {
+            name: env.get(f'{name.upper()}_SOURCE_URL', url)
+            for name, url in PUBLIC_DATA_SOURCES.items()
+        }
+    
+    def validate(self):
+        """检查写入飞书所需的配置"""
+        required_vars = [
+            ('FEISHU_APP_ID', self.feishu_app_id),
+            ('FEISHU_SECRET', self.feishu_app_secret),
+            ('FEISHU_BASEID', self.feishu_base_id),
+            ('TABLE_TRENDS', self.table_trends),
+        ]
+        
+        for var_name, var_value in required_vars:
+            if not var_value:
+                logger.error(f"缺少必要的环境变量: {var_name}")
+                raise ValueError(f"环境变量 {var_name} 未设置")
+
+
+_config: Optional[CrawlerConfig] = None
+
+
+def get_config() -> CrawlerConfig:
+    """获取当前配置，首次调用时从环境变量加载"""
+    global _config
+    if _config is None:
+        _config = CrawlerConfig()
+    return _config
+
+
+def set_config(config: Optional[CrawlerConfig]):
+    """替换当前配置；传入None时下次使用会重新读取环境变量"""
+    global _config
+    _config = config
+
+
+class HostRateLimiter:
+    """单个主机的自适应限流器
+    
+    令牌桶控制请求速率，AIMD（加性增、乘性减）控制并发数：
+    请求成功时并发上限缓慢增加，遇到429/503时并发与速率减半，
+    并遵守 Retry-After 与 X-RateLimit-* 响应头给出的等待时间。
+    """
+    
+    def __init__(self, host: str, rate: float = None, burst: float = None,
+                 concurrency: float = None, max_concurrency: int = None):
+        self.host = host
+        self.max_rate = rate or RATE_LIMIT_RPS
+        self.rate = self.max_rate
+        self.burst = burst or RATE_LIMIT_BURST
+        self.max_concurrency = max_concurrency or RATE_LIMIT_MAX_CONCURRENCY
+        self.concurrency = min(concurrency or RATE_LIMIT_CONCURRENCY, self.max_concurrency)
+        self.tokens = self.burst
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttle_events = 0
+        self.requests = 0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self):
+        """阻塞直到允许发出下一个请求"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.requests += 1
+                    return
+                self._cond.wait(wait)
+    
+    def release(self, status_code: Optional[int] = None, headers: Dict = None):
+        """请求结束后根据响应调整限流参数"""
+        headers = headers or {}
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            
+            if status_code in (429, 503):
+                self.throttle_events += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.rate = max(0.1, self.rate / 2)
+                delay = _parse_retry_after(headers.get('Retry-After'))
+                if delay is None:
+                    delay = 1.0 / self.rate
+                self.blocked_until = max(self.blocked_until, now + delay)
+                logger.warning(f"[限流] {self.host} 返回 {status_code}，等待 {delay:.1f}s，"
+                               f"并发上限降至 {int(self.concurrency)}，速率降至 {self.rate:.2f}/s")
+            elif status_code is not None and status_code < 500:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate * 1.1)
+            
+            self._apply_quota_headers(headers, now)
+            self._cond.notify_all()
+    
+    def _apply_quota_headers(self, headers: Dict, now: float):
+        """根据 X-RateLimit-* 响应头预先放慢，避免触发429"""
+        limit = _first_header(headers, 'x-ratelimit-limit-requests')
+        if limit:
+            try:
+                # OpenAI兼容接口的请求配额以分钟计
+                self.max_rate = min(self.max_rate, max(0.1, float(limit) / 60))
+                self.rate = min(self.rate, self.max_rate)
+            except ValueError:
+                pass
+        
+        remaining = _first_header(headers, 'x-ratelimit-remaining-requests', 'x-ratelimit-remaining')
+        if remaining is None:
+            return
+        try:
+            remaining = int(float(remaining))
+        except ValueError:
+            return
+        if remaining > 0:
+            return
+        
+        reset = _parse_duration(_first_header(headers, 'x-ratelimit-reset-requests', 'x-ratelimit-reset'))
+        if reset:
+            self.throttle_events += 1
+            self.blocked_until = max(self.blocked_until, now + reset)
+            logger.warning(f"[限流] {self.host} 配额用尽，暂停 {reset:.1f}s")
+    
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                'host': self.host,
+                'rate': round(self.rate, 2),
+                'concurrency': int(self.concurrency),
+                'requests': self.requests,
+                'throttle_events': self.throttle_events,
+            }
+
+
+def _first_header(headers: Dict, *names: str) -> Optional[str]:
+    """不区分大小写地读取第一个存在的响应头"""
+    lowered = {k.lower(): v for k, v in headers.items()}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    return None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After（秒数或HTTP日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析限流重置时间：秒数、Unix时间戳或 "6m0s"/"20ms" 格式"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        # 较大的数值视为Unix时间戳
+        return max(0.0, seconds - time.time()) if seconds > 1e9 else seconds
+    except ValueError:
+        pass
+    
+    import re
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    return sum(float(num) * units[unit] for num, unit in parts)
+
+
+class RateLimiterRegistry:
+    """进程内按主机共享的限流器集合"""
+    
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+    
+    def get(self, url: str) -> HostRateLimiter:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostRateLimiter(host)
+            return self._limiters[host]
+    
+    def log_summary(self):
+        """输出各主机当前的限流参数和限流事件数"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        for limiter in limiters:
+            snap = limiter.snapshot()
+            logger.info(f"[限流] {snap['host']}: 请求 {snap['requests']} 次，限流事件 {snap['throttle_events']} 次，"
+                        f"当前速率 {snap['rate']}/s，并发上限 {snap['concurrency']}")
+
+
+RATE_LIMITERS = RateLimiterRegistry()
+
+
 class RetryableSession:
-    """带重试机制的HTTP会话"""
+    """带重试机制和自适应限流的HTTP会话"""
     
-    def __init__(self, max_retries=3, backoff_factor=1):
+    def __init__(self, max_retries=3, backoff_factor=1, limiters: RateLimiterRegistry = None):
         self.session = requests.Session()
+        self.max_retries = max_retries
+        self.limiters = limiters or RATE_LIMITERS
         
-        # 使用 urllib3 的 Retry 配置
+        # 使用 urllib3 的 Retry 配置；429/503 只由限流器退避重试，以便按AIMD调整速率
         from urllib3.util.retry import Retry
         retry_strategy = Retry(
             total=max_retries,
             backoff_factor=backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 504],
         )
         
         adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
     
-    def get(self, url, **kwargs):
+    def request(self, method, url, **kwargs):
+        """发送请求；stream=True 时请求占用的并发名额在响应关闭（resp.close()/with 块结束）时才归还"""
         kwargs.setdefault('timeout', 30)
-        return self.session.get(url, **kwargs)
+        limiter = self.limiters.get(url)
+        
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except Exception:
+                limiter.release()
+                raise
+            
+            throttled = resp.status_code in (429, 503)
+            if kwargs.get('stream') and not throttled:
+                self._release_on_close(resp, limiter)
+                return resp
+            limiter.release(resp.status_code, resp.headers)
+            
+            if not throttled or attempt == self.max_retries:
+                return resp
+            resp.close()
+            logger.info(f"[限流] {limiter.host} 第 {attempt + 1} 次重试")
+        return resp
+    
+    @staticmethod
+    def _release_on_close(resp, limiter: 'HostRateLimiter'):
+        """流式响应的正文读完之前请求仍在进行，关闭响应时才归还限流器名额（只归还一次）"""
+        close = resp.close
+        pending = threading.Lock()
+        
+        def release_and_close():
+            try:
+                close()
+            finally:
+                if pending.acquire(blocking=False):
+                    limiter.release(resp.status_code, resp.headers)
+        
+        resp.close = release_and_close
+    
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
     
     def post(self, url, **kwargs):
-        kwargs.setdefault('timeout', 30)
-        return self.session.post(url, **kwargs)
+        return self.request('POST', url, **kwargs)
+    
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
 
 
 class FeishuClient:
     """飞书API客户端"""
     
-    def __init__(self):
+    def __init__(self, config: CrawlerConfig = None):
+        self.config = config or get_config()
+        self.config.validate()
         self.token = None
         self.token_expire_time = 0
         self.session = RetryableSession()
@@ -98,10 +454,10 @@ class FeishuClient:
         if self.token and time.time() < self.token_expire_time:
             return self.token
         
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+        url = f"{self.config.feishu_api_base}/open-apis/auth/v3/tenant_access_token/internal"
         resp = self.session.post(url, json={
-            "app_id": FEISHU_APP_ID,
-            "app_secret": FEISHU_APP_SECRET
+            "app_id": self.config.feishu_app_id,
+            "app_secret": self.config.feishu_app_secret
         })
         
         if resp.status_code == 200:
@@ -118,7 +474,7 @@ class FeishuClient:
     def write_record(self, table_id: str, fields: dict) -> dict:
         """写入单条记录"""
         token = self.get_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{FEISHU_BASE_ID}/tables/{table_id}/records"
+        url = f"{self.config.feishu_api_base}/open-apis/bitable/v1/apps/{self.config.feishu_base_id}/tables/{table_id}/records"
         
         headers = {
             "Authorization": f"Bearer {token}",
@@ -128,10 +484,23 @@ class FeishuClient:
         resp = self.session.post(url, headers=headers, json={"fields": fields})
         return resp.json()
     
+    def update_record(self, table_id: str, record_id: str, fields: dict) -> dict:
+        """更新单条已写入的记录"""
+        token = self.get_access_token()
+        url = f"{self.config.feishu_api_base}/open-apis/bitable/v1/apps/{self.config.feishu_base_id}/tables/{table_id}/records/{record_id}"
+        
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        
+        resp = self.session.put(url, headers=headers, json={"fields": fields})
+        return resp.json()
+    
     def query_records(self, table_id: str, filter_str: str = None) -> List[dict]:
         """查询记录"""
         token = self.get_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{FEISHU_BASE_ID}/tables/{table_id}/records"
+        url = f"{self.config.feishu_api_base}/open-apis/bitable/v1/apps/{self.config.feishu_base_id}/tables/{table_id}/records"
         
         headers = {"Authorization": f"Bearer {token}"}
         
@@ -149,11 +518,374 @@ class FeishuClient:
         return []
 
 
+def _to_heat(value) -> float:
+    """将热度值统一转换为数值"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class HotwordClusterer(MinHasher):
+    """基于字符n-gram MinHash + LSH 的热词近似去重
+    
+    "淄博烧烤" 与 "淄博烧烤爆火" 这类变体会被归为一簇，合并为一条热词，
+    热度值取各变体的共识分数（consensus_heat）。LSH分桶只比较候选对，整体接近线性时间；
+    逐条归簇见 StreamingHotwordDeduplicator。
+    """
+    
+    @staticmethod
+    def consensus_heat(group: List[Dict]) -> int:
+        """共识热度：各变体热度均值，每多一个来源加权10%，上限100"""
+        heats = [_to_heat(it.get('热度值')) for it in group]
+        mean = sum(heats) / len(heats)
+        return int(round(min(100.0, mean * (1 + 0.1 * (len(group) - 1)))))
+
+
+class StreamingHotwordDeduplicator:
+    """流水线中的在线近似去重
+    
+    用 HotwordClusterer 的MinHash/LSH参数逐条归簇（MinHashIndex）：每条热词到达时
+    只与LSH候选比较，计入已有簇或开启新簇。各簇的全部变体保留在 groups 中，
+    每有新变体到达即可用 HotwordClusterer.consensus_heat() 重算该簇的共识热度。
+    """
+    
+    def __init__(self, clusterer: 'HotwordClusterer' = None):
+        self.clusterer = clusterer or HotwordClusterer()
+        self.index = MinHashIndex(self.clusterer)
+        self.groups = []
+    
+    @property
+    def texts(self) -> List[str]:
+        return self.index.texts
+    
+    def add_item(self, item: Dict) -> int:
+        """登记一条热词及其字段，返回所属簇的编号；簇中只有这一条时即为新簇"""
+        cluster_id = self.add(item['热词文本'])
+        if cluster_id == len(self.groups):
+            self.groups.append([])
+        self.groups[cluster_id].append(item)
+        return cluster_id
+    
+    def add(self, text: str) -> int:
+        """登记一条热词文本，返回所属簇的编号（新簇编号为当前簇数）"""
+        return self.index.add(text)
+
+
+class AnalysisCache:
+    """AI分析结果磁盘缓存
+    
+    以 (平台, 模型, 提示词) 的哈希为键，保存AI回复原文。
+    支持TTL过期和按体积上限的LRU淘汰，命中时完全跳过网络请求。
+    """
+    
+    def __init__(self, db_file: str = None, ttl: int = None, max_bytes: int = None):
+        self.db_file = db_file or AI_CACHE_FILE
+        self.ttl = AI_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = AI_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_file, timeout=30)
+    
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                platform TEXT NOT NULL,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON analysis_cache(accessed_at)")
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def make_key(platform: str, model: str, prompt: str) -> str:
+        """计算内容寻址的缓存键"""
+        payload = json.dumps([platform, model, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, platform: str, model: str, prompt: str) -> Optional[str]:
+        """读取缓存，过期或不存在时返回None"""
+        key = self.make_key(platform, model, prompt)
+        now = time.time()
+        
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT content, created_at FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                
+                if row and (self.ttl <= 0 or now - row[1] < self.ttl):
+                    conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    self.hits += 1
+                    return row[0]
+                
+                if row:
+                    conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            finally:
+                conn.close()
+    
+    def set(self, platform: str, model: str, prompt: str, content: str):
+        """写入缓存并在超出体积上限时淘汰最久未使用的条目"""
+        key = self.make_key(platform, model, prompt)
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("""
+                    INSERT OR REPLACE INTO analysis_cache
+                    (key, platform, model, content, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (key, platform, model, content, size, now, now))
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+    
+    def _evict(self, conn: sqlite3.Connection):
+        """删除过期条目，并按LRU淘汰直到总体积不超过上限"""
+        if self.ttl > 0:
+            conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        evicted = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM analysis_cache ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        
+        if evicted:
+            logger.info(f"分析缓存超出上限，淘汰 {evicted} 条")
+
+
+class IncrementalJSONArrayParser:
+    """增量JSON数组解析器
+    
+    逐段喂入文本，数组中每个对象一旦完整即被解析返回。
+    会跳过数组前的说明文字，数组被截断时已完整的对象依然有效。
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self._buffer = []
+        self._state = 'seek'      # seek -> open -> array -> done
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, text: str) -> List[Dict]:
+        """喂入一段文本，返回本段中新完成的对象"""
+        completed = []
+        for ch in text:
+            if self._state == 'done':
+                break
+            
+            if self._state == 'seek':
+                if ch == '[':
+                    self._state = 'open'
+                continue
+            
+            if self._state == 'open':
+                # '[' 之后必须紧跟对象，否则视为正文中的普通括号
+                if ch.isspace():
+                    continue
+                self._state = 'array' if ch == '{' else 'seek'
+                if ch != '{':
+                    continue
+            
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == ']':
+                    self._state = 'done'
+                continue
+            
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode("".join(self._buffer))
+                    if item is not None:
+                        completed.append(item)
+                        self.count += 1
+                    self._buffer = []
+        return completed
+    
+    @property
+    def complete(self) -> bool:
+        """数组是否已经完整闭合"""
+        return self._state == 'done'
+    
+    @staticmethod
+    def _decode(text: str) -> Optional[Dict]:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"跳过无法解析的热词对象: {text[:100]}")
+            return None
+        return item if isinstance(item, dict) else None
+
+
+class CircuitBreaker:
+    """按平台的熔断器，状态持久化到文件以跨运行生效
+    
+    closed: 正常调用；连续失败达到阈值后转为 open。
+    open: 直接跳过该平台；冷却时间过后转为 half_open。
+    half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open 并延长冷却时间。
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, state_file: str = None, failure_threshold: int = None,
+                 cooldown: float = None, max_cooldown: float = None):
+        self.state_file = state_file or CIRCUIT_STATE_FILE
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.cooldown = cooldown or CIRCUIT_COOLDOWN
+        self.max_cooldown = max_cooldown or CIRCUIT_MAX_COOLDOWN
+        self._lock = threading.Lock()
+        self._probing = set()
+        self.states = self._load()
+    
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"熔断器状态文件读取失败，重新开始: {e}")
+            return {}
+    
+    def _save(self):
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.states, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.warning(f"熔断器状态保存失败: {e}")
+    
+    def _state(self, platform: str) -> Dict:
+        return self.states.setdefault(platform, {
+            'state': self.CLOSED,
+            'failures': 0,
+            'opened_at': 0,
+            'cooldown': self.cooldown,
+        })
+    
+    def is_open(self, platform: str) -> bool:
+        """平台是否处于熔断中（冷却时间未到）"""
+        with self._lock:
+            state = self._state(platform)
+            return state['state'] == self.OPEN and time.time() - state['opened_at'] < state['cooldown']
+    
+    def allow(self, platform: str) -> bool:
+        """是否允许调用该平台；冷却结束后只放行一个探测请求"""
+        with self._lock:
+            state = self._state(platform)
+            if state['state'] == self.CLOSED:
+                return True
+            
+            if state['state'] == self.OPEN:
+                if time.time() - state['opened_at'] < state['cooldown']:
+                    return False
+                state['state'] = self.HALF_OPEN
+                self._save()
+            
+            if platform in self._probing:
+                return False
+            self._probing.add(platform)
+            logger.info(f"[熔断] {platform} 冷却结束，发送探测请求")
+            return True
+    
+    def record_success(self, platform: str):
+        with self._lock:
+            state = self._state(platform)
+            self._probing.discard(platform)
+            if state['state'] != self.CLOSED:
+                logger.info(f"[熔断] {platform} 探测成功，恢复调用")
+            if state['state'] != self.CLOSED or state['failures']:
+                state.update(state=self.CLOSED, failures=0, opened_at=0, cooldown=self.cooldown)
+                self._save()
+    
+    def record_failure(self, platform: str):
+        with self._lock:
+            state = self._state(platform)
+            state['failures'] += 1
+            
+            if platform in self._probing or state['state'] == self.HALF_OPEN:
+                self._probing.discard(platform)
+                state['cooldown'] = min(self.max_cooldown, state['cooldown'] * 2)
+                state.update(state=self.OPEN, opened_at=time.time())
+                logger.warning(f"[熔断] {platform} 探测失败，继续熔断 {state['cooldown']:.0f}s")
+            elif state['state'] == self.CLOSED and state['failures'] >= self.failure_threshold:
+                state.update(state=self.OPEN, opened_at=time.time())
+                logger.warning(f"[熔断] {platform} 连续失败 {state['failures']} 次，熔断 {state['cooldown']:.0f}s")
+            self._save()
+    
+    def log_summary(self):
+        """输出各平台熔断器状态"""
+        with self._lock:
+            for platform, state in sorted(self.states.items()):
+                line = f"[熔断] {platform}: {state['state']}，连续失败 {state['failures']} 次"
+                if state['state'] == self.OPEN:
+                    remaining = state['opened_at'] + state['cooldown'] - time.time()
+                    line += f"，剩余冷却 {max(0, remaining):.0f}s"
+                logger.info(line)
+
+
 class AIPlatformClient:
     """统一AI平台客户端"""
     
-    def __init__(self):
+    def __init__(self, cache: 'AnalysisCache' = None, breaker: 'CircuitBreaker' = None,
+                 config: CrawlerConfig = None, budget: CostBudget = None):
+        self.config = config or get_config()
         self.session = RetryableSession()
+        self.cache = cache or AnalysisCache()
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or CostBudget(
+            AI_DAILY_BUDGET, AI_RUN_BUDGET, soft_ratio=AI_BUDGET_SOFT_RATIO,
+            throttle_delay=AI_BUDGET_THROTTLE_DELAY, prices=self.config.token_prices
+        )
+        self.clusterer = HotwordClusterer()
         self.platforms = {
             'kimi': self._call_kimi,
             'deepseek': self._call_deepseek,
@@ -171,31 +903,46 @@ class AIPlatformClient:
         
         return self.platforms[platform](raw_data)
     
-    def analyze_with_all_platforms(self, raw_data: List[Dict]) -> List[Dict]:
-        """使用所有可用平台分析，取最优结果"""
-        all_results = []
+    def _available_platforms(self) -> List[str]:
+        """返回已配置API密钥的平台"""
+        available = []
+        for platform_name in self.platforms:
+            if not self._api_key(platform_name):
+                logger.warning(f"{platform_name.upper()}_API_KEY 未设置，跳过该平台")
+            elif self.breaker.is_open(platform_name):
+                logger.warning(f"[熔断] {platform_name} 处于熔断状态，跳过该平台")
+            else:
+                available.append(platform_name)
+        return available
+    
+    @staticmethod
+    def _format_raw_item(item: Dict) -> str:
+        """格式化单条原始数据为提示词中的一行"""
+        return f"- {item.get('title', item.get('word', 'N/A'))} (热度: {item.get('hot', item.get('value', 0))})"
+    
+    def _chunk_raw_data(self, raw_data: List[Dict], token_budget: int = None) -> List[List[Dict]]:
+        """按token预算将原始数据切分为多个分片"""
+        token_budget = token_budget or ANALYSIS_CHUNK_TOKENS
+        chunks = []
+        current = []
+        current_tokens = 0
         
-        # 准备分析提示词
-        prompt = self._build_analysis_prompt(raw_data)
+        for item in raw_data:
+            tokens = estimate_tokens(self._format_raw_item(item)) + 1
+            if current and current_tokens + tokens > token_budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(item)
+            current_tokens += tokens
         
-        for platform_name, func in self.platforms.items():
-            try:
-                result = func(prompt)
-                if result:
-                    all_results.extend(result)
-                    logger.info(f"[{platform_name}] 分析完成，获得 {len(result)} 条热词")
-            except Exception as e:
-                logger.error(f"[{platform_name}] 分析失败: {e}")
-        
-        # 去重并返回
-        return self._deduplicate_results(all_results)
+        if current:
+            chunks.append(current)
+        return chunks
     
     def _build_analysis_prompt(self, raw_data: List[Dict]) -> str:
         """构建分析提示词"""
-        data_summary = "\n".join([
-            f"- {item.get('title', item.get('word', 'N/A'))} (热度: {item.get('hot', item.get('value', 0))})"
-            for item in raw_data[:50]
-        ])
+        data_summary = "\n".join([self._format_raw_item(item) for item in raw_data])
         
         prompt = f"""请分析以下中国互联网热门话题，提取与餐饮、美食、供应链相关的热词。
 
@@ -204,252 +951,289 @@ class AIPlatformClient:
 
 请返回JSON格式的热词列表，格式如下：
 [
-  {{"热词文本": "xxx", "热度值": 85, "趋势方向": "上升/下降/平稳", "所属品类": "餐饮分类", "地域属性": ["全国"], "内容摘要": "xxx"}}
+  {{"热词文本": "xxx", "热度值": 85, "所属品类": "餐饮分类", "地域属性": ["全国"], "内容摘要": "xxx"}}
 ]
 
 要求：
 1. 只返回与餐饮、美食、食材、供应链相关的热词
 2. 热度值0-100
-3. 趋势方向：上升/下降/平稳/飙升
-4. 所属品类：烧烤/火锅/奶茶/咖啡/快餐/烘焙/卤味/粉面/预制菜/其他
-5. 直接返回JSON，不要其他文字
+3. 所属品类：烧烤/火锅/奶茶/咖啡/快餐/烘焙/卤味/粉面/预制菜/其他
+4. 直接返回JSON，不要其他文字
 """
         return prompt
     
-    def _call_kimi(self, prompt: str) -> List[Dict]:
-        """调用Kimi API"""
-        if not KIMI_API_KEY:
-            logger.warning("KIMI_API_KEY 未设置")
-            return []
+    def _api_key(self, platform: str) -> Optional[str]:
+        """获取平台API密钥"""
+        return self.config.api_keys.get(platform)
+    
+    def iter_analysis(self, platform: str, prompt: str) -> Iterator[Dict]:
+        """逐条产出平台分析得到的热词，每个JSON对象完整后立即返回"""
+        if platform == 'wenxin':
+            return self._iter_wenxin(prompt)
+        return self._iter_openai_compatible(platform, prompt)
+    
+    def _iter_completion(self, platform: str, model: str, prompt: str,
+                         fetch: Callable[[Dict], Iterator[str]]) -> Iterator[Dict]:
+        """先查缓存，未命中时消费 fetch(usage) 产出的文本增量并增量解析
         
-        url = "https://api.moonshot.cn/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {KIMI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "kimi-chat",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
+        流式响应中途断开或回复被截断时，保留已经完整解析出的热词；
+        只有完整的回复才写入缓存。fetch 把平台返回的用量写入 usage，
+        平台没有返回时按文本长度估算后记账。
+        """
+        content = self.cache.get(platform, model, prompt)
+        if content is not None:
+            logger.info(f"[{platform}] 命中分析缓存")
+            yield from self._parse_ai_response(content)
+            return
         
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            return self._parse_ai_response(content)
+        if not self.breaker.allow(platform):
+            logger.info(f"[熔断] {platform} 处于熔断状态，跳过调用")
+            return
         
-        logger.error(f"Kimi API调用失败: {resp.text}")
-        return []
-    
-    def _call_deepseek(self, prompt: str) -> List[Dict]:
-        """调用DeepSeek API"""
-        if not DEEPSEEK_API_KEY:
-            logger.warning("DEEPSEEK_API_KEY 未设置")
-            return []
+        prompt_tokens = estimate_tokens(prompt)
+        reserved = self.budget.reserve(platform, prompt_tokens)
+        if reserved is None:
+            logger.warning(f"[成本] 预算不足，跳过 {platform} 调用")
+            return
         
-        url = "https://api.deepseek.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
+        parser = IncrementalJSONArrayParser()
+        parts = []
+        usage = {}
+        try:
+            for delta in fetch(usage):
+                parts.append(delta)
+                yield from parser.feed(delta)
+        except requests.RequestException as e:
+            self._settle_usage(platform, model, reserved, prompt_tokens, usage, parts)
+            if parts:
+                self.breaker.record_success(platform)
+            else:
+                self.breaker.record_failure(platform)
+            logger.warning(f"[{platform}] 响应中断，保留已解析的 {parser.count} 条热词: {e}")
+            return
+        except Exception:
+            self._settle_usage(platform, model, reserved, prompt_tokens, usage, parts)
+            self.breaker.record_failure(platform)
+            raise
         
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            return self._parse_ai_response(content)
+        self._settle_usage(platform, model, reserved, prompt_tokens, usage, parts)
+        content = "".join(parts)
+        if not content:
+            self.breaker.record_failure(platform)
+            return
+        self.breaker.record_success(platform)
+        if parser.complete:
+            self.cache.set(platform, model, prompt, content)
+            return
         
-        logger.error(f"DeepSeek API调用失败: {resp.text}")
-        return []
+        if parser.count:
+            # 数组未闭合（回复被截断），已解析部分照常使用但不缓存
+            logger.warning(f"[{platform}] 回复被截断，保留已解析的 {parser.count} 条热词")
+            return
+        
+        items = self._parse_ai_response(content)
+        yield from items
+        if items:
+            self.cache.set(platform, model, prompt, content)
     
-    def _call_yuanbao(self, prompt: str) -> List[Dict]:
-        """调用元宝 API (腾讯)"""
-        if not YUANBAO_API_KEY:
-            logger.warning("YUANBAO_API_KEY 未设置")
-            return []
+    def _settle_usage(self, platform: str, model: str, reserved: float, prompt_tokens: int,
+                      usage: Dict, parts: List[str]):
+        """结算一次调用；没有收到任何输出也没有用量时视为未计费"""
+        if not usage and not parts:
+            self.budget.release(reserved)
+            return
+        completion = usage.get('completion_tokens')
+        if completion is None:
+            completion = estimate_tokens("".join(parts))
+        self.budget.settle(
+            platform, reserved,
+            usage.get('prompt_tokens') or prompt_tokens,
+            completion,
+            estimated='prompt_tokens' not in usage or 'completion_tokens' not in usage,
+            model=model
+        )
+    
+    @staticmethod
+    def _iter_sse_data(resp) -> Iterator[dict]:
+        """解析SSE响应中的 data 事件"""
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                return
+            try:
+                yield json.loads(payload)
+            except json.JSONDecodeError:
+                logger.debug(f"忽略无法解析的SSE事件: {payload[:100]}")
+    
+    def _iter_openai_compatible(self, platform: str, prompt: str) -> Iterator[Dict]:
+        """调用兼容OpenAI Chat Completions接口的平台"""
+        label, _, model = AI_PLATFORM_ENDPOINTS[platform]
+        url = self.config.ai_urls[platform]
+        api_key = self._api_key(platform)
+        if not api_key:
+            logger.warning(f"{platform.upper()}_API_KEY 未设置")
+            return iter(())
         
-        url = "https://api.baichuan-ai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {YUANBAO_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "Baichuan4",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
+        def fetch(usage: Dict) -> Iterator[str]:
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+            data = {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.7,
+                "stream": AI_STREAM
+            }
+            if AI_STREAM:
+                # 请求在最后一个事件中返回用量
+                data["stream_options"] = {"include_usage": True}
+            
+            resp = self.session.post(url, headers=headers, json=data, stream=AI_STREAM)
+            with resp:
+                if resp.status_code != 200:
+                    logger.error(f"{label} API调用失败: {resp.text}")
+                    return
+                
+                if not AI_STREAM:
+                    result = resp.json()
+                    usage.update(result.get('usage') or {})
+                    yield result.get('choices', [{}])[0].get('message', {}).get('content', '')
+                    return
+                
+                for event in self._iter_sse_data(resp):
+                    choice = (event.get('choices') or [{}])[0]
+                    # 用量在顶层或（部分平台）choice 内返回
+                    usage.update(event.get('usage') or choice.get('usage') or {})
+                    delta = choice.get('delta', {}).get('content')
+                    if delta:
+                        yield delta
         
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            return self._parse_ai_response(content)
+        return self._iter_completion(platform, model, prompt, fetch)
+    
+    def _iter_wenxin(self, prompt: str) -> Iterator[Dict]:
+        """调用文心一言 API (百度)"""
+        api_key = self._api_key('wenxin')
+        if not api_key:
+            logger.warning("WENXIN_API_KEY 未设置")
+            return iter(())
+        api_base = self.config.wenxin_api_base
         
-        logger.error(f"元宝 API调用失败: {resp.text}")
-        return []
+        def fetch(usage: Dict) -> Iterator[str]:
+            # 文心一言需要先获取access_token
+            auth_url = f"{api_base}/oauth/2.0/token"
+            auth_resp = self.session.post(auth_url, params={
+                "grant_type": "client_credentials",
+                "client_id": api_key.split('/')[0] if '/' in api_key else api_key,
+                "client_secret": api_key.split('/')[1] if '/' in api_key else ""
+            })
+            
+            if auth_resp.status_code != 200:
+                logger.error(f"文心一言认证失败: {auth_resp.text}")
+                return
+            
+            access_token = auth_resp.json().get('access_token')
+            if not access_token:
+                logger.error("文心一言获取access_token失败")
+                return
+            
+            url = f"{api_base}/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/ernie-4.0-8k?access_token={access_token}"
+            headers = {"Content-Type": "application/json"}
+            data = {
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": AI_STREAM
+            }
+            
+            resp = self.session.post(url, headers=headers, json=data, stream=AI_STREAM)
+            with resp:
+                if resp.status_code != 200:
+                    logger.error(f"文心一言 API调用失败: {resp.text}")
+                    return
+                
+                if not AI_STREAM:
+                    result = resp.json()
+                    usage.update(result.get('usage') or {})
+                    yield result.get('result', '')
+                    return
+                
+                for event in self._iter_sse_data(resp):
+                    usage.update(event.get('usage') or {})
+                    if event.get('result'):
+                        yield event['result']
+                    if event.get('is_end'):
+                        return
+        
+        return self._iter_completion('wenxin', "ernie-4.0-8k", prompt, fetch)
+    
+    def _call_kimi(self, prompt: str) -> List[Dict]:
+        """调用Kimi API"""
+        return list(self.iter_analysis('kimi', prompt))
+    
+    def _call_deepseek(self, prompt: str) -> List[Dict]:
+        """调用DeepSeek API"""
+        return list(self.iter_analysis('deepseek', prompt))
+    
+    def _call_yuanbao(self, prompt: str) -> List[Dict]:
+        """调用元宝 API (腾讯)"""
+        return list(self.iter_analysis('yuanbao', prompt))
     
     def _call_qianwen(self, prompt: str) -> List[Dict]:
         """调用千问 API (阿里云)"""
-        if not QIANWEN_API_KEY:
-            logger.warning("QIANWEN_API_KEY 未设置")
-            return []
-        
-        url = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {QIANWEN_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "qwen-turbo",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-        
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            return self._parse_ai_response(content)
-        
-        logger.error(f"千问 API调用失败: {resp.text}")
-        return []
+        return list(self.iter_analysis('qianwen', prompt))
     
     def _call_wenxin(self, prompt: str) -> List[Dict]:
         """调用文心一言 API (百度)"""
-        if not WENXIN_API_KEY:
-            logger.warning("WENXIN_API_KEY 未设置")
-            return []
-        
-        # 文心一言需要先获取access_token
-        auth_url = "https://aip.baidubce.com/oauth/2.0/token"
-        auth_resp = self.session.post(auth_url, params={
-            "grant_type": "client_credentials",
-            "client_id": WENXIN_API_KEY.split('/')[0] if '/' in WENXIN_API_KEY else WENXIN_API_KEY,
-            "client_secret": WENXIN_API_KEY.split('/')[1] if '/' in WENXIN_API_KEY else ""
-        })
-        
-        if auth_resp.status_code != 200:
-            logger.error(f"文心一言认证失败: {auth_resp.text}")
-            return []
-        
-        access_token = auth_resp.json().get('access_token')
-        if not access_token:
-            logger.error("文心一言获取access_token失败")
-            return []
-        
-        url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/ernie-4.0-8k?access_token={access_token}"
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('result', '')
-            return self._parse_ai_response(content)
-        
-        logger.error(f"文心一言 API调用失败: {resp.text}")
-        return []
+        return list(self.iter_analysis('wenxin', prompt))
     
     def _call_doubao(self, prompt: str) -> List[Dict]:
         """调用豆包 API (字节跳动)"""
-        if not DOUBAO_API_KEY:
-            logger.warning("DOUBAO_API_KEY 未设置")
-            return []
-        
-        url = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {DOUBAO_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "doubao-pro-32k",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-        
-        resp = self.session.post(url, headers=headers, json=data)
-        if resp.status_code == 200:
-            result = resp.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            return self._parse_ai_response(content)
-        
-        logger.error(f"豆包 API调用失败: {resp.text}")
-        return []
+        return list(self.iter_analysis('doubao', prompt))
     
     def _parse_ai_response(self, content: str) -> List[Dict]:
-        """解析AI返回的JSON内容"""
+        """解析AI返回的JSON内容（容忍前后多余文字和被截断的结尾）"""
+        items = IncrementalJSONArrayParser().feed(content)
+        if items:
+            return items
+        
         try:
-            # 尝试提取JSON部分
-            import re
-            json_match = re.search(r'\[.*\]', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            return json.loads(content)
+            parsed = json.loads(content)
+            return parsed if isinstance(parsed, list) else []
         except json.JSONDecodeError:
             logger.warning(f"AI返回内容无法解析为JSON: {content[:200]}")
             return []
-    
-    def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
-        """去重热词结果"""
-        seen = set()
-        deduplicated = []
-        
-        for item in results:
-            keyword = item.get('热词文本', '')
-            if keyword and keyword not in seen:
-                seen.add(keyword)
-                deduplicated.append(item)
-        
-        return deduplicated
 
 
 class PublicDataCrawler:
     """公开数据源爬虫 - 方案B的数据来源"""
     
-    def __init__(self):
+    def __init__(self, config: CrawlerConfig = None):
+        self.config = config or get_config()
         self.session = RetryableSession()
+        self.sources = [
+            ('微博热搜', self._fetch_weibo),
+            ('知乎热搜', self._fetch_zhihu),
+            ('今日头条', self._fetch_toutiao),
+        ]
     
     def fetch_all_sources(self) -> List[Dict]:
         """获取所有公开数据源的热词"""
         all_data = []
         
-        # 微博热搜
-        try:
-            weibo_data = self._fetch_weibo()
-            all_data.extend(weibo_data)
-            logger.info(f"微博热搜获取: {len(weibo_data)} 条")
-        except Exception as e:
-            logger.error(f"微博热搜获取失败: {e}")
-        
-        # 知乎热搜
-        try:
-            zhihu_data = self._fetch_zhihu()
-            all_data.extend(zhihu_data)
-            logger.info(f"知乎热搜获取: {len(zhihu_data)} 条")
-        except Exception as e:
-            logger.error(f"知乎热搜获取失败: {e}")
-        
-        # 今日头条
-        try:
-            toutiao_data = self._fetch_toutiao()
-            all_data.extend(toutiao_data)
-            logger.info(f"今日头条获取: {len(toutiao_data)} 条")
-        except Exception as e:
-            logger.error(f"今日头条获取失败: {e}")
+        for name, fetch in self.sources:
+            try:
+                data = fetch()
+                all_data.extend(data)
+                logger.info(f"{name}获取: {len(data)} 条")
+            except Exception as e:
+                logger.error(f"{name}获取失败: {e}")
         
         return all_data
     
     def _fetch_weibo(self) -> List[Dict]:
         """获取微博热搜"""
-        url = "https://weibo.com/ajax/side/hotSearch"
+        url = self.config.source_urls['weibo']
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
             "Referer": "https://weibo.com"
@@ -471,7 +1255,7 @@ class PublicDataCrawler:
     
     def _fetch_zhihu(self) -> List[Dict]:
         """获取知乎热搜"""
-        url = "https://www.zhihu.com/api/v3/feed/topstory/hot-lists/total"
+        url = self.config.source_urls['zhihu']
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
@@ -492,7 +1276,7 @@ class PublicDataCrawler:
     
     def _fetch_toutiao(self) -> List[Dict]:
         """获取今日头条热搜"""
-        url = "https://www.toutiao.com/api/pc/feed/"
+        url = self.config.source_urls['toutiao']
         params = {
             "category": "news_hot",
             "max_behot_time": int(time.time())
@@ -515,18 +1299,486 @@ class PublicDataCrawler:
         return []
 
 
+class HotwordStore:
+    """本地SQLite存储：原始热榜、各平台分析结果和最终热词
+    
+    与 monitor.db 放在同一目录。写入先进入内存缓冲区，攒够一批后用
+    executemany 一次提交；飞书作为下游异步写入目标，从 hotwords 表中读取未同步的记录。
+    """
+    
+    def __init__(self, db_file: str = None, batch_size: int = None):
+        self.db_file = db_file or HOTWORDS_DB_FILE
+        self.batch_size = batch_size or STORE_BATCH_SIZE
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self._pending = {'raw_items': [], 'analysis_results': [], 'hotwords': [], 'hotword_updates': [],
+                         'heat_history': [], 'trend_states': [], 'ai_usage': []}
+        self.init_db()
+    
+    def init_db(self):
+        """初始化数据库表结构"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            
+            # 抓取任务表
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL DEFAULT 'crawl',
+                    source_run_id INTEGER,
+                    raw_count INTEGER DEFAULT 0,
+                    hotword_count INTEGER DEFAULT 0,
+                    unique_count INTEGER DEFAULT 0,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            """)
+            
+            # 原始热榜数据表
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS raw_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    title TEXT,
+                    hot TEXT,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # 各平台分析结果表
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id INTEGER NOT NULL,
+                    platform TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    heat REAL,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # 最终热词表（飞书同步队列）；revision 在共识热度更新后递增，触发重新同步
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS hotwords (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id INTEGER NOT NULL,
+                    keyword TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    heat REAL,
+                    fields TEXT NOT NULL,
+                    feishu_record_id TEXT,
+                    revision INTEGER DEFAULT 0,
+                    sync_attempts INTEGER DEFAULT 0,
+                    synced_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(hotwords)")}
+            if 'revision' not in columns:
+                cursor.execute("ALTER TABLE hotwords ADD COLUMN revision INTEGER DEFAULT 0")
+            
+            # 热词热度时间序列
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS heat_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    keyword TEXT NOT NULL,
+                    heat REAL NOT NULL,
+                    observed_at REAL NOT NULL
+                )
+            """)
+            
+            # 热词趋势状态（EWMA水平值与斜率，每次观测O(1)更新）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trend_states (
+                    keyword TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    slope REAL NOT NULL,
+                    last_heat REAL NOT NULL,
+                    samples INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            
+            # AI调用用量与成本
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ai_usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id INTEGER,
+                    platform TEXT NOT NULL,
+                    model TEXT,
+                    prompt_tokens INTEGER DEFAULT 0,
+                    completion_tokens INTEGER DEFAULT 0,
+                    cost REAL DEFAULT 0,
+                    estimated INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_usage_created ON ai_usage(created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_heat_history_keyword ON heat_history(keyword, observed_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_raw_items_run ON raw_items(run_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_analysis_run ON analysis_results(run_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotwords_synced ON hotwords(synced_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotwords_key ON hotwords(platform, keyword)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotwords_run ON hotwords(run_id)")
+            self._conn.commit()
+    
+    def start_run(self, kind: str = 'crawl', source_run_id: int = None) -> int:
+        """登记一次抓取/重新分析任务"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO crawl_runs (kind, source_run_id) VALUES (?, ?)", (kind, source_run_id)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+    
+    def finish_run(self, run_id: int, stats: Dict[str, int]):
+        """写入剩余缓冲并记录任务统计"""
+        with self._lock:
+            self.flush()
+            self._conn.execute("""
+                UPDATE crawl_runs
+                SET raw_count = ?, hotword_count = ?, unique_count = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (stats.get('raw', 0), stats.get('hotwords', 0), stats.get('unique', 0), run_id))
+            self._conn.commit()
+    
+    def add_raw_items(self, run_id: int, source: str, items: List[Dict]):
+        with self._lock:
+            self._pending['raw_items'].extend(
+                (run_id, source, item.get('title', item.get('word')), str(item.get('hot', item.get('value', ''))),
+                 json.dumps(item, ensure_ascii=False))
+                for item in items
+            )
+            self._maybe_flush()
+    
+    def add_analysis_result(self, run_id: int, platform: str, item: Dict):
+        with self._lock:
+            self._pending['analysis_results'].append(
+                (run_id, platform, item.get('热词文本', ''), _to_heat(item.get('热度值')),
+                 json.dumps(item, ensure_ascii=False))
+            )
+            self._maybe_flush()
+    
+    def add_hotword(self, run_id: int, fields: Dict):
+        with self._lock:
+            self._pending['hotwords'].append(
+                (run_id, fields['热词文本'], fields['平台来源'], _to_heat(fields.get('热度值')),
+                 json.dumps(fields, ensure_ascii=False))
+            )
+            self._maybe_flush()
+    
+    def update_hotword(self, run_id: int, fields: Dict):
+        """更新本次任务中已落库热词的字段；已同步的记录会重新同步到飞书"""
+        with self._lock:
+            self._pending['hotword_updates'].append(
+                (_to_heat(fields.get('热度值')), json.dumps(fields, ensure_ascii=False),
+                 run_id, fields['平台来源'], fields['热词文本'])
+            )
+            self._maybe_flush()
+    
+    def add_usage(self, run_id: int, usage: Dict):
+        with self._lock:
+            self._pending['ai_usage'].append(
+                (run_id, usage['platform'], usage['model'], usage['prompt_tokens'],
+                 usage['completion_tokens'], usage['cost'], 1 if usage['estimated'] else 0)
+            )
+            self._maybe_flush()
+    
+    def spent_today(self) -> float:
+        """今天（UTC）已记录的AI调用花费"""
+        with self._lock:
+            self.flush()
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(cost), 0) FROM ai_usage WHERE created_at >= date('now')"
+            ).fetchone()[0]
+    
+    def trend_state(self, keyword: str) -> Optional[Dict]:
+        """读取热词的趋势状态"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT level, slope, last_heat, samples, updated_at FROM trend_states WHERE keyword = ?",
+                (keyword,)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('level', 'slope', 'last_heat', 'samples', 'updated_at'), row))
+    
+    def save_trend_state(self, keyword: str, state: Dict, heat: float):
+        """记录一次热度观测并更新趋势状态"""
+        with self._lock:
+            self._pending['heat_history'].append((keyword, heat, state['updated_at']))
+            self._pending['trend_states'].append((
+                keyword, state['level'], state['slope'], state['last_heat'],
+                state['samples'], state['updated_at']
+            ))
+            self._maybe_flush()
+    
+    def _maybe_flush(self):
+        if any(len(rows) >= self.batch_size for rows in self._pending.values()):
+            self.flush()
+    
+    def flush(self):
+        """批量提交缓冲区中的记录"""
+        statements = {
+            'raw_items': "INSERT INTO raw_items (run_id, source, title, hot, payload) VALUES (?, ?, ?, ?, ?)",
+            'analysis_results': "INSERT INTO analysis_results (run_id, platform, keyword, heat, payload) VALUES (?, ?, ?, ?, ?)",
+            'hotwords': "INSERT INTO hotwords (run_id, keyword, platform, heat, fields) VALUES (?, ?, ?, ?, ?)",
+            'hotword_updates': """
+                UPDATE hotwords SET heat = ?, fields = ?, revision = revision + 1, synced_at = NULL
+                WHERE run_id = ? AND platform = ? AND keyword = ?
+            """,
+            'heat_history': "INSERT INTO heat_history (keyword, heat, observed_at) VALUES (?, ?, ?)",
+            'ai_usage': """
+                INSERT INTO ai_usage (run_id, platform, model, prompt_tokens, completion_tokens, cost, estimated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            'trend_states': """
+                INSERT OR REPLACE INTO trend_states (keyword, level, slope, last_heat, samples, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """,
+        }
+        with self._lock:
+            if not any(self._pending.values()):
+                return
+            for table, rows in self._pending.items():
+                if rows:
+                    self._conn.executemany(statements[table], rows)
+                    self._pending[table] = []
+            self._conn.commit()
+    
+    def latest_run_id(self, kind: str = 'crawl') -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(id) FROM crawl_runs WHERE kind = ?", (kind,)
+            ).fetchone()
+            return row[0] if row else None
+    
+    def load_raw_items(self, run_id: int) -> List[tuple]:
+        """按数据源读取某次任务的原始热榜，返回 [(数据源, 条目列表)]"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT source, payload FROM raw_items WHERE run_id = ? ORDER BY id", (run_id,)
+            ).fetchall()
+        batches = {}
+        for source, payload in rows:
+            batches.setdefault(source, []).append(json.loads(payload))
+        return list(batches.items())
+    
+    def known_keys(self) -> set:
+        """已写入本地的 平台_热词 组合，用于去重"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute("SELECT DISTINCT platform, keyword FROM hotwords").fetchall()
+        return {f"{platform}_{keyword}" for platform, keyword in rows}
+    
+    def pending_hotwords(self, limit: int = 100, exclude: set = None) -> List[tuple]:
+        """读取尚未同步到飞书的热词，返回 [(id, 字段, 飞书记录id, 版本)]；exclude 为 (id, 版本) 集合"""
+        exclude = exclude or set()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, fields, feishu_record_id, revision FROM hotwords WHERE synced_at IS NULL ORDER BY id LIMIT ?",
+                (limit + len(exclude),)
+            ).fetchall()
+        return [(row_id, json.loads(fields), record_id, revision)
+                for row_id, fields, record_id, revision in rows
+                if (row_id, revision) not in exclude][:limit]
+    
+    def mark_synced(self, hotword_id: int, record_id: str = None, revision: int = 0):
+        """记录同步结果；同步期间热词又被更新（版本已变）时保持未同步，下一轮以更新方式写入"""
+        with self._lock:
+            self._conn.execute("""
+                UPDATE hotwords
+                SET synced_at = CASE WHEN revision = ? THEN CURRENT_TIMESTAMP ELSE synced_at END,
+                    feishu_record_id = COALESCE(?, feishu_record_id), sync_attempts = sync_attempts + 1
+                WHERE id = ?
+            """, (revision, record_id, hotword_id))
+            self._conn.commit()
+    
+    def mark_sync_failed(self, hotword_id: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE hotwords SET sync_attempts = sync_attempts + 1 WHERE id = ?", (hotword_id,)
+            )
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+
+class TrendTracker:
+    """基于本地热度时间序列计算趋势方向
+    
+    每个热词维护EWMA水平值与斜率（Holt双指数平滑），每次观测O(1)更新：
+        level = α·x + (1-α)·(level + slope)
+        slope = β·(level - level_prev) + (1-β)·slope
+    趋势方向由相对斜率决定，单次热度相对水平值大幅跳升判定为"飙升"。
+    """
+    
+    def __init__(self, store: 'HotwordStore', alpha: float = None, beta: float = None):
+        self.store = store
+        self.alpha = TREND_ALPHA if alpha is None else alpha
+        self.beta = TREND_BETA if beta is None else beta
+        self._states = {}
+        self._lock = threading.Lock()
+    
+    def _state(self, keyword: str) -> Optional[Dict]:
+        if keyword not in self._states:
+            self._states[keyword] = self.store.trend_state(keyword)
+        return self._states[keyword]
+    
+    def observe(self, keyword: str, heat, update: bool = True) -> str:
+        """登记一次热度观测，返回趋势方向；update=False 时只计算不保存"""
+        x = _to_heat(heat)
+        with self._lock:
+            prev = self._state(keyword)
+            if prev is None:
+                state = {'level': x, 'slope': 0.0, 'last_heat': x, 'samples': 1, 'updated_at': time.time()}
+                direction = '上升'
+            else:
+                level = self.alpha * x + (1 - self.alpha) * (prev['level'] + prev['slope'])
+                slope = self.beta * (level - prev['level']) + (1 - self.beta) * prev['slope']
+                state = {'level': level, 'slope': slope, 'last_heat': x,
+                         'samples': prev['samples'] + 1, 'updated_at': time.time()}
+                direction = self._direction(prev, state, x)
+            
+            if update:
+                self._states[keyword] = state
+                self.store.save_trend_state(keyword, state, x)
+        return direction
+    
+    @staticmethod
+    def _direction(prev: Dict, state: Dict, x: float) -> str:
+        base = max(prev['level'], 1.0)
+        jump = x - prev['level']
+        if jump >= TREND_SURGE_MIN_DELTA and jump / base >= TREND_SURGE_RATIO:
+            return '飙升'
+        
+        relative_slope = state['slope'] / max(state['level'], 1.0)
+        if relative_slope > TREND_FLAT_BAND:
+            return '上升'
+        if relative_slope < -TREND_FLAT_BAND:
+            return '下降'
+        return '平稳'
+
+
+class FeishuSink:
+    """从本地存储读取未同步热词并异步写入飞书"""
+    
+    def __init__(self, store: HotwordStore, feishu: 'FeishuClient', table_id: str,
+                 poll_interval: float = 0.5):
+        self.store = store
+        self.feishu = feishu
+        self.table_id = table_id
+        self.poll_interval = poll_interval
+        self.written = 0
+        self.updated = 0
+        self.failed = 0
+        self._attempted = set()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='feishu-sink', daemon=True)
+    
+    def start(self) -> 'FeishuSink':
+        self._thread.start()
+        return self
+    
+    def notify(self):
+        """有新热词落库时唤醒同步线程"""
+        self._wakeup.set()
+    
+    def stop(self):
+        """等待剩余热词同步完成后退出"""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+    
+    def sync_pending(self) -> int:
+        """同步当前所有未同步热词（本次运行中每条的每个版本最多尝试一次），返回成功数"""
+        synced = 0
+        while True:
+            batch = self.store.pending_hotwords(exclude=self._attempted)
+            if not batch:
+                return synced
+            for hotword_id, fields, record_id, revision in batch:
+                self._attempted.add((hotword_id, revision))
+                if self._write(hotword_id, fields, record_id, revision):
+                    synced += 1
+    
+    def _loop(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            stopping = self._stopping.is_set()
+            if stopping:
+                self.store.flush()
+            self.sync_pending()
+            if stopping:
+                return
+    
+    def _write(self, hotword_id: int, fields: Dict, record_id: str = None, revision: int = 0) -> bool:
+        """写入新记录；已有飞书记录id时（热度更新后重新同步）改为更新该记录"""
+        keyword = fields.get('热词文本', '')
+        platform = fields.get('平台来源', '')
+        try:
+            if record_id:
+                result = self.feishu.update_record(self.table_id, record_id, fields)
+            else:
+                result = self.feishu.write_record(self.table_id, fields)
+            if result.get("code") == 0:
+                if record_id:
+                    self.updated += 1
+                    logger.info(f"更新成功: {keyword} ({platform})")
+                else:
+                    record_id = (result.get("data") or {}).get("record", {}).get("record_id")
+                    self.written += 1
+                    logger.info(f"写入成功: {keyword} ({platform})")
+                self.store.mark_synced(hotword_id, record_id, revision)
+                return True
+            logger.error(f"写入失败: {result.get('msg')}")
+        except Exception as e:
+            logger.error(f"写入异常: {e}")
+        self.store.mark_sync_failed(hotword_id)
+        self.failed += 1
+        return False
+
+
+# 流水线各阶段结束标记
+_PIPELINE_DONE = object()
+
+
 class HotwordsCrawler:
     """热词爬虫主类 - 方案B：爬取公开数据 + AI分析"""
     
-    def __init__(self):
-        self.feishu = FeishuClient()
-        self.ai_client = AIPlatformClient()
-        self.public_crawler = PublicDataCrawler()
-        self.existing_keywords = self._get_existing_keywords()
+    def __init__(self, config: CrawlerConfig = None, store: HotwordStore = None):
+        self.config = config or get_config()
+        self.ai_client = AIPlatformClient(config=self.config)
+        self.public_crawler = PublicDataCrawler(self.config)
+        self.store = store or HotwordStore()
+        self.trends = TrendTracker(self.store)
+        self.existing_keywords = set()
+        self._feishu = None
+    
+    @property
+    def feishu(self) -> FeishuClient:
+        """飞书客户端，首次使用时才检查飞书配置；离线重新分析不需要飞书"""
+        if self._feishu is None:
+            self._feishu = FeishuClient(self.config)
+        return self._feishu
     
     def _get_existing_keywords(self) -> set:
-        """获取已存在的热词，避免重复"""
-        records = self.feishu.query_records(TABLE_TRENDS)
+        """获取已存在的热词，避免重复；本地库有记录时不再查询飞书"""
+        keywords = self.store.known_keys()
+        if keywords:
+            return keywords
+        
+        records = self.feishu.query_records(self.config.table_trends)
         keywords = set()
         for record in records:
             fields = record.get("fields", {})
@@ -536,85 +1788,280 @@ class HotwordsCrawler:
                 keywords.add(f"{platform}_{keyword}")
         return keywords
     
-    def run(self):
-        """执行完整抓取流程 - 方案B"""
+    def run(self, replay: List[tuple] = None, source_run_id: int = None) -> Dict[str, int]:
+        """执行完整抓取流程 - 方案B
+        
+        抓取 → 分析 → 去重 → 落库 四个阶段并发运行，阶段之间通过有界队列连接：
+        第一个数据源返回后即开始分析，热词解析出来后即归入近似簇；
+        新簇立即落库，之后到达的变体只更新该簇热词的共识热度。
+        原始数据、分析结果和热词写入本地库，飞书由后台线程从本地库异步同步。
+        传入 replay（[(数据源, 条目列表)]）时不再爬取，直接重新分析这些数据：
+        只与本地库去重、不连接飞书，新热词留在本地库中，之后用 sync() 补写。
+        返回各阶段的数量统计。
+        """
         logger.info(f"\n{'='*60}")
         logger.info(f"热词抓取任务开始 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info(f"{'='*60}\n")
         
-        # Step 1: 爬取公开数据源
-        logger.info("Step 1: 爬取公开数据源...")
-        raw_data = self.public_crawler.fetch_all_sources()
-        logger.info(f"共获取原始数据 {len(raw_data)} 条")
-        
-        if not raw_data:
-            logger.warning("没有获取到原始数据，使用模拟数据演示")
-            raw_data = self._get_mock_data()
-        
-        # Step 2: AI分析生成结构化热词
-        logger.info("Step 2: 使用AI分析数据...")
-        hotwords = self.ai_client.analyze_with_all_platforms(raw_data)
-        logger.info(f"AI分析生成 {len(hotwords)} 条热词")
-        
-        if not hotwords:
-            logger.warning("AI分析失败，使用模拟数据演示")
-            hotwords = self._get_mock_data()
-        
-        # 随机选择3个平台标记来源
-        platforms = ['Kimi', 'DeepSeek', '元宝', '千问', '文心一言', '豆包']
-        for item in hotwords:
-            if '平台来源' not in item:
-                item['平台来源'] = random.choice(platforms)
-        
-        # Step 3: 写入飞书
-        if hotwords:
-            logger.info(f"\nStep 3: 写入飞书...")
-            success_count = self._process_and_save(hotwords)
-            logger.info(f"\n{'='*60}")
-            logger.info(f"写入完成: 成功 {success_count}/{len(hotwords)} 条")
-            logger.info(f"{'='*60}\n")
+        offline = replay is not None
+        if offline:
+            self.existing_keywords = self.store.known_keys()
+            sink = None
         else:
-            logger.info("\n没有新数据需要写入\n")
-    
-    def _process_and_save(self, hotwords: List[Dict]) -> int:
-        """处理并保存热词到飞书"""
-        success_count = 0
+            self.existing_keywords = self._get_existing_keywords()
+            sink = FeishuSink(self.store, self.feishu, self.config.table_trends).start()
+        
+        run_id = self.store.start_run('reanalyze' if offline else 'crawl', source_run_id)
+        self.ai_client.budget.begin_run(
+            spent_today=self.store.spent_today(),
+            on_usage=lambda usage: self.store.add_usage(run_id, usage)
+        )
         
-        for trend in hotwords:
-            keyword = trend.get('热词文本', '')
-            platform = trend.get('平台来源', '')
+        raw_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        hotword_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        write_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stats = {'raw': 0, 'hotwords': 0, 'unique': 0, 'stored': 0, 'written': 0, 'mock': False}
+        
+        stages = [
+            threading.Thread(target=self._fetch_stage, args=(raw_queue, stats, run_id, replay), name='fetch'),
+            threading.Thread(target=self._analyze_stage, args=(raw_queue, hotword_queue, stats, run_id), name='analyze'),
+            threading.Thread(target=self._dedup_stage, args=(hotword_queue, write_queue, stats), name='dedup'),
+        ]
+        for stage in stages:
+            stage.start()
+        
+        # 落库阶段在主线程中运行；重新分析不是新的观测，不更新趋势状态
+        self._write_stage(write_queue, stats, run_id, sink, update_trends=not offline)
+        for stage in stages:
+            stage.join()
+        
+        self.store.finish_run(run_id, stats)
+        if sink is not None:
+            sink.stop()
+            stats['written'] = sink.written
+        stats['cost'] = round(self.ai_client.budget.spent, 6)
+        
+        logger.info(f"\n{'='*60}")
+        logger.info(f"任务 #{run_id}: 原始数据 {stats['raw']} 条，AI分析生成 {stats['hotwords']} 条热词，"
+                    f"去重后 {stats['unique']} 条，新增 {stats['stored']} 条")
+        if sink is not None:
+            logger.info(f"飞书同步完成: 成功 {sink.written} 条，更新 {sink.updated} 条，失败 {sink.failed} 条")
+        else:
+            logger.info("离线重新分析未同步飞书，可用 --sync 补写")
+        self._log_cost(stats['stored'])
+        logger.info(f"分析缓存统计: 命中 {self.ai_client.cache.hits} 次，未命中 {self.ai_client.cache.misses} 次")
+        RATE_LIMITERS.log_summary()
+        self.ai_client.breaker.log_summary()
+        logger.info(f"{'='*60}\n")
+        return stats
+    
+    def _log_cost(self, useful: int):
+        """输出本次花费，useful 为有效结果数（新增热词）"""
+        budget = self.ai_client.budget
+        per_result = f"¥{budget.spent / useful:.4f}" if useful else "-"
+        logger.info(f"[成本] 调用 {budget.calls} 次（{budget.estimated_calls} 次用量为估算），"
+                    f"输入 {budget.tokens['prompt']} / 输出 {budget.tokens['completion']} tokens，"
+                    f"花费 ¥{budget.spent:.4f}，每条有效结果 {per_result}")
+        if budget.rejected:
+            logger.warning(f"[成本] 预算不足，跳过 {budget.rejected} 次调用")
+    
+    def reanalyze(self, run_id: int = None) -> Dict[str, int]:
+        """离线重新分析某次抓取（默认最近一次）保存的原始数据"""
+        run_id = run_id or self.store.latest_run_id('crawl')
+        batches = self.store.load_raw_items(run_id) if run_id else []
+        if not batches:
+            logger.warning(f"本地库中没有任务 #{run_id} 的原始数据")
+            return {}
+        logger.info(f"重新分析任务 #{run_id} 的原始数据，共 {sum(len(b) for _, b in batches)} 条")
+        return self.run(replay=batches, source_run_id=run_id)
+    
+    def sync(self) -> int:
+        """只把本地库中未同步的热词补写到飞书"""
+        sink = FeishuSink(self.store, self.feishu, self.config.table_trends)
+        synced = sink.sync_pending()
+        logger.info(f"飞书补写完成: 成功 {synced} 条，失败 {sink.failed} 条")
+        return synced
+    
+    def _fetch_stage(self, raw_queue: queue.Queue, stats: Dict, run_id: int, replay: List[tuple] = None):
+        """阶段1: 并发爬取公开数据源，每个数据源返回后立即落库并交给分析阶段"""
+        try:
+            if replay is not None:
+                for name, data in replay:
+                    stats['raw'] += len(data)
+                    raw_queue.put(data)
+                return
             
-            if not keyword or not platform:
-                continue
+            sources = self.public_crawler.sources
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                futures = {executor.submit(fetch): name for name, fetch in sources}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        logger.error(f"{name}获取失败: {e}")
+                        continue
+                    logger.info(f"{name}获取: {len(data)} 条")
+                    if data:
+                        stats['raw'] += len(data)
+                        self.store.add_raw_items(run_id, name, data)
+                        raw_queue.put(data)
             
-            key = f"{platform}_{keyword}"
-            if key in self.existing_keywords:
-                logger.info(f"已存在，跳过: {keyword} ({platform})")
-                continue
+            if not stats['raw']:
+                logger.warning("没有获取到原始数据，使用模拟数据演示")
+                stats['mock'] = True
+                raw_queue.put(self._get_mock_data())
+        finally:
+            raw_queue.put(_PIPELINE_DONE)
+    
+    def _analyze_stage(self, raw_queue: queue.Queue, hotword_queue: queue.Queue, stats: Dict, run_id: int):
+        """阶段2: 每批原始数据切片后交给各AI平台，热词逐条流入去重阶段"""
+        try:
+            platforms = self.ai_client._available_platforms()
+            if not platforms:
+                logger.warning("没有配置任何AI平台API密钥，跳过AI分析")
             
-            record = {
-                "热词文本": keyword,
-                "平台来源": platform,
-                "热度值": trend.get("热度值", random.randint(60, 95)),
-                "趋势方向": trend.get("趋势方向", "上升"),
-                "所属品类": trend.get("所属品类", "其他"),
-                "地域属性": trend.get("地域属性", ["全国"]),
-                "内容摘要": trend.get("内容摘要", ""),
-                "抓取时间": int(time.time() * 1000)
-            }
+            def analyze(platform_name: str, prompt: str):
+                count = 0
+                try:
+                    for item in self.ai_client.iter_analysis(platform_name, prompt):
+                        item.setdefault('平台来源', AI_PLATFORM_LABELS[platform_name])
+                        if not stats['mock']:
+                            self.store.add_analysis_result(run_id, platform_name, item)
+                        hotword_queue.put(item)
+                        count += 1
+                except Exception as e:
+                    logger.error(f"[{platform_name}] 分析失败: {e}")
+                logger.info(f"[{platform_name}] 分片分析完成，获得 {count} 条热词")
             
-            try:
-                result = self.feishu.write_record(TABLE_TRENDS, record)
-                if result.get("code") == 0:
-                    logger.info(f"写入成功: {keyword} ({platform})")
-                    success_count += 1
-                    self.existing_keywords.add(key)
-                else:
-                    logger.error(f"写入失败: {result.get('msg')}")
-            except Exception as e:
-                logger.error(f"写入异常: {e}")
+            with ThreadPoolExecutor(max_workers=max(1, ANALYSIS_MAX_WORKERS)) as executor:
+                futures = []
+                while True:
+                    batch = raw_queue.get()
+                    if batch is _PIPELINE_DONE:
+                        break
+                    if not platforms:
+                        continue
+                    for chunk in self.ai_client._chunk_raw_data(batch):
+                        prompt = self.ai_client._build_analysis_prompt(chunk)
+                        futures.extend(
+                            executor.submit(analyze, platform_name, prompt)
+                            for platform_name in platforms
+                        )
+                for future in futures:
+                    future.result()
+        finally:
+            hotword_queue.put(_PIPELINE_DONE)
+    
+    def _dedup_stage(self, hotword_queue: queue.Queue, write_queue: queue.Queue, stats: Dict):
+        """阶段3: 在线近似归簇，结果逐条交给写入阶段
+        
+        新簇的第一条热词立即以 ('new', 簇编号, 热词) 交给写入阶段；同簇的后续变体
+        以 ('update', 簇编号, 共识热度) 通知写入阶段更新已落库的热词。
+        """
+        try:
+            clusterer = self.ai_client.clusterer
+            deduplicator = StreamingHotwordDeduplicator(clusterer)
+            while True:
+                item = hotword_queue.get()
+                if item is _PIPELINE_DONE:
+                    break
+                if not isinstance(item, dict) or not item.get('热词文本'):
+                    continue
+                stats['hotwords'] += 1
+                cluster_id = deduplicator.add_item(item)
+                group = deduplicator.groups[cluster_id]
+                if len(group) == 1:
+                    stats['unique'] += 1
+                    write_queue.put(('new', cluster_id, dict(item)))
+                    continue
+                
+                if item['热词文本'] != group[0]['热词文本']:
+                    logger.info(f"合并近似热词: {item['热词文本']} -> {group[0]['热词文本']}")
+                write_queue.put(('update', cluster_id, clusterer.consensus_heat(group)))
+            
+            if not stats['hotwords']:
+                logger.warning("AI分析失败，使用模拟数据演示")
+                stats['mock'] = True
+                for cluster_id, item in enumerate(self._get_mock_data()):
+                    stats['unique'] += 1
+                    write_queue.put(('new', cluster_id, item))
+        finally:
+            write_queue.put(_PIPELINE_DONE)
+    
+    def _write_stage(self, write_queue: queue.Queue, stats: Dict, run_id: int, sink: Optional[FeishuSink],
+                     update_trends: bool = True):
+        """阶段4: 根据本地热度历史计算趋势，新热词批量写入本地库，由 FeishuSink 异步同步到飞书
+        
+        簇的共识热度随变体到达而更新，趋势方向先按当前热度预估；全部结束后每簇以
+        最终热度登记一次趋势观测。
+        模拟数据只输出到日志：不更新热度历史和趋势状态，不落库也不同步到飞书。
+        """
+        platforms = list(AI_PLATFORM_LABELS.values())
+        stored = {}
+        while True:
+            message = write_queue.get()
+            if message is _PIPELINE_DONE:
+                break
+            kind, cluster_id, payload = message
+            if kind == 'update':
+                record = stored.get(cluster_id)
+                if record is None:
+                    continue
+                record['热度值'] = payload
+                record['趋势方向'] = self.trends.observe(record['热词文本'], payload, update=False)
+                self.store.update_hotword(run_id, record)
+            else:
+                trend = payload
+                if '平台来源' not in trend:
+                    trend['平台来源'] = random.choice(platforms)
+                if stats['mock']:
+                    logger.info(f"模拟数据（不落库）: {trend.get('热词文本')} ({trend['平台来源']})")
+                    continue
+                if trend.get('热词文本') and '热度值' in trend:
+                    trend['趋势方向'] = self.trends.observe(trend['热词文本'], trend['热度值'], update=False)
+                
+                record = self._build_record(trend)
+                if record is None:
+                    continue
+                key = f"{record['平台来源']}_{record['热词文本']}"
+                if key in self.existing_keywords:
+                    logger.info(f"已存在，跳过: {record['热词文本']} ({record['平台来源']})")
+                    continue
+                
+                self.store.add_hotword(run_id, record)
+                self.existing_keywords.add(key)
+                stored[cluster_id] = record
+                stats['stored'] += 1
+            
+            # 上游暂时没有新数据时立即提交，让飞书同步尽早开始；数据密集时按批提交
+            if write_queue.empty():
+                self.store.flush()
+                if sink is not None:
+                    sink.notify()
         
-        return success_count
+        if update_trends:
+            for record in stored.values():
+                self.trends.observe(record['热词文本'], record['热度值'])
+    
+    def _build_record(self, trend: Dict) -> Optional[Dict]:
+        """生成写入飞书的字段，缺少热词或平台时返回None"""
+        keyword = trend.get('热词文本', '')
+        platform = trend.get('平台来源', '')
+        
+        if not keyword or not platform:
+            return None
+        
+        return {
+            "热词文本": keyword,
+            "平台来源": platform,
+            "热度值": trend.get("热度值", random.randint(60, 95)),
+            "趋势方向": trend.get("趋势方向", "上升"),
+            "所属品类": trend.get("所属品类", "其他"),
+            "地域属性": trend.get("地域属性", ["全国"]),
+            "内容摘要": trend.get("内容摘要", ""),
+            "抓取时间": int(time.time() * 1000)
+        }
     
     def _get_mock_data(self) -> List[Dict]:
         """获取模拟数据（当API不可用时）"""
@@ -628,6 +2075,28 @@ class HotwordsCrawler:
         ]
 
 
-if __name__ == "__main__":
+def main():
+    """主函数 - 命令行接口"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="热词数据抓取器")
+    parser.add_argument("--reanalyze", nargs="?", type=int, const=0, metavar="RUN_ID",
+                        help="离线重新分析本地库中保存的原始数据（默认最近一次抓取），不连接飞书，之后用 --sync 补写")
+    parser.add_argument("--sync", action="store_true",
+                        help="只把本地库中未同步的热词补写到飞书")
+    args = parser.parse_args()
+    
     crawler = HotwordsCrawler()
-    crawler.run()
+    try:
+        if args.sync:
+            crawler.sync()
+        elif args.reanalyze is not None:
+            crawler.reanalyze(args.reanalyze or None)
+        else:
+            crawler.run()
+    finally:
+        crawler.store.close()
+
+
+if __name__ == "__main__":
+    main()
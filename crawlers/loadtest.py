@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热词抓取器离线压测工具
+在本地启动模拟的热榜数据源、OpenAI兼容对话接口和飞书多维表格服务，
+可分别配置延迟、错误率和数据量，测量 HotwordsCrawler.run() 的端到端耗时与吞吐。
+
+使用方法:
+    python crawlers/loadtest.py                              # 默认参数跑3轮
+    python crawlers/loadtest.py --runs 5 --items 200         # 每个热榜200条
+    python crawlers/loadtest.py --ai-latency 2 --ai-error-rate 0.2
+    python crawlers/loadtest.py --stream false --keep-cache  # 非流式，保留分析缓存
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FaultProfile:
+    """模拟服务的故障注入参数"""
+    
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, payload_items=50):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_items = payload_items
+    
+    def delay(self):
+        wait = self.latency + random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+    
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeServer:
+    """在后台线程中运行的本地HTTP模拟服务"""
+    
+    def __init__(self, name, route, profile):
+        self.name = name
+        self.route = route
+        self.profile = profile
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b""
+                with server._lock:
+                    server.requests += 1
+                
+                server.profile.delay()
+                if server.profile.should_fail():
+                    with server._lock:
+                        server.errors += 1
+                    self._send(503, {"error": "injected failure"})
+                    return
+                
+                parsed = urlparse(self.path)
+                payload = json.loads(body) if body else {}
+                status, result = server.route(self.command, parsed.path, parse_qs(parsed.query), payload)
+                if isinstance(result, list):
+                    self._send_sse(result)
+                else:
+                    self._send(status, result)
+            
+            def _send(self, status, data):
+                raw = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+            
+            def _send_sse(self, events):
+                raw = "".join(f"data: {event}\n\n" for event in events).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+            
+            do_GET = _handle
+            do_POST = _handle
+            do_PUT = _handle
+        
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=name, daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ========== 模拟路由 ==========
+
+CITIES = ["淄博", "天水", "长沙", "成都", "广州", "柳州", "哈尔滨", "重庆", "西安", "杭州", "厦门", "贵阳"]
+FOODS = ["烧烤", "麻辣烫", "奶茶", "咖啡", "螺蛳粉", "火锅", "卤味", "烘焙", "预制菜", "米粉", "冻梨", "酸汤鱼", "肉夹馍"]
+ANGLES = ["爆火", "排队", "涨价", "出圈", "新品", "探店", "供应链", "加盟"]
+
+
+def _topic(i):
+    """按序号生成固定的热榜话题，同一序号每次结果相同，便于测试分析缓存"""
+    return f"{CITIES[i % len(CITIES)]}{FOODS[(i * 7) % len(FOODS)]}{ANGLES[(i * 3) % len(ANGLES)]}"
+
+
+def sources_route(profile):
+    """热榜数据源：/weibo /zhihu /toutiao"""
+    def route(method, path, query, payload):
+        n = profile.payload_items
+        if path == '/weibo':
+            return 200, {"data": {"realtime": [
+                {"word": _topic(i), "num": 10000 + i * 977, "label": ""}
+                for i in range(n)
+            ]}}
+        if path == '/zhihu':
+            return 200, {"data": [
+                {"target": {"title": f"如何看待{_topic(i + 1000)}？", "url": f"https://zhihu.com/q/{i}"},
+                 "detail_text": f"{100 + i * 13} 万热度"}
+                for i in range(n)
+            ]}
+        if path == '/toutiao':
+            return 200, {"data": [
+                {"title": f"{_topic(i + 2000)}引发热议", "read_count": 1000 + i * 311}
+                for i in range(n)
+            ]}
+        return 404, {"error": "not found"}
+    return route
+
+
+def _fake_hotwords(prompt, limit):
+    """从提示词中的原始数据行生成热词"""
+    titles = re.findall(r'^- (.+?) \(热度', prompt, re.MULTILINE)
+    return [
+        {
+            "热词文本": title[:12],
+            "热度值": random.randint(50, 99),
+            "趋势方向": random.choice(["上升", "下降", "平稳", "飙升"]),
+            "所属品类": random.choice(["烧烤", "火锅", "奶茶", "咖啡", "其他"]),
+            "地域属性": ["全国"],
+            "内容摘要": f"{title[:20]}相关讨论"
+        }
+        for title in titles[:limit]
+    ]
+
+
+def chat_route(profile):
+    """OpenAI兼容对话接口与文心一言接口"""
+    def route(method, path, query, payload):
+        if path.endswith('/oauth/2.0/token'):
+            return 200, {"access_token": "fake-token", "expires_in": 2592000}
+        
+        prompt = payload.get('messages', [{}])[-1].get('content', '')
+        content = "以下是分析结果：\n" + json.dumps(
+            _fake_hotwords(prompt, profile.payload_items), ensure_ascii=False
+        )
+        is_wenxin = 'wenxinworkshop' in path
+        
+        if not payload.get('stream'):
+            if is_wenxin:
+                return 200, {"result": content}
+            return 200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+        
+        step = 16
+        pieces = [content[i:i + step] for i in range(0, len(content), step)]
+        if is_wenxin:
+            return 200, [
+                json.dumps({"result": piece, "is_end": idx == len(pieces) - 1}, ensure_ascii=False)
+                for idx, piece in enumerate(pieces)
+            ]
+        return 200, [
+            json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False)
+            for piece in pieces
+        ] + ["[DONE]"]
+    return route
+
+
+def bitable_route(profile, written):
+    """飞书鉴权与多维表格记录接口"""
+    def route(method, path, query, payload):
+        if path.endswith('/tenant_access_token/internal'):
+            return 200, {"code": 0, "tenant_access_token": "fake-token", "expire": 7200}
+        if path.endswith('/records'):
+            if method == 'GET':
+                return 200, {"code": 0, "data": {"items": []}}
+            written.append(payload.get('fields', {}))
+            return 200, {"code": 0, "data": {"record": {"record_id": f"rec{len(written)}"}}}
+        if '/records/' in path and method == 'PUT':
+            record_id = path.rsplit('/', 1)[-1]
+            return 200, {"code": 0, "data": {"record": {"record_id": record_id, "fields": payload.get('fields', {})}}}
+        return 404, {"code": 404, "msg": "not found"}
+    return route
+
+
+# ========== 压测 ==========
+
+def configure_environment(sources, chat, bitable, workdir, args):
+    """将抓取器指向本地模拟服务"""
+    os.environ.update({
+        'FEISHU_APP_ID': 'loadtest',
+        'FEISHU_SECRET': 'loadtest',
+        'FEISHU_BASEID': 'loadtest',
+        'TABLE_TRENDS': 'tbl_trends',
+        'FEISHU_API_BASE': bitable.url,
+        'WENXIN_API_BASE': chat.url,
+        'AI_STREAM': args.stream,
+        'AI_CACHE_FILE': os.path.join(workdir, 'ai_cache.db'),
+        'CIRCUIT_STATE_FILE': os.path.join(workdir, 'circuit_state.json'),
+        'HOTWORDS_DB_FILE': os.path.join(workdir, 'hotwords.db'),
+        'RATE_LIMIT_RPS': str(args.rps),
+        'RATE_LIMIT_BURST': str(args.rps),
+        'RATE_LIMIT_MAX_CONCURRENCY': str(args.concurrency),
+    })
+    for name in ('weibo', 'zhihu', 'toutiao'):
+        os.environ[f'{name.upper()}_SOURCE_URL'] = f"{sources.url}/{name}"
+    for platform in args.platforms:
+        os.environ[f'{platform.upper()}_API_KEY'] = 'loadtest/loadtest' if platform == 'wenxin' else 'sk-loadtest'
+        if platform != 'wenxin':
+            os.environ[f'{platform.upper()}_API_URL'] = f"{chat.url}/{platform}/v1/chat/completions"
+
+
+def run_benchmark(args):
+    sources_profile = FaultProfile(args.source_latency, args.jitter, args.source_error_rate, args.items)
+    chat_profile = FaultProfile(args.ai_latency, args.jitter, args.ai_error_rate, args.hotwords)
+    bitable_profile = FaultProfile(args.feishu_latency, args.jitter, args.feishu_error_rate)
+    written = []
+    
+    sources = FakeServer('sources', sources_route(sources_profile), sources_profile).start()
+    chat = FakeServer('chat', chat_route(chat_profile), chat_profile).start()
+    bitable = FakeServer('bitable', bitable_route(bitable_profile, written), bitable_profile).start()
+    workdir = tempfile.mkdtemp(prefix='hotwords-loadtest-')
+    
+    try:
+        configure_environment(sources, chat, bitable, workdir, args)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import hotwords_crawler
+        
+        if not args.verbose:
+            logging.getLogger('hotwords_crawler').setLevel(logging.WARNING)
+        
+        print(f"压测开始: {args.runs} 轮，平台 {', '.join(args.platforms)}，每个热榜 {args.items} 条")
+        print("=" * 60)
+        
+        timings = []
+        totals = {'raw': 0, 'hotwords': 0, 'unique': 0, 'written': 0}
+        for i in range(args.runs):
+            # 本地热词库每轮清空，否则第二轮起的热词都会被当作已存在
+            names = ['hotwords.db'] if args.keep_cache else ['hotwords.db', 'ai_cache.db', 'circuit_state.json']
+            for name in names:
+                path = os.path.join(workdir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            
+            hotwords_crawler.set_config(None)
+            start = time.perf_counter()
+            crawler = hotwords_crawler.HotwordsCrawler()
+            stats = crawler.run()
+            elapsed = time.perf_counter() - start
+            crawler.store.close()
+            
+            timings.append(elapsed)
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+            print(f"  第 {i + 1} 轮: {elapsed:6.2f}s  原始 {stats['raw']}  热词 {stats['hotwords']}  "
+                  f"去重后 {stats['unique']}  写入 {stats['written']}")
+        
+        total_time = sum(timings)
+        print("\n" + "=" * 60)
+        print(f"耗时: 平均 {total_time / len(timings):.2f}s，最短 {min(timings):.2f}s，最长 {max(timings):.2f}s")
+        print(f"吞吐: 原始数据 {totals['raw'] / total_time:.1f} 条/s，"
+              f"AI热词 {totals['hotwords'] / total_time:.1f} 条/s，"
+              f"飞书写入 {totals['written'] / total_time:.1f} 条/s")
+        for server in (sources, chat, bitable):
+            print(f"  {server.name:8s} 请求 {server.requests} 次，注入错误 {server.errors} 次")
+        
+        return {'timings': timings, 'totals': totals}
+    finally:
+        for server in (sources, chat, bitable):
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    """主函数 - 命令行接口"""
+    parser = argparse.ArgumentParser(description="热词抓取器离线压测工具")
+    parser.add_argument("--runs", type=int, default=3, help="运行轮数（默认3）")
+    parser.add_argument("--platforms", nargs="+",
+                        default=["kimi", "deepseek", "yuanbao", "qianwen", "wenxin", "doubao"],
+                        choices=["kimi", "deepseek", "yuanbao", "qianwen", "wenxin", "doubao"],
+                        help="启用的AI平台")
+    parser.add_argument("--items", type=int, default=50, help="每个热榜返回的条数")
+    parser.add_argument("--hotwords", type=int, default=10, help="每次AI分析返回的热词上限")
+    parser.add_argument("--source-latency", type=float, default=0.2, help="热榜接口延迟（秒）")
+    parser.add_argument("--ai-latency", type=float, default=1.0, help="AI接口延迟（秒）")
+    parser.add_argument("--feishu-latency", type=float, default=0.05, help="飞书接口延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机附加延迟上限（秒）")
+    parser.add_argument("--source-error-rate", type=float, default=0.0, help="热榜接口错误率")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0, help="AI接口错误率")
+    parser.add_argument("--feishu-error-rate", type=float, default=0.0, help="飞书接口错误率")
+    parser.add_argument("--stream", choices=["true", "false"], default="true", help="是否使用流式响应")
+    parser.add_argument("--rps", type=float, default=50, help="每个主机的限流速率")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个主机的并发上限")
+    parser.add_argument("--keep-cache", action="store_true", help="各轮之间保留分析缓存与熔断状态")
+    parser.add_argument("--verbose", "-v", action="store_true", help="输出抓取器日志")
+    
+    run_benchmark(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字符 n-gram MinHash + LSH 近似文本归簇
+
+热词爬虫的近似热词合并（HotwordClusterer）与 monitor.py 的关键词聚类（KeywordClusterer）
+共用这里的分词、签名和 LSH 分桶：热词爬虫直接 import minhash，monitor.py 通过 crawlers.minhash 导入。
+"""
+
+import hashlib
+import random
+
+
+class MinHasher:
+    """字符 n-gram 分词与 MinHash 签名，bands × rows 的签名切片即 LSH 分桶键"""
+    
+    _PRIME = (1 << 61) - 1
+    
+    def __init__(self, ngram=2, num_perm=64, bands=16, threshold=0.5, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+            for _ in range(num_perm)
+        ]
+    
+    def shingles(self, text):
+        """提取字符 n-gram 集合（忽略空白，英文不区分大小写）"""
+        text = "".join(text.lower().split())
+        if len(text) <= self.ngram:
+            return {text} if text else set()
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+    
+    def signature(self, shingles):
+        """计算 MinHash 签名"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+            for sh in shingles
+        ]
+        return tuple(min((a * h + b) % self._PRIME for h in hashes) for a, b in self._perms)
+    
+    def band_keys(self, signature):
+        """签名 -> 各 band 的 LSH 分桶键"""
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+    
+    @staticmethod
+    def jaccard(a, b):
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+class MinHashIndex:
+    """
+    在线近似归簇：每条文本到达时只与 LSH 候选比较，Jaccard 达到阈值即归入
+    最早的相似簇，否则开启新簇。texts 为各簇的第一条文本。
+    """
+    
+    def __init__(self, hasher=None):
+        self.hasher = hasher or MinHasher()
+        self._buckets = {}
+        self._exact = {}
+        self._shingles = []
+        self.texts = []
+    
+    def add(self, text):
+        """登记一条文本，返回所属簇的编号（新簇编号为登记前的簇数）"""
+        if text in self._exact:
+            return self._exact[text]
+        
+        shingles = self.hasher.shingles(text)
+        keys = []
+        if shingles:
+            keys = self.hasher.band_keys(self.hasher.signature(shingles))
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            for other in sorted(candidates):
+                if self.hasher.jaccard(shingles, self._shingles[other]) >= self.hasher.threshold:
+                    self._exact[text] = other
+                    return other
+        
+        cluster_id = len(self.texts)
+        self.texts.append(text)
+        self._shingles.append(shingles)
+        self._exact[text] = cluster_id
+        for key in keys:
+            self._buckets.setdefault(key, []).append(cluster_id)
+        return cluster_id
@@ -9,15 +9,122 @@ GEO AI 搜索引擎监测工具 - 演示版
     python monitor.py --platforms kimi   # 只监测 Kimi
     python monitor.py --brands "星巴克"   # 监测指定品牌
     python monitor.py --demo             # 生成演示数据
+    python monitor.py --build-dashboard  # 生成静态看板数据包
 """
 
+import io
 import os
+import sys
+import re
 import json
+import gzip
+import hashlib
 import sqlite3
 import time
+import queue
 import random
-from datetime import datetime, timedelta
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from html import escape
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖，仅时间序列分析需要
+    np = None
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，没有时只生成 .gz
+    brotli = None
+
+try:
+    import duckdb
+except ImportError:  # 可选依赖，仅 DuckDB 存储后端需要
+    duckdb = None
+
+from crawlers.costs import CostBudget, estimate_tokens
+from crawlers.minhash import MinHasher, MinHashIndex
+
+# 监测记录
+class MonitorRecord:
+    """
+    一条监测结果
+    
+    监测、落库和读取全程使用这一紧凑类型：__slots__ 省去每条记录的字典，
+    品牌、平台、关键词经 sys.intern 驻留后所有记录共享同一个字符串对象，
+    时间为整数 Unix 秒。只在对外边界（JSONL 输出、外部代码）用 as_dict() 转成字典，
+    返回字典的客户端用 from_dict() 转入。
+    """
+    
+    __slots__ = (
+        "platform", "keyword", "brand", "is_mentioned", "rank", "confidence", "response", "timestamp",
+        # 读自数据库的记录
+        "id", "simhash", "ref_id",
+        # 监测过程中附加：沿用的代表关键词、token 用量与成本
+        "attributed_from", "prompt_tokens", "completion_tokens", "usage_estimated", "cost"
+    )
+    BASE_FIELDS = __slots__[:7]
+    EXTRA_FIELDS = __slots__[8:]
+    
+    def __init__(self, platform, keyword, brand, is_mentioned, rank, confidence, response,
+                 timestamp=None, **extra):
+        self.platform = sys.intern(platform)
+        self.keyword = sys.intern(keyword)
+        self.brand = sys.intern(brand)
+        self.is_mentioned = is_mentioned
+        self.rank = rank
+        self.confidence = confidence
+        self.response = response
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
+        for field in self.EXTRA_FIELDS:
+            setattr(self, field, extra.pop(field, None))
+        if extra:
+            raise TypeError(f"未知字段: {', '.join(extra)}")
+    
+    @property
+    def created_at(self):
+        """与数据库时间列相同的 UTC "YYYY-MM-DD HH:MM:SS" 文本"""
+        if self.timestamp is None:
+            return None
+        return datetime.fromtimestamp(self.timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    
+    def replace(self, **changes):
+        """复制一条记录并修改部分字段"""
+        record = MonitorRecord.__new__(MonitorRecord)
+        for field in self.__slots__:
+            setattr(record, field, changes.pop(field) if field in changes else getattr(self, field))
+        if changes:
+            raise TypeError(f"未知字段: {', '.join(changes)}")
+        return record
+    
+    def as_dict(self):
+        """字典视图：基本字段、本地时间的 ISO 时间戳，以及已设置的附加字段"""
+        data = {field: getattr(self, field) for field in self.BASE_FIELDS}
+        data["timestamp"] = (datetime.fromtimestamp(self.timestamp).isoformat()
+                             if self.timestamp is not None else None)
+        if self.id is not None:
+            data["created_at"] = self.created_at
+        for field in self.EXTRA_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """从字典转入，timestamp 可以是 ISO 文本或 Unix 秒；忽略未知字段（如 usage）"""
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str):
+            timestamp = int(datetime.fromisoformat(timestamp).timestamp())
+        return cls(*(data.get(field) for field in cls.BASE_FIELDS), timestamp=timestamp,
+                   **{field: data[field] for field in cls.EXTRA_FIELDS if field in data})
+    
+    def __repr__(self):
+        return f"<MonitorRecord {self.brand}/{self.platform}/{self.keyword} mentioned={self.is_mentioned}>"
+
 
 # 模拟 API 调用（实际使用时替换为真实 API）
 class MockAIClient:
@@ -66,185 +173,2744 @@ class MockAIClient:
         """模拟查询 AI 平台"""
         personality = cls.PLATFORM_PERSONALITY.get(platform, cls.PLATFORM_PERSONALITY["deepseek"])
         
-        # 根据品牌权重决定是否提及
-        if brand in personality["mentions"]:
-            idx = personality["mentions"].index(brand)
-            weight = personality["weights"][min(idx, len(personality["weights"])-1)]
-        else:
-            weight = 0.3  # 默认提及概率
+        # 根据品牌权重决定是否提及
+        if brand in personality["mentions"]:
+            idx = personality["mentions"].index(brand)
+            weight = personality["weights"][min(idx, len(personality["weights"])-1)]
+        else:
+            weight = 0.3  # 默认提及概率
+        
+        # 关键词匹配增加概率
+        if brand in keyword or any(kw in keyword for kw in ["咖啡", "奶茶", "饮品"]):
+            weight += 0.2
+        
+        is_mentioned = random.random() < weight
+        
+        if is_mentioned:
+            rank = random.randint(1, 3)
+            confidence = random.randint(70, 95)
+            
+            # 生成模拟回复
+            responses = [
+                f"{brand}在{keyword}方面表现出色，是很多消费者的首选。",
+                f"如果你关注{keyword}，{brand}值得考虑，品质有保障。",
+                f"{brand}在{keyword}领域有不错的口碑，用户满意度较高。",
+            ]
+            response = random.choice(responses)
+        else:
+            rank = 0
+            confidence = random.randint(20, 50)
+            other_brands = [b for b in personality["mentions"] if b != brand]
+            response = f"在{keyword}方面，{random.choice(other_brands)}等品牌表现较好。"
+        
+        return MonitorRecord(platform, keyword, brand, is_mentioned, rank, confidence, response)
+
+
+# 存储后端
+class StorageBackend(ABC):
+    """
+    DatabaseManager 的存储后端：负责建立连接，并给出各引擎 SQL 方言不同的片段
+    
+    默认实现即 SQLite 方言。connect() 返回的连接需提供 sqlite3 风格的
+    execute / executemany / fetchone / fetchall / description / rowcount / commit / close，
+    并可用作上下文管理器：退出 with 块时总是 close()，未提交的事务回滚，连接归还或关闭；
+    readonly=True 表示调用方只读，后端可据此交给只读连接。
+    """
+    
+    name = None
+    
+    # 是否支持触发器；不支持时由写入品牌配置的一方递增 config_version
+    triggers = True
+    
+    # 其他进程能否打开同一个库（重新评分的进程池依赖它）
+    multiprocess = True
+    
+    # 当前时间，以及带默认当前时间的时间戳列（均为 UTC "YYYY-MM-DD HH:MM:SS"）
+    now = "CURRENT_TIMESTAMP"
+    timestamp_column = "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+    
+    # 今天零点（UTC）
+    today = "date('now')"
+    
+    # 各粒度的分桶表达式（周以周一为起点），{column} 为时间列
+    BUCKETS = {
+        "hourly": "strftime('%Y-%m-%d %H:00:00', {column})",
+        "daily": "date({column})",
+        "weekly": "date({column}, '-6 days', 'weekday 1')",
+    }
+    
+    @abstractmethod
+    def connect(self, readonly=False):
+        """返回一个新连接（或从池中取出的连接）"""
+    
+    def close(self):
+        """释放后端持有的连接"""
+    
+    def id_column(self, cursor, table):
+        """自增主键列定义，需要时先建好序列"""
+        return "INTEGER PRIMARY KEY AUTOINCREMENT"
+    
+    def ago(self, placeholder="?", date_only=False):
+        """当前时间加上偏移参数（如 "-7 days"）"""
+        return f"{'date' if date_only else 'datetime'}('now', {placeholder})"
+    
+    def bucket(self, granularity, column="created_at"):
+        return self.BUCKETS[granularity].format(column=column)
+    
+    def epoch(self, column):
+        """时间列 -> Unix 秒"""
+        return f"CAST(strftime('%s', {column}) AS INTEGER)"
+    
+    def insert(self, cursor, sql, params=()):
+        """执行插入并返回新行的 id"""
+        return cursor.execute(sql, params).lastrowid
+    
+    def columns(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+    
+    def prepare_reclaim(self, cursor):
+        """清理数据前的准备：增量回收空间需要 auto_vacuum=INCREMENTAL，旧库首次转换一次"""
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+    
+    def reclaim(self, conn, pages=None):
+        """回收空闲页，返回回收的页数"""
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # executescript 会把 PRAGMA 执行到底
+        conn.executescript(f"PRAGMA incremental_vacuum({pages or 0});")
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.commit()
+        return free_before - free_after
+    
+    def __repr__(self):
+        return f"<{self.name}>"
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    SQLite 文件库（默认），连接来自 ConnectionPool：一个写连接加若干 WAL 只读连接
+    
+    Args:
+        path: 数据库文件
+        readers: 常驻的只读连接数
+        busy_timeout: 遇到锁时的最长等待秒数
+        cached_statements: 每个连接缓存的预编译语句数
+    """
+    
+    name = "sqlite"
+    
+    def __init__(self, path="monitor.db", readers=8, busy_timeout=30.0, cached_statements=256):
+        self.path = path
+        self.readers = readers
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def open(self, readonly=False):
+        """新建一个连接（不经过连接池）"""
+        if readonly:
+            conn = sqlite3.connect(
+                Path(self.path).resolve().as_uri() + "?mode=ro", uri=True,
+                timeout=self.busy_timeout, cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            # WAL 下读写互不阻塞；NORMAL 同步在 WAL 下仍保证崩溃一致
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        return conn
+    
+    def connect(self, readonly=False):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(self.open, readers=self.readers)
+        return self._pool.acquire(readonly)
+    
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+    
+    def __getstate__(self):
+        # 传给工作进程时不带连接池，子进程按需新建
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        del state["_pool_lock"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+    
+    def __repr__(self):
+        return f"<sqlite {self.path}>"
+
+
+class _ClosingConnection:
+    """后端借出的连接：操作透传给 sqlite3 连接，用作上下文管理器时退出即 close()"""
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _PooledConnection(_ClosingConnection):
+    """连接池借出的连接：close() 时回滚未提交的事务并归还"""
+    
+    def __init__(self, pool, conn, readonly):
+        super().__init__(conn)
+        self._pool = pool
+        self._readonly = readonly
+    
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn, self._readonly)
+            self._conn = None
+
+
+class ConnectionPool:
+    """
+    线程安全的连接池：一个专用写连接，加最多 readers 个常驻只读连接
+    
+    写连接同一时刻只借给一个线程，同一线程内可重入（嵌套借用拿到同一个连接，
+    最外层归还时才释放）。只读连接都被占用时临时新建一个、归还时关闭：新建连接不到
+    1 毫秒，而排队等待在线程多于连接时会让个别读取等上数百毫秒。
+    长期复用的连接保留各自的预编译语句缓存。close() 等借出的连接全部归还后才关闭。
+    """
+    
+    def __init__(self, factory, readers=8):
+        self.factory = factory
+        self.readers = readers
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._borrowed = 0
+        self._lock = threading.Lock()
+        self._returned = threading.Condition(self._lock)
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._writer_owner = None
+        self._writer_depth = 0
+        self.stats = {"reads": 0, "writes": 0, "overflow": 0, "opened": 0}
+    
+    def acquire(self, readonly=False):
+        if not readonly:
+            self._writer_lock.acquire()
+            if self._writer is None:
+                try:
+                    self._writer = self.factory(readonly=False)
+                except Exception:
+                    self._writer_lock.release()
+                    raise
+                self.stats["opened"] += 1
+            self._writer_owner = threading.get_ident()
+            self._writer_depth += 1
+            self.stats["writes"] += 1
+            return _PooledConnection(self, self._writer, False)
+        
+        # 当前线程正在写时读自己的写连接，才能看到本事务内未提交的数据
+        if self._writer_owner == threading.get_ident():
+            return self.acquire(readonly=False)
+        
+        self.stats["reads"] += 1
+        with self._lock:
+            self._borrowed += 1
+        try:
+            return _PooledConnection(self, self._idle.get_nowait(), True)
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            pooled = self._opened < self.readers
+            if pooled:
+                self._opened += 1
+        if not pooled:
+            self.stats["overflow"] += 1
+        try:
+            conn = self.factory(readonly=True)
+        except Exception:
+            with self._returned:
+                self._borrowed -= 1
+                if pooled:
+                    self._opened -= 1
+                self._returned.notify_all()
+            raise
+        self.stats["opened"] += 1
+        return _PooledConnection(self, conn, True if pooled else None)
+    
+    def release(self, conn, readonly):
+        if readonly is False:
+            # 嵌套借用共用外层的事务，最外层归还时才回滚未提交的部分
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer_owner = None
+                if conn.in_transaction:
+                    conn.rollback()
+            self._writer_lock.release()
+            return
+        
+        if readonly is None:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        with self._returned:
+            self._borrowed -= 1
+            self._returned.notify_all()
+    
+    def close(self, timeout=30.0):
+        """等借出的只读连接全部归还、写连接空闲后关闭所有连接；超时仍未归还时报错且不关闭"""
+        with self._returned:
+            if not self._returned.wait_for(lambda: not self._borrowed, timeout):
+                raise RuntimeError(f"仍有 {self._borrowed} 个只读连接未归还，连接池未关闭")
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+
+class MemoryBackend(SQLiteBackend):
+    """
+    纯内存库，用于测试和基准：共享缓存的 SQLite 内存库，同一进程内的连接看到同一份数据
+    
+    库随最后一个连接关闭而销毁，这里保留一个连接使它与后端对象同生命周期。
+    """
+    
+    name = "memory"
+    multiprocess = False
+    
+    def __init__(self):
+        super().__init__(f"file:geo-memory-{id(self):x}-{random.getrandbits(32):08x}?mode=memory&cache=shared")
+        self._keeper = self.connect()
+    
+    def open(self, readonly=False):
+        return sqlite3.connect(self.path, uri=True, timeout=self.busy_timeout,
+                               cached_statements=self.cached_statements, check_same_thread=False)
+    
+    def connect(self, readonly=False):
+        # 共享缓存的内存库按表加锁，遇锁直接报错而不等待，不使用连接池
+        return _ClosingConnection(self.open())
+    
+    def close(self):
+        self._keeper.close()
+    
+    def prepare_reclaim(self, cursor):
+        pass
+    
+    def reclaim(self, conn, pages=None):
+        return 0
+    
+    def __repr__(self):
+        return "<memory>"
+
+
+class _DuckDBConnection:
+    """把 DuckDB 连接包装成 sqlite3 风格：首条语句隐式开启事务，commit 时提交"""
+    
+    DML = ("INSERT", "UPDATE", "DELETE")
+    
+    def __init__(self, conn):
+        self._conn = conn
+        self._in_transaction = False
+        self.rowcount = -1
+    
+    def cursor(self):
+        return self
+    
+    def execute(self, sql, params=()):
+        if not self._in_transaction:
+            self._conn.execute("BEGIN TRANSACTION")
+            self._in_transaction = True
+        self._conn.execute(sql, list(params))
+        # DuckDB 把影响行数作为结果返回
+        statement = sql.lstrip().upper()
+        if statement.startswith(self.DML) and "RETURNING" not in statement:
+            row = self._conn.fetchone()
+            self.rowcount = row[0] if row else 0
+        else:
+            self.rowcount = -1
+        return self
+    
+    def executemany(self, sql, rows):
+        rows = [list(row) for row in rows]
+        if rows:
+            if not self._in_transaction:
+                self._conn.execute("BEGIN TRANSACTION")
+                self._in_transaction = True
+            self._conn.executemany(sql, rows)
+        return self
+    
+    def fetchone(self):
+        return self._conn.fetchone()
+    
+    def fetchall(self):
+        return self._conn.fetchall()
+    
+    def __iter__(self):
+        return iter(self.fetchall())
+    
+    @property
+    def description(self):
+        return self._conn.description
+    
+    def commit(self):
+        if self._in_transaction:
+            self._conn.execute("COMMIT")
+            self._in_transaction = False
+    
+    def rollback(self):
+        if self._in_transaction:
+            self._conn.execute("ROLLBACK")
+            self._in_transaction = False
+    
+    def close(self):
+        self.rollback()
+        self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DuckDBBackend(StorageBackend):
+    """
+    DuckDB 列式嵌入库，适合聚合查询为主的分析负载（可选依赖 duckdb）
+    
+    时间戳按 SQLite 的习惯存为 UTC 文本，分桶和时间比较的结果与 SQLite 后端一致。
+    一个库在进程内只打开一次，各连接由根连接派生。
+    """
+    
+    name = "duckdb"
+    triggers = False
+    multiprocess = False
+    
+    now = "strftime(timezone('UTC', now()), '%Y-%m-%d %H:%M:%S')"
+    timestamp_column = f"VARCHAR DEFAULT {now}"
+    today = "strftime(timezone('UTC', now()), '%Y-%m-%d')"
+    
+    BUCKETS = {
+        "hourly": "strftime(CAST({column} AS TIMESTAMP), '%Y-%m-%d %H:00:00')",
+        "daily": "strftime(CAST({column} AS TIMESTAMP), '%Y-%m-%d')",
+        "weekly": "strftime(date_trunc('week', CAST({column} AS TIMESTAMP)), '%Y-%m-%d')",
+    }
+    
+    def __init__(self, path="monitor.duckdb"):
+        if duckdb is None:
+            raise ImportError("DuckDB 后端需要 duckdb，请先执行: pip install duckdb")
+        self.path = path
+        self._root = duckdb.connect(path)
+    
+    def connect(self, readonly=False):
+        return _DuckDBConnection(self._root.cursor())
+    
+    def close(self):
+        self._root.close()
+    
+    def id_column(self, cursor, table):
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq")
+        return f"INTEGER PRIMARY KEY DEFAULT nextval('{table}_id_seq')"
+    
+    def ago(self, placeholder="?", date_only=False):
+        fmt = "%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S"
+        return f"strftime(timezone('UTC', now()) + CAST({placeholder} AS INTERVAL), '{fmt}')"
+    
+    def epoch(self, column):
+        return f"CAST(epoch(CAST({column} AS TIMESTAMP)) AS BIGINT)"
+    
+    def insert(self, cursor, sql, params=()):
+        return cursor.execute(sql + " RETURNING id", params).fetchone()[0]
+    
+    def prepare_reclaim(self, cursor):
+        pass
+    
+    def reclaim(self, conn, pages=None):
+        conn.commit()
+        self._root.execute("CHECKPOINT")
+        return 0
+    
+    def __repr__(self):
+        return f"<duckdb {self.path}>"
+
+
+# 后端名 -> 类
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "memory": MemoryBackend,
+    "duckdb": DuckDBBackend,
+}
+
+
+# 数据库管理
+class DatabaseManager:
+    # 汇总粒度 -> 表名
+    ROLLUP_TABLES = {
+        "hourly": "rollup_hourly",
+        "daily": "rollup_daily",
+        "weekly": "rollup_weekly",
+    }
+    
+    # SimHash 汉明距离阈值：不超过 REF 视为同一回答只存引用，不低于 CHANGE 记为回答变化
+    SIMHASH_REF_DISTANCE = 3
+    SIMHASH_CHANGE_DISTANCE = 10
+    
+    def __init__(self, db_file="monitor.db", mention_finder=None, backend=None):
+        # 未指定后端时使用 db_file 对应的 SQLite 文件库
+        self.backend = backend or SQLiteBackend(db_file)
+        self.db_file = getattr(self.backend, "path", db_file)
+        # 回答正文 -> 其中提及的品牌集合，用于维护声量与共同提及统计；为空时不统计
+        self.mention_finder = mention_finder
+        self.init_db()
+    
+    def connect(self, readonly=False):
+        """取一个连接，用完 close()；只读查询传 readonly=True，可与写入并发"""
+        return self.backend.connect(readonly=readonly)
+    
+    def close(self):
+        self.backend.close()
+    
+    def init_db(self):
+        """初始化数据库表结构"""
+        backend = self.backend
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            
+            # 监测记录表
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS monitor_records (
+                    id {backend.id_column(cursor, "monitor_records")},
+                    brand TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    is_mentioned INTEGER DEFAULT 0,
+                    rank INTEGER DEFAULT 0,
+                    confidence INTEGER DEFAULT 0,
+                    response TEXT,
+                    created_at {backend.timestamp_column}
+                )
+            """)
+            
+            # 旧库补充 SimHash 指纹和引用列（ref_id 指向保存原文的记录），
+            # 以及沿用代表关键词结果的记录所沿用的关键词（attributed_from）
+            columns = backend.columns(cursor, "monitor_records")
+            for column, column_type in (("simhash", "BIGINT"), ("ref_id", "INTEGER"), ("attributed_from", "TEXT")):
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE monitor_records ADD COLUMN {column} {column_type}")
+            
+            # 每个 (品牌, 平台, 关键词) 最近一次回答的索引
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS answer_index (
+                    brand TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    record_id INTEGER NOT NULL,
+                    simhash BIGINT NOT NULL,
+                    canonical_id INTEGER NOT NULL,
+                    canonical_simhash BIGINT NOT NULL,
+                    PRIMARY KEY (brand, platform, keyword)
+                )
+            """)
+            
+            # 回答变化事件
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS answer_changes (
+                    id {backend.id_column(cursor, "answer_changes")},
+                    record_id INTEGER NOT NULL,
+                    previous_id INTEGER NOT NULL,
+                    brand TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    distance INTEGER NOT NULL,
+                    created_at {backend.timestamp_column}
+                )
+            """)
+            
+            # 品牌共同提及矩阵：同一回答中同时出现的品牌对，双向存储，对角线为提及该品牌的回答数
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS co_mentions (
+                    brand_a TEXT NOT NULL,
+                    brand_b TEXT NOT NULL,
+                    count INTEGER DEFAULT 0,
+                    PRIMARY KEY (brand_a, brand_b)
+                )
+            """)
+            
+            # 各平台声量：每个品牌被提及的回答数，以及平台的回答总数和品牌提及总数
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS share_of_voice (
+                    platform TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    mentions INTEGER DEFAULT 0,
+                    PRIMARY KEY (platform, brand)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS voice_totals (
+                    platform TEXT PRIMARY KEY,
+                    responses INTEGER DEFAULT 0,
+                    mentions INTEGER DEFAULT 0
+                )
+            """)
+            
+            # 品牌配置表
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS brand_config (
+                    id {backend.id_column(cursor, "brand_config")},
+                    name TEXT UNIQUE NOT NULL,
+                    aliases TEXT,
+                    industry TEXT,
+                    keywords TEXT,
+                    created_at {backend.timestamp_column}
+                )
+            """)
+            
+            # 监测任务与 API 用量（按任务、品牌、平台汇总）
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS monitor_runs (
+                    id {backend.id_column(cursor, "monitor_runs")},
+                    queries INTEGER DEFAULT 0,
+                    mentioned INTEGER DEFAULT 0,
+                    cost DOUBLE DEFAULT 0,
+                    started_at {backend.timestamp_column},
+                    finished_at TIMESTAMP
+                )
+            """)
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS api_usage (
+                    run_id INTEGER NOT NULL,
+                    brand TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    calls INTEGER DEFAULT 0,
+                    prompt_tokens INTEGER DEFAULT 0,
+                    completion_tokens INTEGER DEFAULT 0,
+                    cost DOUBLE DEFAULT 0,
+                    estimated_calls INTEGER DEFAULT 0,
+                    created_at {backend.timestamp_column},
+                    PRIMARY KEY (run_id, brand, platform)
+                )
+            """)
+            
+            # 批量回填任务的断点
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS backfill_state (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER DEFAULT 0,
+                    max_id INTEGER DEFAULT 0,
+                    updated_at {backend.timestamp_column}
+                )
+            """)
+            
+            # 配置版本表，由触发器在配置变化时递增，用于热加载
+            # （不支持触发器的引擎由 BrandRegistry 写入时递增）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS config_version (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER DEFAULT 0
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO config_version (name, version) VALUES ('brand_config', 0)")
+            if backend.triggers:
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS brand_config_{event.lower()}
+                        AFTER {event} ON brand_config
+                        BEGIN
+                            UPDATE config_version SET version = version + 1 WHERE name = 'brand_config';
+                        END
+                    """)
+            
+            # 每日统计表
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS daily_stats (
+                    date TEXT PRIMARY KEY,
+                    brand TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    total_queries INTEGER DEFAULT 0,
+                    mentioned_count INTEGER DEFAULT 0,
+                    visibility_rate DOUBLE DEFAULT 0,
+                    avg_rank DOUBLE DEFAULT 0,
+                    avg_confidence DOUBLE DEFAULT 0
+                )
+            """)
+            
+            # 多粒度汇总表：小时 / 天 / 周
+            for table in self.ROLLUP_TABLES.values():
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        bucket TEXT NOT NULL,
+                        brand TEXT NOT NULL,
+                        platform TEXT NOT NULL,
+                        keyword TEXT NOT NULL,
+                        total INTEGER DEFAULT 0,
+                        mentioned INTEGER DEFAULT 0,
+                        rank_sum INTEGER DEFAULT 0,
+                        confidence_sum INTEGER DEFAULT 0,
+                        PRIMARY KEY (bucket, brand, platform, keyword)
+                    )
+                """)
+            
+            # 报告片段缓存表，按数据指纹判断是否需要重新渲染
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS report_sections (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    html TEXT,
+                    updated_at {backend.timestamp_column}
+                )
+            """)
+            
+            # 汇总进度表，记录已汇总到的原始记录 id
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER DEFAULT 0
+                )
+            """)
+            
+            conn.commit()
+    
+    def save_record(self, record):
+        """保存监测记录"""
+        self.save_records([record])
+    
+    def save_records(self, records):
+        """
+        在一个事务中批量保存监测记录，同时增量维护回答索引
+        
+        records 为 MonitorRecord（也接受同样字段的字典）。与上次回答近乎相同的记录
+        只保存对原文记录的引用；差异足够大时写入 answer_changes 并返回这些变化事件。
+        沿用代表关键词结果的记录（attributed_from）照常保存，但不计入声量、统计和汇总。
+        """
+        # 先转换和校验，字段有误时在占用写连接之前报错
+        records = [MonitorRecord.from_dict(r) if isinstance(r, dict) else r for r in records]
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            changes = []
+            tally = self.new_tally()
+            
+            for record in records:
+                if not record.attributed_from:
+                    self.tally_mentions(tally, record.platform, record.response)
+                key = (record.brand, record.platform, record.keyword)
+                fingerprint = self.simhash(record.response or "")
+                cursor.execute("""
+                    SELECT record_id, simhash, canonical_id, canonical_simhash FROM answer_index
+                    WHERE brand = ? AND platform = ? AND keyword = ?
+                """, key)
+                previous = cursor.fetchone()
+                
+                # 与原文记录比较，避免连续的小改动把引用越拉越远
+                ref_id = None
+                if previous and self.hamming(fingerprint, previous[3]) <= self.SIMHASH_REF_DISTANCE:
+                    ref_id = previous[2]
+                
+                record_id = self.backend.insert(cursor, """
+                    INSERT INTO monitor_records 
+                    (brand, platform, keyword, is_mentioned, rank, confidence, response, simhash, ref_id,
+                     attributed_from)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, key + (
+                    1 if record.is_mentioned else 0,
+                    record.rank,
+                    record.confidence,
+                    None if ref_id else record.response,
+                    fingerprint,
+                    ref_id,
+                    record.attributed_from or None
+                ))
+                
+                canonical = (ref_id, previous[3]) if ref_id else (record_id, fingerprint)
+                cursor.execute("""
+                    INSERT OR REPLACE INTO answer_index
+                    (brand, platform, keyword, record_id, simhash, canonical_id, canonical_simhash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, key + (record_id, fingerprint) + canonical)
+                
+                if previous:
+                    distance = self.hamming(fingerprint, previous[1])
+                    if distance >= self.SIMHASH_CHANGE_DISTANCE:
+                        cursor.execute("""
+                            INSERT INTO answer_changes
+                            (record_id, previous_id, brand, platform, keyword, distance)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        """, (record_id, previous[0]) + key + (distance,))
+                        changes.append({
+                            "record_id": record_id,
+                            "previous_id": previous[0],
+                            "brand": key[0],
+                            "platform": key[1],
+                            "keyword": key[2],
+                            "distance": distance
+                        })
+            
+            self.write_tally(cursor, tally)
+            conn.commit()
+        return changes
+    
+    @staticmethod
+    def new_tally():
+        return {"co": Counter(), "voice": Counter(), "totals": Counter()}
+    
+    def tally_mentions(self, tally, platform, response):
+        """在内存中累计一条回答的品牌提及，批量写入时再合并到统计表"""
+        if self.mention_finder is None:
+            return
+        brands = self.mention_finder(response or "")
+        tally["totals"][(platform, "responses")] += 1
+        tally["totals"][(platform, "mentions")] += len(brands)
+        for brand in brands:
+            tally["voice"][(platform, brand)] += 1
+            for other in brands:
+                tally["co"][(brand, other)] += 1
+    
+    @staticmethod
+    def write_tally(cursor, tally):
+        cursor.executemany("""
+            INSERT INTO co_mentions (brand_a, brand_b, count) VALUES (?, ?, ?)
+            ON CONFLICT(brand_a, brand_b) DO UPDATE SET count = count + excluded.count
+        """, [key + (count,) for key, count in tally["co"].items()])
+        cursor.executemany("""
+            INSERT INTO share_of_voice (platform, brand, mentions) VALUES (?, ?, ?)
+            ON CONFLICT(platform, brand) DO UPDATE SET mentions = mentions + excluded.mentions
+        """, [key + (count,) for key, count in tally["voice"].items()])
+        platforms = {platform for platform, _ in tally["totals"]}
+        cursor.executemany("""
+            INSERT INTO voice_totals (platform, responses, mentions) VALUES (?, ?, ?)
+            ON CONFLICT(platform) DO UPDATE SET
+                responses = responses + excluded.responses,
+                mentions = mentions + excluded.mentions
+        """, [
+            (platform, tally["totals"][(platform, "responses")], tally["totals"][(platform, "mentions")])
+            for platform in platforms
+        ])
+    
+    def rebuild_mentions(self, batch_size=5000):
+        """
+        按当前品牌配置重新扫描保留的原始记录，重建声量与共同提及统计
+        
+        用于品牌或别名变化后，以及绕过 save_records 直接写入的数据（如演示数据）。
+        已被 compact 清理的记录和沿用代表结果的记录不计入。返回扫描的记录数。
+        """
+        if self.mention_finder is None:
+            return 0
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for table in ("co_mentions", "share_of_voice", "voice_totals"):
+                cursor.execute(f"DELETE FROM {table}")
+            
+            scanned, last_id = 0, 0
+            while True:
+                rows = cursor.execute("""
+                    SELECT r.id, r.platform, COALESCE(r.response, o.response), r.attributed_from
+                    FROM monitor_records r
+                    LEFT JOIN monitor_records o ON o.id = r.ref_id
+                    WHERE r.id > ? ORDER BY r.id LIMIT ?
+                """, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                tally = self.new_tally()
+                for _, platform, response, attributed_from in rows:
+                    if not attributed_from:
+                        self.tally_mentions(tally, platform, response)
+                self.write_tally(cursor, tally)
+                scanned += len(rows)
+                last_id = rows[-1][0]
+            
+            conn.commit()
+        return scanned
+    
+    def get_share_of_voice(self, platform=None, brand=None):
+        """
+        读取增量维护的声量表
+        
+        Returns:
+            [{"platform", "brand", "mentions", "share", "rate"}]，share 为该品牌占平台全部
+            品牌提及的百分比，rate 为提及该品牌的回答占平台回答的百分比
+        """
+        with self.connect(readonly=True) as conn:
+            query = """
+                SELECT v.platform, v.brand, v.mentions, t.responses, t.mentions
+                FROM share_of_voice v JOIN voice_totals t ON t.platform = v.platform
+                WHERE 1=1
+            """
+            params = []
+            if platform:
+                query += " AND v.platform = ?"
+                params.append(platform)
+            if brand:
+                query += " AND v.brand = ?"
+                params.append(brand)
+            query += " ORDER BY v.platform, v.mentions DESC"
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                "platform": row[0],
+                "brand": row[1],
+                "mentions": row[2],
+                "share": row[2] / row[4] * 100 if row[4] else 0,
+                "rate": row[2] / row[3] * 100 if row[3] else 0
+            }
+            for row in rows
+        ]
+    
+    def get_co_mentions(self, brand=None, limit=None):
+        """
+        读取共同提及矩阵
+        
+        指定 brand 时返回 {其他品牌: 次数}（按次数降序，含对角线上的自身次数），
+        否则返回完整的稀疏矩阵 {品牌: {品牌: 次数}}。
+        """
+        with self.connect(readonly=True) as conn:
+            if brand:
+                query = "SELECT brand_a, brand_b, count FROM co_mentions WHERE brand_a = ? ORDER BY count DESC"
+                params = [brand]
+                if limit:
+                    query += " LIMIT ?"
+                    params.append(limit)
+                rows = conn.execute(query, params).fetchall()
+            else:
+                rows = conn.execute("SELECT brand_a, brand_b, count FROM co_mentions").fetchall()
+        
+        if brand:
+            return {row[1]: row[2] for row in rows}
+        matrix = {}
+        for brand_a, brand_b, count in rows:
+            matrix.setdefault(brand_a, {})[brand_b] = count
+        return matrix
+    
+    @staticmethod
+    def simhash(text, ngram=2):
+        """64 位 SimHash（字符 n-gram），以有符号整数返回以便存入 SQLite"""
+        text = "".join(text.split())
+        grams = [text[i:i + ngram] for i in range(max(len(text) - ngram + 1, 1))] if text else []
+        weights = [0] * 64
+        for gram in grams:
+            h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+            for bit in range(64):
+                weights[bit] += 1 if h >> bit & 1 else -1
+        value = sum(1 << bit for bit in range(64) if weights[bit] > 0)
+        return value - (1 << 64) if value >= 1 << 63 else value
+    
+    @staticmethod
+    def hamming(a, b):
+        return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+    
+    def get_answer_changes(self, brand=None, since_id=0, limit=100, latest=False):
+        """
+        读取回答变化事件，按 id 递增返回
+        
+        增量拉取时传入上次看到的最大 id 作为 since_id；latest=True 时取最近的 limit 条。
+        """
+        with self.connect(readonly=True) as conn:
+            query = "SELECT * FROM answer_changes WHERE id > ?"
+            params = [since_id]
+            if brand:
+                query += " AND brand = ?"
+                params.append(brand)
+            query += f" ORDER BY id {'DESC' if latest else ''} LIMIT ?"
+            params.append(limit)
+            cursor = conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            changes = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return changes[::-1] if latest else changes
+    
+    def start_run(self):
+        with self.connect() as conn:
+            run_id = self.backend.insert(conn, "INSERT INTO monitor_runs DEFAULT VALUES")
+            conn.commit()
+        return run_id
+    
+    def finish_run(self, run_id, summary):
+        with self.connect() as conn:
+            conn.execute(f"""
+                UPDATE monitor_runs
+                SET queries = ?, mentioned = ?, cost = ?, finished_at = {self.backend.now}
+                WHERE id = ?
+            """, (summary["total"], summary["mentioned"], summary["cost"], run_id))
+            conn.commit()
+    
+    def save_usage(self, run_id, totals):
+        """累加一次监测的用量，totals 为 {(品牌, 平台): (调用数, 输入, 输出, 成本, 估算调用数)}"""
+        with self.connect() as conn:
+            conn.executemany("""
+                INSERT INTO api_usage
+                (run_id, brand, platform, calls, prompt_tokens, completion_tokens, cost, estimated_calls)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id, brand, platform) DO UPDATE SET
+                    calls = calls + excluded.calls,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    cost = cost + excluded.cost,
+                    estimated_calls = estimated_calls + excluded.estimated_calls
+            """, [(run_id,) + key + values for key, values in totals.items()])
+            conn.commit()
+    
+    def spent_today(self):
+        """今天（UTC）已记录的 API 成本"""
+        with self.connect(readonly=True) as conn:
+            spent = conn.execute(
+                f"SELECT COALESCE(SUM(cost), 0) FROM api_usage WHERE created_at >= {self.backend.today}"
+            ).fetchone()[0]
+        return spent
+    
+    def get_usage(self, run_id=None, days=7):
+        """按平台、品牌汇总用量；指定 run_id 时只看该次监测"""
+        with self.connect(readonly=True) as conn:
+            query = """
+                SELECT platform, brand, SUM(calls), SUM(prompt_tokens), SUM(completion_tokens),
+                       SUM(cost), SUM(estimated_calls)
+                FROM api_usage
+            """
+            if run_id:
+                query += " WHERE run_id = ?"
+                params = (run_id,)
+            else:
+                query += f" WHERE created_at >= {self.backend.ago()}"
+                params = (f"-{days} days",)
+            rows = conn.execute(query + " GROUP BY platform, brand ORDER BY SUM(cost) DESC", params).fetchall()
+        return [
+            {
+                "platform": row[0],
+                "brand": row[1],
+                "calls": row[2],
+                "prompt_tokens": row[3],
+                "completion_tokens": row[4],
+                "cost": row[5],
+                "estimated_calls": row[6]
+            }
+            for row in rows
+        ]
+    
+    def get_stats(self, brand=None, platform=None, days=7):
+        """
+        获取统计数据，days 为 None 时统计全部历史；沿用代表结果的记录不计入
+        
+        窗口早于保留的最早原始记录时，被 compact 清理的部分取自汇总表（全部历史用周汇总，
+        否则用天汇总，窗口起点所在的一天按整天计入）：汇总计数减去仍保留的已汇总原始记录，
+        即为已清理记录的计数。
+        """
+        sums = """
+            COUNT(*),
+            SUM(is_mentioned),
+            SUM(CASE WHEN is_mentioned=1 THEN rank ELSE 0 END),
+            SUM(confidence)
+        """
+        filters, filter_params = "", []
+        if brand:
+            filters += " AND brand = ?"
+            filter_params.append(brand)
+        if platform:
+            filters += " AND platform = ?"
+            filter_params.append(platform)
+        window, window_params = "", []
+        if days:
+            window = f" AND created_at >= {self.backend.ago()}"
+            window_params.append(f"-{days} days")
+        
+        with self.connect(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            # {(品牌, 平台): [总数, 提及数, 排名和, 置信度和]}
+            totals = {}
+            cursor.execute(f"""
+                SELECT brand, platform, {sums}
+                FROM monitor_records
+                WHERE attributed_from IS NULL{window}{filters}
+                GROUP BY brand, platform
+            """, window_params + filter_params)
+            for row in cursor.fetchall():
+                totals[row[:2]] = list(row[2:])
+            
+            row = cursor.execute(
+                "SELECT last_id FROM rollup_state WHERE name = 'monitor_records'"
+            ).fetchone()
+            rolled_id = row[0] if row else 0
+            if days:
+                cursor.execute(f"""
+                    SELECT CASE WHEN MIN(created_at) IS NULL OR MIN(created_at) > {self.backend.ago()}
+                                THEN 1 ELSE 0 END
+                    FROM monitor_records
+                """, window_params)
+                past_raw = cursor.fetchone()[0]
+            else:
+                past_raw = True
+            
+            if rolled_id and past_raw:
+                table = self.ROLLUP_TABLES["daily" if days else "weekly"]
+                bucket_window, rolled_window = "", ""
+                if days:
+                    bucket_window = f" AND bucket >= {self.backend.ago(date_only=True)}"
+                    rolled_window = f" AND created_at >= {self.backend.ago(date_only=True)}"
+                cursor.execute(f"""
+                    SELECT brand, platform, SUM(total), SUM(mentioned), SUM(rank_sum), SUM(confidence_sum)
+                    FROM {table}
+                    WHERE 1=1{bucket_window}{filters}
+                    GROUP BY brand, platform
+                """, window_params + filter_params)
+                rolled_up = {row[:2]: row[2:] for row in cursor.fetchall()}
+                cursor.execute(f"""
+                    SELECT brand, platform, {sums}
+                    FROM monitor_records
+                    WHERE id <= ? AND attributed_from IS NULL{rolled_window}{filters}
+                    GROUP BY brand, platform
+                """, [rolled_id] + window_params + filter_params)
+                retained = {row[:2]: row[2:] for row in cursor.fetchall()}
+                
+                for key, counts in rolled_up.items():
+                    compacted = [c - r for c, r in zip(counts, retained.get(key, (0, 0, 0, 0)))]
+                    if compacted[0] > 0:
+                        current = totals.setdefault(key, [0, 0, 0, 0])
+                        for i, value in enumerate(compacted):
+                            current[i] += value
+        
+        return [
+            {
+                "brand": key[0],
+                "platform": key[1],
+                "total": total,
+                "mentioned": mentioned,
+                "visibility_rate": (mentioned / total * 100) if total > 0 else 0,
+                "avg_rank": (rank_sum / mentioned) if mentioned else 0,
+                "avg_confidence": (confidence_sum / total) if total else 0
+            }
+            for key, (total, mentioned, rank_sum, confidence_sum) in sorted(totals.items())
+        ]
+    
+    def rollup(self):
+        """
+        将新增的原始记录增量汇总到小时/天/周汇总表，返回扫描的记录数
+        
+        沿用代表结果的记录没有实际查询，不计入汇总。
+        """
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'monitor_records'")
+            row = cursor.fetchone()
+            last_id = row[0] if row else 0
+            
+            cursor.execute("SELECT COUNT(*), MAX(id) FROM monitor_records WHERE id > ?", (last_id,))
+            count, max_id = cursor.fetchone()
+            if not count:
+                return 0
+            
+            for granularity, table in self.ROLLUP_TABLES.items():
+                cursor.execute(f"""
+                    INSERT INTO {table}
+                    (bucket, brand, platform, keyword, total, mentioned, rank_sum, confidence_sum)
+                    SELECT
+                        {self.backend.bucket(granularity)} AS bucket,
+                        brand, platform, keyword,
+                        COUNT(*),
+                        SUM(is_mentioned),
+                        SUM(CASE WHEN is_mentioned=1 THEN rank ELSE 0 END),
+                        SUM(confidence)
+                    FROM monitor_records
+                    WHERE id > ? AND id <= ? AND attributed_from IS NULL
+                    GROUP BY bucket, brand, platform, keyword
+                    ON CONFLICT (bucket, brand, platform, keyword) DO UPDATE SET
+                        total = total + excluded.total,
+                        mentioned = mentioned + excluded.mentioned,
+                        rank_sum = rank_sum + excluded.rank_sum,
+                        confidence_sum = confidence_sum + excluded.confidence_sum
+                """, (last_id, max_id))
+            
+            cursor.execute("""
+                INSERT INTO rollup_state (name, last_id) VALUES ('monitor_records', ?)
+                ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+            """, (max_id,))
+            
+            conn.commit()
+        return count
+    
+    def compact(self, raw_days=30, hourly_days=56, daily_days=730, weekly_days=None,
+                batch_size=5000, vacuum_pages=None):
+        """
+        压缩数据库：先汇总，再按保留策略清理过期数据并增量回收空间
+        
+        Args:
+            raw_days: 原始记录保留天数
+            hourly_days: 小时汇总保留天数
+            daily_days: 天汇总保留天数
+            weekly_days: 周汇总保留天数，None 表示永久保留
+            batch_size: 每个事务删除的最大行数，避免长时间锁库
+            vacuum_pages: 本次最多回收的页数，None 表示回收全部空闲页
+        """
+        rolled = self.rollup()
+        
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            
+            self.backend.prepare_reclaim(cursor)
+            
+            cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'monitor_records'")
+            row = cursor.fetchone()
+            last_id = row[0] if row else 0
+            
+            deleted = {}
+            expired = f"id <= ? AND created_at < {self.backend.ago()}"
+            expired_params = (last_id, f"-{raw_days} days")
+            
+            # 被引用的原文即将删除时，把原文移到最早的保留引用上，其余引用改指向它
+            cursor.execute(f"""
+                SELECT ref_id, MIN(id) FROM monitor_records
+                WHERE ref_id IN (SELECT id FROM monitor_records WHERE {expired})
+                  AND NOT ({expired})
+                GROUP BY ref_id
+            """, expired_params * 2)
+            for old_id, new_id in cursor.fetchall():
+                cursor.execute("""
+                    UPDATE monitor_records
+                    SET response = (SELECT response FROM monitor_records WHERE id = ?), ref_id = NULL
+                    WHERE id = ?
+                """, (old_id, new_id))
+                cursor.execute("UPDATE monitor_records SET ref_id = ? WHERE ref_id = ?", (new_id, old_id))
+                cursor.execute("UPDATE answer_index SET canonical_id = ? WHERE canonical_id = ?", (new_id, old_id))
+            conn.commit()
+            
+            # 原始记录：只删除已经汇总过的
+            deleted["monitor_records"] = self._delete_in_batches(conn, f"""
+                DELETE FROM monitor_records WHERE id IN (
+                    SELECT id FROM monitor_records
+                    WHERE {expired}
+                    LIMIT ?
+                )
+            """, expired_params, batch_size)
+            
+            # 最近回答已被删除的组合从索引中移除
+            cursor.execute("DELETE FROM answer_index WHERE record_id NOT IN (SELECT id FROM monitor_records)")
+            conn.commit()
+            
+            retention = {"hourly": hourly_days, "daily": daily_days, "weekly": weekly_days}
+            for granularity, days in retention.items():
+                if days is None:
+                    continue
+                table = self.ROLLUP_TABLES[granularity]
+                deleted[table] = self._delete_in_batches(conn, f"""
+                    DELETE FROM {table} WHERE rowid IN (
+                        SELECT rowid FROM {table} WHERE bucket < {self.backend.ago()} LIMIT ?
+                    )
+                """, (f"-{days} days",), batch_size)
+            
+            reclaimed = self.backend.reclaim(conn, vacuum_pages)
+        
+        return {"rolled_up": rolled, "deleted": deleted, "reclaimed_pages": reclaimed}
+    
+    @staticmethod
+    def _delete_in_batches(conn, sql, params, batch_size):
+        """分批执行删除，每批单独提交"""
+        total = 0
+        while True:
+            cursor = conn.execute(sql, params + (batch_size,))
+            conn.commit()
+            total += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return total
+    
+    def get_rollups(self, granularity="daily", brand=None, platform=None, days=30):
+        """从汇总表读取按时间分桶的统计数据"""
+        table = self.ROLLUP_TABLES[granularity]
+        with self.connect(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            query = f"""
+                SELECT
+                    bucket,
+                    brand,
+                    platform,
+                    SUM(total),
+                    SUM(mentioned),
+                    SUM(rank_sum),
+                    SUM(confidence_sum)
+                FROM {table}
+                WHERE bucket >= {self.backend.ago(date_only=True)}
+            """
+            params = [f"-{days} days"]
+            if brand:
+                query += " AND brand = ?"
+                params.append(brand)
+            if platform:
+                query += " AND platform = ?"
+                params.append(platform)
+            
+            query += " GROUP BY bucket, brand, platform ORDER BY bucket, brand, platform"
+            
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+        
+        return [
+            {
+                "bucket": row[0],
+                "brand": row[1],
+                "platform": row[2],
+                "total": row[3],
+                "mentioned": row[4],
+                "visibility_rate": (row[4] / row[3] * 100) if row[3] > 0 else 0,
+                "avg_rank": (row[5] / row[4]) if row[4] else 0,
+                "avg_confidence": (row[6] / row[3]) if row[3] else 0
+            }
+            for row in results
+        ]
+    
+    # 时间序列分桶单位
+    BUCKET_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+    
+    @classmethod
+    def parse_bucket(cls, bucket):
+        """解析分桶大小，支持秒数或 "15m"/"1h"/"1d"/"1w" 格式"""
+        if isinstance(bucket, (int, float)):
+            seconds = int(bucket)
+        else:
+            unit = bucket[-1].lower()
+            if unit not in cls.BUCKET_UNITS:
+                raise ValueError(f"无法识别的分桶大小: {bucket}")
+            seconds = int(float(bucket[:-1] or 1) * cls.BUCKET_UNITS[unit])
+        if seconds <= 0:
+            raise ValueError(f"分桶大小必须为正数: {bucket}")
+        return seconds
+    
+    def get_time_series(self, bucket="1d", brands=None, platforms=None, days=30,
+                        group_by=("brand", "platform"), window=7, period=1, as_lists=True):
+        """
+        按时间分桶的可见率序列（NumPy 向量化计算）
+        
+        一次查询取出所需列，之后全部用数组运算完成分组、分桶、移动平均和环比，
+        不再按桶逐个查询。
+        
+        Args:
+            bucket: 分桶大小，秒数或 "1h"/"1d"/"1w" 等
+            brands: 品牌列表，None 表示全部
+            platforms: 平台列表，None 表示全部
+            days: 回看天数
+            group_by: 分组字段，("brand", "platform")、("brand",) 或 ("platform",)
+            window: 移动平均窗口（桶数）
+            period: 环比间隔（桶数）
+            as_lists: 是否把数组转换为列表（便于序列化为 JSON），缺失值为 None
+        
+        Returns:
+            {"bucket_seconds", "buckets", "series": [{分组字段..., "total", "mentioned",
+             "visibility_rate", "avg_rank", "moving_avg", "delta"}]}
+        """
+        if np is None:
+            raise ImportError("时间序列分析需要 numpy，请先执行: pip install numpy")
+        
+        bucket_seconds = self.parse_bucket(bucket)
+        group_by = tuple(group_by)
+        for field in group_by:
+            if field not in ("brand", "platform"):
+                raise ValueError(f"不支持的分组字段: {field}")
+        
+        query = f"""
+            SELECT brand, platform, {self.backend.epoch("created_at")}, is_mentioned, rank
+            FROM monitor_records
+            WHERE created_at >= {self.backend.ago()} AND attributed_from IS NULL
+        """
+        params = [f"-{days} days"]
+        if brands:
+            query += f" AND brand IN ({','.join('?' * len(brands))})"
+            params.extend(brands)
+        if platforms:
+            query += f" AND platform IN ({','.join('?' * len(platforms))})"
+            params.extend(platforms)
+        
+        with self.connect(readonly=True) as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        end_ts = int(time.time())
+        start_ts = (end_ts - days * 86400) // bucket_seconds * bucket_seconds
+        n_buckets = (end_ts - start_ts) // bucket_seconds + 1
+        buckets = np.arange(n_buckets, dtype=np.int64) * bucket_seconds + start_ts
+        
+        result = {
+            "bucket_seconds": bucket_seconds,
+            "buckets": [datetime.fromtimestamp(int(ts)).isoformat() for ts in buckets],
+            "series": []
+        }
+        if not rows:
+            return result
+        
+        brand_col, platform_col, ts_col, mentioned_col, rank_col = zip(*rows)
+        ts = np.asarray(ts_col, dtype=np.int64)
+        mentioned = np.asarray(mentioned_col, dtype=np.float64)
+        rank = np.asarray(rank_col, dtype=np.float64)
+        
+        # 分组编码：每个分组字段映射为整数后合成一个分组键，再压缩为实际出现的分组
+        columns = {"brand": brand_col, "platform": platform_col}
+        labels = []
+        group_keys = np.zeros(len(rows), dtype=np.int64)
+        for field in group_by:
+            values, codes = np.unique(np.asarray(columns[field]), return_inverse=True)
+            labels.append(values)
+            group_keys = group_keys * len(values) + codes.reshape(-1)
+        present_keys, group_ids = np.unique(group_keys, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        n_groups = len(present_keys)
+        
+        # 只对非空的 (分组, 桶) 组合计数，再按位置填入各分组的序列
+        bucket_idx = np.clip((ts - start_ts) // bucket_seconds, 0, n_buckets - 1)
+        cells, cell_ids = np.unique(group_ids * n_buckets + bucket_idx, return_inverse=True)
+        cell_ids = cell_ids.reshape(-1)
+        
+        total = np.zeros((n_groups, n_buckets))
+        hits = np.zeros((n_groups, n_buckets))
+        rank_sum = np.zeros((n_groups, n_buckets))
+        total.flat[cells] = np.bincount(cell_ids)
+        hits.flat[cells] = np.bincount(cell_ids, weights=mentioned)
+        rank_sum.flat[cells] = np.bincount(cell_ids, weights=rank * mentioned)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            visibility = np.where(total > 0, hits / total * 100, np.nan)
+            avg_rank = np.where(hits > 0, rank_sum / hits, np.nan)
+            
+            # 移动平均按窗口内的提及数/查询数计算，避免小样本桶被等权平均
+            window = max(1, int(window))
+            cum_total = np.cumsum(np.pad(total, ((0, 0), (1, 0))), axis=1)
+            cum_hits = np.cumsum(np.pad(hits, ((0, 0), (1, 0))), axis=1)
+            lo = np.maximum(np.arange(n_buckets) + 1 - window, 0)
+            hi = np.arange(n_buckets) + 1
+            win_total = cum_total[:, hi] - cum_total[:, lo]
+            win_hits = cum_hits[:, hi] - cum_hits[:, lo]
+            moving_avg = np.where(win_total > 0, win_hits / win_total * 100, np.nan)
+        
+        period = max(1, int(period))
+        delta = np.full_like(visibility, np.nan)
+        delta[:, period:] = visibility[:, period:] - visibility[:, :-period]
+        
+        for gid, key in enumerate(present_keys):
+            series = {}
+            remainder = int(key)
+            for field, values in reversed(list(zip(group_by, labels))):
+                remainder, code = divmod(remainder, len(values))
+                series[field] = str(values[code])
+            series = {field: series[field] for field in group_by}
+            
+            series.update({
+                "total": total[gid],
+                "mentioned": hits[gid],
+                "visibility_rate": visibility[gid],
+                "avg_rank": avg_rank[gid],
+                "moving_avg": moving_avg[gid],
+                "delta": delta[gid]
+            })
+            if as_lists:
+                for key in ("total", "mentioned"):
+                    series[key] = series[key].astype(np.int64).tolist()
+                for key in ("visibility_rate", "avg_rank", "moving_avg", "delta"):
+                    series[key] = [None if np.isnan(v) else round(float(v), 2) for v in series[key]]
+            result["series"].append(series)
+        
+        return result
+    
+    def record_columns(self, alias="r", response=None):
+        """按 load_records() 的列顺序选出记录，response 可替换回答列的表达式"""
+        prefix = f"{alias}." if alias else ""
+        return ", ".join(
+            [f"{prefix}{column}" for column in MonitorRecord.BASE_FIELDS[:-1]]
+            + [response or f"{prefix}response", self.backend.epoch(f"{prefix}created_at")]
+            + [f"{prefix}{column}" for column in ("id", "simhash", "ref_id", "attributed_from")]
+        )
+    
+    @staticmethod
+    def load_records(rows):
+        """record_columns() 选出的行 -> MonitorRecord 列表"""
+        return [
+            MonitorRecord(*row[:8], id=row[8], simhash=row[9], ref_id=row[10], attributed_from=row[11])
+            for row in rows
+        ]
+    
+    def get_recent_records(self, limit=50, brand=None, days=None):
+        """获取最近的监测记录（MonitorRecord），可按品牌和回看天数过滤"""
+        with self.connect(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            # 引用记录的回答正文取自原文记录
+            query = f"""
+                SELECT {self.record_columns(response="COALESCE(r.response, c.response)")}
+                FROM monitor_records r
+                LEFT JOIN monitor_records c ON c.id = r.ref_id
+                WHERE 1=1
+            """
+            params = []
+            if brand:
+                query += " AND r.brand = ?"
+                params.append(brand)
+            if days:
+                query += f" AND r.created_at >= {self.backend.ago()}"
+                params.append(f"-{days} days")
+            query += " ORDER BY r.created_at DESC LIMIT ?"
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            records = self.load_records(cursor.fetchall())
+        return records
+
+
+# 品牌注册表
+class BrandRegistry:
+    """
+    从 brand_config 表加载的品牌配置，按名称、别名和行业建立内存索引
+    
+    brand_config 上的触发器在每次增删改后递增 config_version，
+    读取前比对版本号即可热加载，外部直接改表也能生效。版本号最多每
+    check_interval 秒查询一次，外部改动在这个间隔内生效；经本对象的修改立即生效。
+    """
+    
+    CSV_FIELDS = ["name", "aliases", "industry", "keywords"]
+    LIST_SEPARATOR = "|"
+    
+    def __init__(self, db, seed=None, check_interval=1.0):
+        self.db = db
+        self.check_interval = check_interval
+        self.checked_at = None
+        self.version = None
+        self.by_name = {}
+        self.by_alias = {}
+        self.by_industry = {}
+        self.pattern = None
+        if seed and not self.count():
+            self.upsert_many(seed)
+        self.refresh()
+    
+    def count(self):
+        with self.db.connect(readonly=True) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM brand_config").fetchone()[0]
+        return count
+    
+    def refresh(self, force=False):
+        """配置版本变化时重新加载，返回是否发生了重载"""
+        now = time.monotonic()
+        if (not force and self.checked_at is not None
+                and now - self.checked_at < self.check_interval):
+            return False
+        self.checked_at = now
+        with self.db.connect(readonly=True) as conn:
+            row = conn.execute(
+                "SELECT version FROM config_version WHERE name = 'brand_config'"
+            ).fetchone()
+            version = row[0] if row else 0
+            if version == self.version and not force:
+                return False
+            
+            rows = conn.execute(
+                "SELECT name, aliases, industry, keywords FROM brand_config ORDER BY id"
+            ).fetchall()
+        
+        by_name, by_alias, by_industry = {}, {}, {}
+        for name, aliases, industry, keywords in rows:
+            brand = {
+                "name": name,
+                "aliases": json.loads(aliases) if aliases else [],
+                "industry": industry or "",
+                "keywords": json.loads(keywords) if keywords else []
+            }
+            by_name[name] = brand
+            by_alias[name.lower()] = name
+            for alias in brand["aliases"]:
+                by_alias.setdefault(alias.lower(), name)
+            by_industry.setdefault(brand["industry"], []).append(brand)
+        
+        # 所有名称和别名合成一个正则，长的优先，避免 "瑞幸" 抢先匹配 "瑞幸咖啡"
+        terms = sorted((term for term in by_alias if term), key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+        
+        self.by_name, self.by_alias, self.by_industry = by_name, by_alias, by_industry
+        self.version = version
+        return True
+    
+    def all(self):
+        self.refresh()
+        return list(self.by_name.values())
+    
+    def names(self):
+        self.refresh()
+        return list(self.by_name)
+    
+    def get(self, name):
+        """按名称或别名（不区分大小写）查找品牌，找不到返回 None"""
+        self.refresh()
+        key = self.by_alias.get(name.strip().lower())
+        return self.by_name.get(key) if key else None
+    
+    def score(self, response, brand):
+        """按当前配置给回答评分，返回 score_response() 的 (is_mentioned, rank, confidence)"""
+        self.refresh()
+        return score_response(response, brand, self.pattern, self.by_alias)
+    
+    def mentions(self, text):
+        """回答正文中提及的品牌名集合（按名称和别名匹配，不区分大小写）"""
+        self.refresh()
+        if self.pattern is None or not text:
+            return set()
+        return {self.by_alias[match.lower()] for match in self.pattern.findall(text)}
+    
+    def resolve(self, names):
+        """把名称/别名列表解析为品牌配置，未知品牌抛出 ValueError"""
+        brands, unknown, seen = [], [], set()
+        for name in names:
+            brand = self.get(name)
+            if brand is None:
+                unknown.append(name)
+            elif brand["name"] not in seen:
+                seen.add(brand["name"])
+                brands.append(brand)
+        if unknown:
+            raise ValueError(f"未知品牌: {', '.join(unknown)}")
+        return brands
+    
+    @classmethod
+    def normalize(cls, brand):
+        """清洗一条品牌配置，列表字段兼容 "a|b" 形式的字符串"""
+        name = (brand.get("name") or "").strip()
+        if not name:
+            raise ValueError(f"品牌配置缺少 name: {brand}")
+        
+        def as_list(value):
+            if not value:
+                return []
+            if isinstance(value, str):
+                value = value.split(cls.LIST_SEPARATOR)
+            return [v.strip() for v in value if v and v.strip()]
+        
+        return {
+            "name": name,
+            "aliases": as_list(brand.get("aliases")),
+            "industry": (brand.get("industry") or "").strip(),
+            "keywords": as_list(brand.get("keywords"))
+        }
+    
+    def upsert_many(self, brands):
+        """批量新增或更新品牌配置，按名称去重，返回写入条数"""
+        rows = {}
+        for brand in brands:
+            brand = self.normalize(brand)
+            rows[brand["name"]] = (
+                brand["name"],
+                json.dumps(brand["aliases"], ensure_ascii=False),
+                brand["industry"],
+                json.dumps(brand["keywords"], ensure_ascii=False)
+            )
+        
+        with self.db.connect() as conn:
+            conn.executemany("""
+                INSERT INTO brand_config (name, aliases, industry, keywords)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    aliases = excluded.aliases,
+                    industry = excluded.industry,
+                    keywords = excluded.keywords
+            """, list(rows.values()))
+            self.touch(conn)
+            conn.commit()
+        # 自己的修改不等检查间隔，下次读取时立即比对版本
+        self.checked_at = None
+        return len(rows)
+    
+    def upsert(self, brand):
+        return self.upsert_many([brand])
+    
+    def touch(self, conn):
+        """不支持触发器的存储后端由这里递增配置版本"""
+        if not self.db.backend.triggers:
+            conn.execute("UPDATE config_version SET version = version + 1 WHERE name = 'brand_config'")
+    
+    def delete(self, name):
+        with self.db.connect() as conn:
+            deleted = conn.execute("DELETE FROM brand_config WHERE name = ?", (name,)).rowcount
+            self.touch(conn)
+            conn.commit()
+        self.checked_at = None
+        return deleted
+    
+    def import_file(self, path):
+        """
+        从 CSV 或 JSON 文件批量导入品牌
+        
+        CSV 列为 name,aliases,industry,keywords，别名和关键词用 "|" 分隔；
+        JSON 为品牌对象数组，或 {"brands": [...]}。
+        """
+        path = Path(path)
+        if path.suffix.lower() == ".csv":
+            import csv
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                brands = list(csv.DictReader(f))
+        elif path.suffix.lower() == ".json":
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            brands = data.get("brands", []) if isinstance(data, dict) else data
+        else:
+            raise ValueError(f"不支持的品牌文件格式: {path.suffix}，请使用 .csv 或 .json")
+        return self.upsert_many(brands)
+
+
+# 关键词聚类
+class KeywordClusterer(MinHasher):
+    """
+    基于字符 n-gram MinHash + LSH 的关键词近似聚类（与热词爬虫共用 crawlers/minhash.py）
+    
+    只在同一品牌的关键词内聚类：各品牌分别查询，跨品牌的相似关键词合不掉任何查询。
+    比较前把关键词里的品牌名和别名换成品牌所属行业（"广州印暨咖啡" -> "广州咖啡"），
+    只差在品牌上的关键词因此归为一簇。簇内取最短的关键词作为代表；只监测代表时，
+    代表的结果沿用到簇内其他关键词，节省重复查询。
+    """
+    
+    def __init__(self, ngram=2, num_perm=64, bands=16, threshold=0.5, seed=42):
+        super().__init__(ngram=ngram, num_perm=num_perm, bands=bands, threshold=threshold, seed=seed)
+        self._brand_pattern = None
+        self._brand_industry = {}
+    
+    def use_brands(self, brands):
+        """设置比较前要替换为行业的品牌名和别名（没有行业的品牌保留原名）"""
+        industry = {}
+        for brand in brands:
+            for term in [brand["name"]] + brand.get("aliases", []):
+                if term:
+                    industry.setdefault(term.lower(), brand.get("industry") or brand["name"])
+        terms = sorted(industry, key=len, reverse=True)
+        self._brand_pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+        self._brand_industry = industry
+    
+    def normalize(self, text):
+        """品牌名和别名替换为所属行业"""
+        if self._brand_pattern is None:
+            return text
+        return self._brand_pattern.sub(lambda m: self._brand_industry[m.group().lower()], text)
+    
+    def cluster(self, keywords):
+        """
+        对去重后的关键词逐个归簇（MinHashIndex）
+        
+        Returns:
+            {代表关键词: [成员...]}，按首次出现的顺序
+        """
+        index = MinHashIndex(self)
+        clusters = []
+        for keyword in dict.fromkeys(keywords):
+            cluster_id = index.add(self.normalize(keyword))
+            if cluster_id == len(clusters):
+                clusters.append([])
+            clusters[cluster_id].append(keyword)
+        # 最短（最通用）的关键词作为代表，同长度取先出现的
+        return {min(members, key=len): members for members in clusters}
+    
+    def plan(self, brands, keywords=None, platform_count=1):
+        """
+        为一次监测生成查询计划
+        
+        Args:
+            brands: 品牌配置列表
+            keywords: 自定义关键词，None 表示使用各品牌自己的关键词
+            platform_count: 监测平台数
+        
+        Returns:
+            {"groups": {品牌: {代表: [成员...]}}, "clusters": [(品牌, [成员...])],
+             "queries", "planned_queries", "saved"}；clusters 只列出实际合并了查询的簇
+        """
+        self.use_brands(brands)
+        groups = {
+            brand["name"]: self.cluster(keywords if keywords else brand["keywords"])
+            for brand in brands
+        }
+        
+        queries = sum(len(members) for g in groups.values() for members in g.values()) * platform_count
+        planned = sum(len(g) for g in groups.values()) * platform_count
+        return {
+            "groups": groups,
+            "clusters": [
+                (name, members)
+                for name, brand_groups in groups.items()
+                for members in brand_groups.values() if len(members) > 1
+            ],
+            "queries": queries,
+            "planned_queries": planned,
+            "saved": queries - planned
+        }
+
+
+# 历史记录重新评分
+def score_response(response, brand, pattern, by_alias):
+    """
+    根据回答正文判定品牌提及、排名和置信度
+    
+    监测写入和重新评分都走这里，同一回答在两条路径上得到相同的结果。
+    
+    Args:
+        response: 回答正文
+        brand: 被监测品牌
+        pattern: BrandRegistry.pattern，所有名称和别名按长度降序合成的正则
+        by_alias: BrandRegistry.by_alias，{小写名称或别名: 品牌名}
+    
+    Returns:
+        (is_mentioned, rank, confidence)
+    """
+    if pattern is None or not response:
+        return 0, 0, 30
+    
+    # 一次扫描得到各品牌首次出现的位置和被监测品牌的出现次数
+    first, mentions = {}, 0
+    for match in pattern.finditer(response):
+        name = by_alias[match.group().lower()]
+        first.setdefault(name, match.start())
+        if name == brand:
+            mentions += 1
+    
+    position = first.get(brand)
+    if position is None:
+        return 0, 0, 30
+    
+    # 排名 = 在它之前出现的其他品牌数 + 1
+    rank = 1 + sum(1 for name, start in first.items() if name != brand and start < position)
+    confidence = min(95, 70 + 10 * (mentions - 1) + (5 if rank == 1 else 0))
+    return 1, rank, confidence
+
+
+# 进程池工作进程的全局状态，由 _rescore_init 初始化
+_rescore_state = {}
+
+
+def _rescore_init(backend, pattern, by_alias):
+    _rescore_state["conn"] = backend.connect(readonly=True)
+    _rescore_state["pattern"] = pattern
+    _rescore_state["by_alias"] = by_alias
+
+
+def _rescore_chunk(bounds):
+    """对 id 区间 (start, end] 内的记录重新评分，只返回结果有变化的行"""
+    start, end = bounds
+    rows = _rescore_state["conn"].execute("""
+        SELECT r.id, r.brand, r.platform, r.keyword, r.created_at,
+               r.is_mentioned, r.rank, r.confidence, COALESCE(r.response, c.response), r.attributed_from
+        FROM monitor_records r
+        LEFT JOIN monitor_records c ON c.id = r.ref_id
+        WHERE r.id > ? AND r.id <= ?
+    """, (start, end)).fetchall()
+    
+    changed = []
+    for record_id, brand, platform, keyword, created_at, old_m, old_r, old_c, response, attributed in rows:
+        new = score_response(response, brand, _rescore_state["pattern"], _rescore_state["by_alias"])
+        if new != (old_m, old_r, old_c):
+            changed.append((record_id, brand, platform, keyword, created_at, (old_m, old_r, old_c), new,
+                            bool(attributed)))
+    return end, len(rows), changed
+
+
+class Rescorer:
+    """
+    用进程池按当前的 score_response 重新计算历史记录的 is_mentioned/rank/confidence
+    
+    主进程只分发 id 区间，工作进程各自只读查询并评分；结果按区间顺序分批写回，
+    每个区间一个事务，同时更新汇总表和断点，区间之间释放写连接；中断后可从断点继续。
+    """
+    
+    STATE_NAME = "rescore"
+    
+    def __init__(self, db, registry):
+        self.db = db
+        self.registry = registry
+    
+    def matcher(self):
+        """工作进程评分用的 (pattern, by_alias)，取当前的品牌配置"""
+        self.registry.refresh()
+        return self.registry.pattern, self.registry.by_alias
+    
+    def load_state(self, conn, restart):
+        row = conn.execute(
+            "SELECT last_id, max_id FROM backfill_state WHERE name = ?", (self.STATE_NAME,)
+        ).fetchone()
+        if row and not restart and row[0] < row[1]:
+            return row
+        # 新任务：目标上限固定为开始时的最大 id，之后写入的记录不在本次重新评分范围内
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monitor_records").fetchone()[0]
+        conn.execute(f"""
+            INSERT OR REPLACE INTO backfill_state (name, last_id, max_id, updated_at)
+            VALUES (?, 0, ?, {self.db.backend.now})
+        """, (self.STATE_NAME, max_id))
+        conn.commit()
+        return 0, max_id
+    
+    def apply(self, conn, changed, rolled_id):
+        """写回一个区间的评分结果，并把差值同步到已汇总的汇总表"""
+        conn.executemany(
+            "UPDATE monitor_records SET is_mentioned = ?, rank = ?, confidence = ? WHERE id = ?",
+            [new + (record_id,) for record_id, _, _, _, _, _, new, _ in changed]
+        )
+        deltas = []
+        for record_id, brand, platform, keyword, created_at, old, new, attributed in changed:
+            # 尚未汇总的记录和不计入汇总的沿用记录不需要同步
+            if record_id > rolled_id or attributed:
+                continue
+            deltas.append((
+                new[0] - old[0],
+                (new[1] if new[0] else 0) - (old[1] if old[0] else 0),
+                new[2] - old[2],
+                created_at, brand, platform, keyword
+            ))
+        if not deltas:
+            return
+        for granularity, table in self.db.ROLLUP_TABLES.items():
+            conn.executemany(f"""
+                UPDATE {table}
+                SET mentioned = mentioned + ?, rank_sum = rank_sum + ?, confidence_sum = confidence_sum + ?
+                WHERE bucket = (SELECT {self.db.backend.bucket(granularity)} FROM (SELECT ? AS created_at))
+                  AND brand = ? AND platform = ? AND keyword = ?
+            """, deltas)
+    
+    def run(self, workers=None, chunk_size=5000, restart=False, progress=None):
+        """
+        执行或继续重新评分任务
+        
+        Args:
+            workers: 进程数，默认 CPU 核数
+            chunk_size: 每个任务的 id 区间长度
+            restart: 忽略断点从头开始
+            progress: 每完成一个区间调用 progress(last_id, max_id, scanned, updated)
+        
+        Returns:
+            {"scanned", "updated", "last_id", "max_id"}
+        """
+        import multiprocessing
+        
+        with self.db.connect() as conn:
+            last_id, max_id = self.load_state(conn, restart)
+        
+        bounds = [
+            (start, min(start + chunk_size, max_id))
+            for start in range(last_id, max_id, chunk_size)
+        ]
+        result = {"scanned": 0, "updated": 0, "last_id": last_id, "max_id": max_id}
+        if not bounds:
+            return result
+        
+        workers = workers or os.cpu_count() or 1
+        if self.db.backend.multiprocess:
+            pool = multiprocessing.Pool(
+                workers, initializer=_rescore_init, initargs=(self.db.backend,) + self.matcher()
+            )
+            # imap 按区间顺序返回，断点总是连续推进
+            chunks = pool.imap(_rescore_chunk, bounds)
+        else:
+            # 其他进程打不开的库（内存库、DuckDB）在本进程内逐个区间评分
+            pool = None
+            _rescore_init(self.db.backend, *self.matcher())
+            chunks = map(_rescore_chunk, bounds)
+        
+        try:
+            for end, scanned, changed in chunks:
+                # 每个区间单独借用写连接并提交，区间之间把写连接让给监测写入等其他任务
+                with self.db.connect() as conn:
+                    row = conn.execute(
+                        "SELECT last_id FROM rollup_state WHERE name = 'monitor_records'"
+                    ).fetchone()
+                    self.apply(conn, changed, row[0] if row else 0)
+                    conn.execute(f"""
+                        UPDATE backfill_state SET last_id = ?, updated_at = {self.db.backend.now}
+                        WHERE name = ?
+                    """, (end, self.STATE_NAME))
+                    conn.commit()
+                
+                result["scanned"] += scanned
+                result["updated"] += len(changed)
+                result["last_id"] = end
+                if progress:
+                    progress(end, max_id, result["scanned"], result["updated"])
+        finally:
+            if pool is not None:
+                pool.terminate()
+            else:
+                _rescore_state.pop("conn").close()
+        
+        return result
+
+
+# 静态看板数据包
+class DashboardBuilder:
+    """
+    把 monitor.db 预计算成按品牌、时间范围分片的静态 JSON，供 index.html 按需加载
+    
+    目录结构:
+        data/manifest.json            品牌列表、分片路径与指纹
+        data/brands/<id>/<range>.json 单个品牌在某个时间范围内的统计、序列和最近记录
+        data/voice.json               各平台声量与品牌共同提及矩阵（读增量维护的统计表，每次重写）
+    
+    每个文件同时写出 .gz（以及安装了 brotli 时的 .br）预压缩版本。
+    分片指纹由范围内记录的行数、id 和指标之和得出，未变化的分片直接跳过。
+    """
+    
+    VERSION = 1
+    
+    # 范围名 -> (回看天数, 序列分桶)
+    RANGES = {
+        "7d": (7, "1h"),
+        "30d": (30, "1d"),
+        "90d": (90, "1w"),
+    }
+    
+    # 没有 numpy 时用汇总表代替向量化序列
+    ROLLUP_FALLBACK = {"1h": "hourly", "1d": "daily", "1w": "weekly"}
+    
+    # 最近记录中保留的字段，回答正文截断以控制体积
+    RECORD_COLUMNS = ["created_at", "platform", "keyword", "is_mentioned", "rank", "confidence", "response"]
+    RESPONSE_PREVIEW = 80
+    
+    def __init__(self, db, output_dir="data", records_limit=50):
+        self.db = db
+        self.output_dir = Path(output_dir)
+        self.records_limit = records_limit
+    
+    @staticmethod
+    def brand_id(brand):
+        """品牌名 -> 文件名安全的短 id"""
+        return hashlib.sha1(brand.encode("utf-8")).hexdigest()[:12]
+    
+    def fingerprints(self, days):
+        """每个品牌在回看窗口内的数据指纹，一次分组查询得出"""
+        with self.db.connect(readonly=True) as conn:
+            rows = conn.execute(f"""
+                SELECT brand, COUNT(*), MAX(id), SUM(id), SUM(is_mentioned), SUM(rank), SUM(confidence)
+                FROM monitor_records
+                WHERE created_at >= {self.db.backend.ago()}
+                GROUP BY brand
+            """, (f"-{days} days",)).fetchall()
+        
+        # 序列分桶随日期滚动，指纹带上当天日期和构建参数
+        today = datetime.now().strftime("%Y-%m-%d")
+        return {
+            row[0]: hashlib.sha1(json.dumps(
+                [self.VERSION, today, days, self.records_limit, list(row[1:])]
+            ).encode("utf-8")).hexdigest()
+            for row in rows
+        }
+    
+    def build_payload(self, brand, days, bucket):
+        """单个分片的内容"""
+        stats = self.db.get_stats(brand=brand, days=days)
+        
+        records = self.db.get_recent_records(self.records_limit, brand=brand, days=days)
+        rows = []
+        for record in records:
+            row = [getattr(record, column) for column in self.RECORD_COLUMNS]
+            row[-1] = (row[-1] or "")[:self.RESPONSE_PREVIEW]
+            rows.append(row)
+        
+        return {
+            "brand": brand,
+            "days": days,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "stats": [
+                {
+                    "platform": s["platform"],
+                    "total": s["total"],
+                    "mentioned": s["mentioned"],
+                    "visibility_rate": round(s["visibility_rate"], 2),
+                    "avg_rank": round(s["avg_rank"], 2),
+                    "avg_confidence": round(s["avg_confidence"], 2)
+                }
+                for s in stats
+            ],
+            "series": self.build_series(brand, days, bucket),
+            # 记录用列名 + 行数组的紧凑格式
+            "records": {"columns": self.RECORD_COLUMNS, "rows": rows}
+        }
+    
+    def build_voice(self):
+        """声量与共同提及；统计表按写入增量维护，这里只做按主键的读取"""
+        share = {}
+        for row in self.db.get_share_of_voice():
+            share.setdefault(row["platform"], {})[row["brand"]] = [
+                row["mentions"], round(row["share"], 2), round(row["rate"], 2)
+            ]
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            # 平台 -> 品牌 -> [提及回答数, 声量占比%, 提及率%]
+            "share_of_voice": share,
+            "co_mentions": self.db.get_co_mentions()
+        }
+    
+    def build_series(self, brand, days, bucket):
+        """按平台分组的可见率序列"""
+        if np is not None:
+            return self.db.get_time_series(
+                bucket=bucket, brands=[brand], days=days, group_by=("platform",)
+            )
+        
+        # 退化为读取汇总表，序列字段与 get_time_series 保持一致
+        self.db.rollup()
+        rollups = self.db.get_rollups(self.ROLLUP_FALLBACK[bucket], brand=brand, days=days)
+        buckets = sorted({r["bucket"] for r in rollups})
+        index = {b: i for i, b in enumerate(buckets)}
+        by_platform = {}
+        for r in rollups:
+            series = by_platform.setdefault(r["platform"], {
+                "platform": r["platform"],
+                "total": [0] * len(buckets),
+                "mentioned": [0] * len(buckets),
+                "visibility_rate": [None] * len(buckets),
+                "avg_rank": [None] * len(buckets)
+            })
+            i = index[r["bucket"]]
+            series["total"][i] = r["total"]
+            series["mentioned"][i] = r["mentioned"]
+            series["visibility_rate"][i] = round(r["visibility_rate"], 2)
+            series["avg_rank"][i] = round(r["avg_rank"], 2) if r["mentioned"] else None
+        return {
+            "bucket_seconds": self.db.parse_bucket(bucket),
+            "buckets": buckets,
+            "series": list(by_platform.values())
+        }
+    
+    def write_file(self, relative_path, payload):
+        """写出 JSON 及其预压缩版本，返回各版本的字节数"""
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        buffer = io.BytesIO()
+        # 固定 mtime，内容不变时压缩结果也不变
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as f:
+            f.write(data)
+        variants = {"": data, ".gz": buffer.getvalue()}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        
+        path = self.output_dir / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sizes = {}
+        for suffix, content in variants.items():
+            target = path.with_name(path.name + suffix)
+            tmp = target.with_name(target.name + ".tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, target)
+            sizes[suffix.lstrip(".") or "json"] = len(content)
+        
+        # brotli 被卸载后清理旧的 .br，避免与 .json 不一致
+        if brotli is None:
+            stale = path.with_name(path.name + ".br")
+            if stale.exists():
+                stale.unlink()
+        return sizes
+    
+    def load_manifest(self):
+        manifest_file = self.output_dir / "manifest.json"
+        if not manifest_file.exists():
+            return {}
+        try:
+            manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != self.VERSION:
+            return {}
+        return manifest
+    
+    def remove_shard(self, relative_path):
+        path = self.output_dir / relative_path
+        for suffix in ("", ".gz", ".br"):
+            target = path.with_name(path.name + suffix)
+            if target.exists():
+                target.unlink()
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+    
+    def build(self, force=False):
+        """
+        增量构建看板数据包
+        
+        Args:
+            force: 忽略指纹，重新生成全部分片
         
-        # 关键词匹配增加概率
-        if brand in keyword or any(kw in keyword for kw in ["咖啡", "奶茶", "饮品"]):
-            weight += 0.2
+        Returns:
+            {"built", "skipped", "removed", "bytes"}
+        """
+        previous = {} if force else {
+            brand["name"]: brand for brand in self.load_manifest().get("brands", [])
+        }
         
-        is_mentioned = random.random() < weight
+        result = {"built": 0, "skipped": 0, "removed": 0, "bytes": 0}
+        brands = {}
+        for range_name, (days, bucket) in self.RANGES.items():
+            for brand, fingerprint in self.fingerprints(days).items():
+                entry = brands.setdefault(brand, {
+                    "name": brand,
+                    "id": self.brand_id(brand),
+                    "shards": {}
+                })
+                relative_path = f"brands/{entry['id']}/{range_name}.json"
+                old = previous.get(brand, {}).get("shards", {}).get(range_name)
+                if (old and old["fingerprint"] == fingerprint
+                        and (self.output_dir / relative_path).exists()):
+                    entry["shards"][range_name] = old
+                    result["skipped"] += 1
+                    continue
+                
+                sizes = self.write_file(relative_path, self.build_payload(brand, days, bucket))
+                entry["shards"][range_name] = {
+                    "path": relative_path,
+                    "fingerprint": fingerprint,
+                    "updated_at": datetime.now().isoformat(timespec="seconds"),
+                    "bytes": sizes
+                }
+                result["built"] += 1
+                result["bytes"] += sizes["json"]
         
-        if is_mentioned:
-            rank = random.randint(1, 3)
-            confidence = random.randint(70, 95)
-            
-            # 生成模拟回复
-            responses = [
-                f"{brand}在{keyword}方面表现出色，是很多消费者的首选。",
-                f"如果你关注{keyword}，{brand}值得考虑，品质有保障。",
-                f"{brand}在{keyword}领域有不错的口碑，用户满意度较高。",
-            ]
-            response = random.choice(responses)
-        else:
-            rank = 0
-            confidence = random.randint(20, 50)
-            other_brands = [b for b in personality["mentions"] if b != brand]
-            response = f"在{keyword}方面，{random.choice(other_brands)}等品牌表现较好。"
+        # 清理数据已过期或品牌已删除的分片
+        for name, entry in previous.items():
+            for range_name, shard in entry.get("shards", {}).items():
+                if range_name not in brands.get(name, {}).get("shards", {}):
+                    self.remove_shard(shard["path"])
+                    result["removed"] += 1
         
-        return {
-            "platform": platform,
-            "keyword": keyword,
-            "brand": brand,
-            "is_mentioned": is_mentioned,
-            "rank": rank,
-            "confidence": confidence,
-            "response": response,
-            "timestamp": datetime.now().isoformat()
+        voice = self.build_voice()
+        result["bytes"] += self.write_file("voice.json", voice)["json"]
+        
+        manifest = {
+            "version": self.VERSION,
+            "voice": "voice.json",
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "ranges": {name: {"days": days, "bucket": bucket}
+                       for name, (days, bucket) in self.RANGES.items()},
+            "brands": sorted(brands.values(), key=lambda b: b["name"])
         }
+        self.write_file("manifest.json", manifest)
+        return result
 
 
-# 数据库管理
-class DatabaseManager:
-    def __init__(self, db_file="monitor.db"):
-        self.db_file = db_file
-        self.init_db()
+# 增量 HTML 报告
+class ReportBuilder:
+    """
+    由带指纹的缓存片段拼装 HTML 报告
     
-    def init_db(self):
-        """初始化数据库表结构"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        # 监测记录表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS monitor_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                brand TEXT NOT NULL,
-                platform TEXT NOT NULL,
-                keyword TEXT NOT NULL,
-                is_mentioned INTEGER DEFAULT 0,
-                rank INTEGER DEFAULT 0,
-                confidence INTEGER DEFAULT 0,
-                response TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # 品牌配置表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS brand_config (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                aliases TEXT,
-                industry TEXT,
-                keywords TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # 每日统计表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS daily_stats (
-                date TEXT PRIMARY KEY,
-                brand TEXT NOT NULL,
-                platform TEXT NOT NULL,
-                total_queries INTEGER DEFAULT 0,
-                mentioned_count INTEGER DEFAULT 0,
-                visibility_rate REAL DEFAULT 0,
-                avg_rank REAL DEFAULT 0,
-                avg_confidence REAL DEFAULT 0
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+    报告拆成概览卡片、各品牌明细表、最近记录和按 id 分页的记录页，缓存在
+    report_sections 表中。指纹由记录的行数、id 与指标之和得出：
+    - 全表指纹未变时，除概览卡片外全部复用，无需再扫描
+    - 否则按 id 区间逐页比对，只重写变化的记录页，只重绘这些页涉及的品牌
+    """
     
-    def save_record(self, record):
-        """保存监测记录"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO monitor_records 
-            (brand, platform, keyword, is_mentioned, rank, confidence, response)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            record["brand"],
-            record["platform"],
-            record["keyword"],
-            1 if record["is_mentioned"] else 0,
-            record["rank"],
-            record["confidence"],
-            record["response"]
-        ))
+    VERSION = 1
+    PAGE_SIZE = 500
+    RECENT_LIMIT = 50
+    
+    STYLE = """
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+            background: #f5f5f5;
+        }
+        .header {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 30px;
+            border-radius: 10px;
+            margin-bottom: 20px;
+        }
+        .metrics {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
+            gap: 15px;
+            margin-bottom: 20px;
+        }
+        .card {
+            background: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .number {
+            font-size: 32px;
+            font-weight: bold;
+            color: #667eea;
+        }
+        table {
+            width: 100%;
+            background: white;
+            border-radius: 8px;
+            overflow: hidden;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            margin-bottom: 20px;
+        }
+        th, td {
+            padding: 12px;
+            text-align: left;
+            border-bottom: 1px solid #eee;
+        }
+        th {
+            background: #f8f9fa;
+            font-weight: 600;
+        }
+        .mentioned { color: #10b981; font-weight: bold; }
+        .not-mentioned { color: #ef4444; }
+        .pages a { margin-right: 8px; }
+    """
+    
+    def __init__(self, db, output_dir=".", filename="report.html", stats_days=7):
+        self.db = db
+        self.output_dir = Path(output_dir)
+        self.filename = filename
+        self.pages_dir = Path(filename).stem + "_records"
+        self.stats_days = stats_days
+    
+    def fingerprint(self, where="", params=()):
+        """一组记录的指纹，记录为空时返回 None"""
+        with self.db.connect(readonly=True) as conn:
+            row = conn.execute(f"""
+                SELECT COUNT(*), MAX(id), SUM(id), SUM(is_mentioned), SUM(rank), SUM(confidence)
+                FROM monitor_records
+                {where}
+            """, params).fetchone()
+        if not row[0]:
+            return None
+        return hashlib.sha1(json.dumps([self.VERSION, list(row)]).encode("utf-8")).hexdigest()
+    
+    def page_fingerprints(self):
+        """按 id 区间分页计算指纹，逐页走主键范围查询，避免全表分组排序"""
+        with self.db.connect(readonly=True) as conn:
+            min_id, max_id = conn.execute("SELECT MIN(id), MAX(id) FROM monitor_records").fetchone()
+        if min_id is None:
+            return {}
         
-        conn.commit()
-        conn.close()
+        fingerprints = {}
+        for page in range((min_id - 1) // self.PAGE_SIZE + 1, (max_id - 1) // self.PAGE_SIZE + 2):
+            fp = self.fingerprint(
+                "WHERE id > ? AND id <= ?", ((page - 1) * self.PAGE_SIZE, page * self.PAGE_SIZE)
+            )
+            if fp:
+                fingerprints[page] = fp
+        return fingerprints
     
-    def get_stats(self, brand=None, platform=None, days=7):
-        """获取统计数据"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                brand,
-                platform,
-                COUNT(*) as total,
-                SUM(is_mentioned) as mentioned,
-                AVG(CASE WHEN is_mentioned=1 THEN rank END) as avg_rank,
-                AVG(confidence) as avg_confidence
-            FROM monitor_records
-            WHERE created_at >= datetime('now', '-{} days')
-        """.format(days)
+    def page_brands(self, page):
+        with self.db.connect(readonly=True) as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT brand FROM monitor_records WHERE id > ? AND id <= ?
+            """, ((page - 1) * self.PAGE_SIZE, page * self.PAGE_SIZE)).fetchall()
+        return sorted(row[0] for row in rows)
+    
+    def load_cache(self):
+        with self.db.connect(readonly=True) as conn:
+            rows = conn.execute("SELECT key, fingerprint, html FROM report_sections").fetchall()
+        return {key: (fingerprint, html) for key, fingerprint, html in rows}
+    
+    def save_cache(self, updates, removed):
+        with self.db.connect() as conn:
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO report_sections (key, fingerprint, html, updated_at)
+                VALUES (?, ?, ?, {self.db.backend.now})
+            """, updates)
+            conn.executemany("DELETE FROM report_sections WHERE key = ?", [(key,) for key in removed])
+            conn.commit()
+    
+    def render_metrics(self):
+        stats = self.db.get_stats(days=self.stats_days)
+        html = f"""
+            <div class="metrics">
+                <div class="card">
+                    <div class="number">{len(stats)}</div>
+                    <div>监测组合数</div>
+                </div>
+        """
+        for stat in stats[:4]:
+            html += f"""
+                <div class="card">
+                    <div class="number">{stat['visibility_rate']:.1f}%</div>
+                    <div>{escape(stat['brand'])} @ {escape(stat['platform'])}</div>
+                </div>
+            """
+        return html + "</div>"
+    
+    def render_brand(self, brand):
+        stats = self.db.get_stats(brand=brand, days=None)
+        html = f"""
+            <h2>{escape(brand)}</h2>
+            <table>
+                <tr>
+                    <th>平台</th>
+                    <th>查询数</th>
+                    <th>提及数</th>
+                    <th>可见率</th>
+                    <th>平均排名</th>
+                    <th>平均置信度</th>
+                </tr>
+        """
+        for stat in stats:
+            html += f"""
+                <tr>
+                    <td>{escape(stat['platform'])}</td>
+                    <td>{stat['total']}</td>
+                    <td>{stat['mentioned']}</td>
+                    <td>{stat['visibility_rate']:.1f}%</td>
+                    <td>{f"{stat['avg_rank']:.1f}" if stat['avg_rank'] else "-"}</td>
+                    <td>{stat['avg_confidence']:.0f}%</td>
+                </tr>
+            """
+        return html + "</table>"
+    
+    @staticmethod
+    def render_records(records):
+        html = """
+            <table>
+                <tr>
+                    <th>时间</th>
+                    <th>品牌</th>
+                    <th>平台</th>
+                    <th>关键词</th>
+                    <th>状态</th>
+                    <th>排名</th>
+                    <th>置信度</th>
+                </tr>
+        """
+        for record in records:
+            status_class = "mentioned" if record.is_mentioned else "not-mentioned"
+            status_text = "✓ 提及" if record.is_mentioned else "✗ 未提及"
+            html += f"""
+                <tr>
+                    <td>{record.created_at}</td>
+                    <td>{escape(record.brand)}</td>
+                    <td>{escape(record.platform)}</td>
+                    <td>{escape(record.keyword)}</td>
+                    <td class="{status_class}">{status_text}</td>
+                    <td>{record.rank if record.rank > 0 else "-"}</td>
+                    <td>{record.confidence}%</td>
+                </tr>
+            """
+        return html + "</table>"
+    
+    def render_document(self, title, body):
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <style>{self.STYLE}</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+    def page_records(self, page):
+        """第 page 页（从 1 开始）对应 id 区间内的记录"""
+        with self.db.connect(readonly=True) as conn:
+            cursor = conn.execute(f"""
+                SELECT {self.db.record_columns(alias=None)} FROM monitor_records
+                WHERE id > ? AND id <= ?
+                ORDER BY id
+            """, ((page - 1) * self.PAGE_SIZE, page * self.PAGE_SIZE))
+            records = self.db.load_records(cursor.fetchall())
+        return records
+    
+    def build(self):
+        """
+        增量生成报告
         
-        params = []
-        if brand:
-            query += " AND brand = ?"
-            params.append(brand)
-        if platform:
-            query += " AND platform = ?"
-            params.append(platform)
+        Returns:
+            {"report_file", "rendered", "reused", "pages_written"}
+        """
+        cache = self.load_cache()
+        updates = []
+        result = {"rendered": 0, "reused": 0, "pages_written": 0}
         
-        query += " GROUP BY brand, platform"
+        def section(key, fingerprint, render):
+            cached = cache.get(key)
+            if cached and cached[0] == fingerprint and cached[1] is not None:
+                result["reused"] += 1
+                return cached[1]
+            html = render()
+            updates.append((key, fingerprint, html))
+            result["rendered"] += 1
+            return html
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
+        # 概览卡片只看最近 stats_days 天，窗口滑动导致的进出也会改变指纹
+        with self.db.connect(readonly=True) as conn:
+            cutoff = conn.execute(f"SELECT {self.db.backend.ago()}", (f"-{self.stats_days} days",)).fetchone()[0]
+        metrics_fp = self.fingerprint("WHERE created_at >= ?", (cutoff,)) or "empty"
+        metrics_html = section("metrics", metrics_fp, self.render_metrics)
         
-        return [
-            {
-                "brand": row[0],
-                "platform": row[1],
-                "total": row[2],
-                "mentioned": row[3],
-                "visibility_rate": (row[3] / row[2] * 100) if row[2] > 0 else 0,
-                "avg_rank": row[4] or 0,
-                "avg_confidence": row[5] or 0
-            }
-            for row in results
-        ]
-    
-    def get_recent_records(self, limit=50):
-        """获取最近的监测记录"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        # 记录页的缓存 html 列存放该页涉及的品牌列表
+        cached_pages = {
+            int(key[5:]): (fp.split(":", 1)[0], json.loads(brands))
+            for key, (fp, brands) in cache.items() if key.startswith("page:")
+        }
+        global_fp = self.fingerprint() or "empty"
+        if cache.get("global", (None,))[0] == global_fp:
+            page_fps = {page: fp for page, (fp, _) in cached_pages.items()}
+            page_brands = {page: brands for page, (_, brands) in cached_pages.items()}
+            dirty_brands = set()
+        else:
+            page_fps = self.page_fingerprints()
+            page_brands = {}
+            dirty_brands = set()
+            for page, fp in page_fps.items():
+                cached = cached_pages.get(page)
+                if cached and cached[0] == fp:
+                    page_brands[page] = cached[1]
+                else:
+                    page_brands[page] = self.page_brands(page)
+                    dirty_brands.update(page_brands[page])
+                    if cached:
+                        dirty_brands.update(cached[1])
+            for page, (_, brands) in cached_pages.items():
+                if page not in page_fps:
+                    dirty_brands.update(brands)
+            updates.append(("global", global_fp, None))
+        
+        brands = sorted({brand for page_list in page_brands.values() for brand in page_list})
+        brand_html = []
+        for brand in brands:
+            cached = cache.get(f"brand:{brand}")
+            fp = global_fp if brand in dirty_brands or not cached else cached[0]
+            brand_html.append(section(f"brand:{brand}", fp, lambda brand=brand: self.render_brand(brand)))
+        
+        recent_html = section(
+            "recent", global_fp,
+            lambda: self.render_records(self.db.get_recent_records(self.RECENT_LIMIT))
+        )
+        
+        # 记录页只链接相邻页，新增一页时只需重写原来的最后一页
+        pages_path = self.output_dir / self.pages_dir
+        pages_path.mkdir(parents=True, exist_ok=True)
+        pages = sorted(page_fps)
+        for i, page in enumerate(pages):
+            key = f"page:{page}"
+            page_file = pages_path / f"page-{page:04d}.html"
+            prev_page = pages[i - 1] if i > 0 else None
+            next_page = pages[i + 1] if i + 1 < len(pages) else None
+            fp = f"{page_fps[page]}:{prev_page}:{next_page}"
+            cached = cache.get(key)
+            if cached and cached[0] == fp and page_file.exists():
+                result["reused"] += 1
+                continue
+            nav = " ".join(
+                f'<a href="page-{p:04d}.html">{label}</a>'
+                for p, label in ((prev_page, "上一页"), (next_page, "下一页")) if p
+            )
+            body = f"""
+            <div class="header">
+                <h1>监测记录 第 {page} 页</h1>
+                <p><a style="color: white;" href="../{self.filename}">返回报告</a></p>
+            </div>
+            <p class="pages">{nav}</p>
+            {self.render_records(self.page_records(page))}
+            """
+            page_file.write_text(self.render_document(f"GEO 监测记录 - 第 {page} 页", body), encoding="utf-8")
+            updates.append((key, fp, json.dumps(page_brands[page], ensure_ascii=False)))
+            result["pages_written"] += 1
         
-        cursor.execute("""
-            SELECT * FROM monitor_records
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
+        # 数据被清理后不再存在的片段和记录页
+        live = {"global", "metrics", "recent"} | {f"brand:{b}" for b in brands} | {f"page:{p}" for p in page_fps}
+        removed = [key for key in cache if key not in live]
+        for key in removed:
+            if key.startswith("page:"):
+                stale = pages_path / f"page-{int(key[5:]):04d}.html"
+                if stale.exists():
+                    stale.unlink()
+        self.save_cache(updates, removed)
         
-        columns = [description[0] for description in cursor.description]
-        records = cursor.fetchall()
-        conn.close()
+        nav = " ".join(
+            f'<a href="{self.pages_dir}/page-{p:04d}.html">{p}</a>' for p in sorted(page_fps)
+        )
+        body = f"""
+            <div class="header">
+                <h1>GEO AI 搜索引擎监测报告</h1>
+                <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            </div>
+            {metrics_html}
+            <h2>品牌明细</h2>
+            {"".join(brand_html)}
+            <h2>最近记录</h2>
+            {recent_html}
+            <h2>全部记录</h2>
+            <p class="pages">{nav or "暂无记录"}</p>
+        """
+        report_file = self.output_dir / self.filename
+        report_file.write_text(
+            self.render_document(f"GEO 监测报告 - {datetime.now().strftime('%Y-%m-%d')}", body),
+            encoding="utf-8"
+        )
+        result["report_file"] = str(report_file)
+        return result
+
+
+# 监测结果输出：monitor() 逐条把结果交给各个 sink，不在内存中累积
+class ResultSink:
+    """结果输出基类"""
+    
+    def open(self, total):
+        """监测开始，total 为预计的查询次数"""
+    
+    def write(self, result):
+        raise NotImplementedError
+    
+    def close(self):
+        """监测结束，刷新缓冲并释放资源"""
+
+
+class DatabaseSink(ResultSink):
+    """
+    批量写入数据库
+    
+    回答变化事件已写入 answer_changes 表（用 --changes 查看），这里只计数；
+    需要逐条处理时传入 on_changes，每批写入后以该批的事件列表调用。
+    """
+    
+    def __init__(self, db, batch_size=200, on_changes=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.on_changes = on_changes
+        self.buffer = []
+        self.change_count = 0
+    
+    def write(self, result):
+        self.buffer.append(result)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if self.buffer:
+            changes = self.db.save_records(self.buffer)
+            self.buffer = []
+            self.change_count += len(changes)
+            if changes and self.on_changes:
+                self.on_changes(changes)
+    
+    def close(self):
+        self.flush()
+
+
+class JsonlSink(ResultSink):
+    """逐行追加到 JSONL 文件"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+    
+    def open(self, total):
+        self.file = open(self.path, "a", encoding="utf-8")
+    
+    def write(self, result):
+        self.file.write(json.dumps(result.as_dict(), ensure_ascii=False) + "\n")
+    
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class StreamSink(ResultSink):
+    """逐条打印结果（实时输出）"""
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.current = (None, None)
+    
+    def write(self, result):
+        brand, platform = result.brand, result.platform
+        if brand != self.current[0]:
+            print(f"\n监测品牌: {brand}", file=self.stream)
+            print("-" * 60, file=self.stream)
+        if (brand, platform) != self.current:
+            print(f"  平台: {GEOMonitor.PLATFORMS.get(platform, platform)}", file=self.stream)
+        self.current = (brand, platform)
         
-        return [dict(zip(columns, row)) for row in records]
+        status = "✓ 提及" if result.is_mentioned else "✗ 未提及"
+        rank_info = f" 排名:{result.rank}" if result.is_mentioned else ""
+        if result.attributed_from:
+            rank_info += f"（沿用 {result.attributed_from}）"
+        print(f"    {result.keyword:20s} -> {status}{rank_info}", file=self.stream)
+
+
+class ProgressSink(ResultSink):
+    """节流的进度显示，最多每 interval 秒刷新一次"""
+    
+    def __init__(self, interval=1.0, stream=None):
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.total = 0
+        self.done = 0
+        self.mentioned = 0
+        self.started = 0
+        self.last_shown = 0
+    
+    def open(self, total):
+        self.total = total
+        self.started = self.last_shown = time.time()
+    
+    def write(self, result):
+        self.done += 1
+        self.mentioned += 1 if result.is_mentioned else 0
+        now = time.time()
+        if now - self.last_shown >= self.interval:
+            self.last_shown = now
+            self.show(now)
+    
+    def show(self, now):
+        rate = self.done / max(now - self.started, 1e-6)
+        percent = self.done / self.total * 100 if self.total else 100
+        self.stream.write(
+            f"\r  进度 {self.done}/{self.total} ({percent:.0f}%)  "
+            f"提及 {self.mentioned}  {rate:.1f} 条/秒"
+        )
+        self.stream.flush()
+    
+    def close(self):
+        if self.done:
+            self.show(time.time())
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class UsageSink(ResultSink):
+    """按 (品牌, 平台) 累计本次监测的 token 用量与成本，结束时写入 api_usage"""
+    
+    def __init__(self, db, run_id):
+        self.db = db
+        self.run_id = run_id
+        self.totals = {}
+    
+    def write(self, result):
+        if result.cost is None or result.attributed_from:
+            return
+        key = (result.brand, result.platform)
+        calls, prompt, completion, cost, estimated = self.totals.get(key, (0, 0, 0, 0.0, 0))
+        self.totals[key] = (
+            calls + 1,
+            prompt + result.prompt_tokens,
+            completion + result.completion_tokens,
+            cost + result.cost,
+            estimated + (1 if result.usage_estimated else 0)
+        )
+    
+    def close(self):
+        if self.totals:
+            self.db.save_usage(self.run_id, self.totals)
+            self.totals = {}
 
 
 # GEO 监测器主类
@@ -259,6 +2925,7 @@ class GEOMonitor:
         "zhipu": "智谱"
     }
     
+    # 内置品牌，仅在 brand_config 为空时写入
     DEFAULT_BRANDS = [
         {
             "name": "印暨咖啡",
@@ -309,200 +2976,171 @@ class GEOMonitor:
         }
     ]
     
-    def __init__(self, db_file="monitor.db"):
-        self.db = DatabaseManager(db_file)
+    def __init__(self, db_file="monitor.db", backend=None):
+        self.db = DatabaseManager(db_file, backend=backend)
+        # 品牌配置表为空时用内置品牌初始化
+        self.brands = BrandRegistry(self.db, seed=self.DEFAULT_BRANDS)
+        self.db.mention_finder = self.brands.mentions
+    
+    def _resolve(self, brands=None, platforms=None):
+        if not brands:
+            brands = self.brands.all()
+        else:
+            brands = self.brands.resolve(brands)
+        
+        if not platforms:
+            platforms = list(self.PLATFORMS.keys())
+        return brands, platforms
+    
+    def analyze_keywords(self, brands=None, platforms=None, keywords=None, threshold=0.5):
+        """关键词聚类分析，返回 KeywordClusterer.plan() 的查询计划"""
+        brands, platforms = self._resolve(brands, platforms)
+        return KeywordClusterer(threshold=threshold).plan(brands, keywords, len(platforms))
     
-    def monitor(self, brands=None, platforms=None, keywords=None):
+    def iter_monitor(self, brands=None, platforms=None, keywords=None, delay=0.1,
+                     representatives_only=False, threshold=0.5, budget=None):
         """
-        执行监测
+        逐条产出监测结果（MonitorRecord）的生成器，不落库也不打印
         
         Args:
             brands: 品牌列表，如 ["印暨咖啡", "星巴克"]
             platforms: 平台列表，如 ["kimi", "doubao"]
             keywords: 关键词列表，如 ["咖啡推荐"]
+            delay: 每次查询后的等待秒数
+            representatives_only: 只查询关键词簇的代表，结果沿用到簇内其他关键词
+                （沿用的结果设置 attributed_from）
+            threshold: 关键词聚类的 Jaccard 阈值
+            budget: CostBudget，超出预算时停止产出并置 budget.stopped，由调用方提示；
+                结果带 prompt_tokens/completion_tokens/cost
         """
-        if not brands:
-            brands = self.DEFAULT_BRANDS
-        else:
-            brands = [b for b in self.DEFAULT_BRANDS if b["name"] in brands]
-        
-        if not platforms:
-            platforms = list(self.PLATFORMS.keys())
-        
-        print(f"开始监测 {len(brands)} 个品牌，{len(platforms)} 个平台...")
-        print("=" * 60)
-        
-        results = []
+        brands, platforms = self._resolve(brands, platforms)
+        budget = budget or CostBudget()
+        if representatives_only:
+            groups = KeywordClusterer(threshold=threshold).plan(brands, keywords)["groups"]
         
         for brand in brands:
             brand_name = brand["name"]
             brand_keywords = keywords if keywords else brand["keywords"]
-            
-            print(f"\n监测品牌: {brand_name}")
-            print("-" * 60)
+            if representatives_only:
+                brand_groups = groups[brand_name]
+            else:
+                brand_groups = {keyword: [keyword] for keyword in brand_keywords}
             
             for platform_id in platforms:
-                platform_name = self.PLATFORMS[platform_id]
-                print(f"  平台: {platform_name}")
-                
-                for keyword in brand_keywords:
+                for representative, members in brand_groups.items():
+                    prompt_tokens = estimate_tokens(representative)
+                    reserved = budget.reserve(platform_id, prompt_tokens)
+                    if reserved is None:
+                        return
+                    
                     # 模拟 API 调用
-                    result = MockAIClient.query(platform_id, keyword, brand_name)
+                    result = MockAIClient.query(platform_id, representative, brand_name)
+                    usage = {}
+                    if isinstance(result, dict):
+                        # 返回字典的客户端在此转换，可附带平台返回的 usage
+                        usage = result.get("usage") or {}
+                        result = MonitorRecord.from_dict(result)
+                    # 平台结果没有自带评分时按正文评分，与 --rescore 的判定一致
+                    if result.is_mentioned is None:
+                        result.is_mentioned, result.rank, result.confidence = self.brands.score(
+                            result.response, brand_name
+                        )
                     
-                    # 保存到数据库
-                    self.db.save_record(result)
-                    results.append(result)
+                    # 平台未返回用量时按文本长度估算
+                    result.prompt_tokens = usage.get("prompt_tokens") or prompt_tokens
+                    result.completion_tokens = usage.get("completion_tokens") or estimate_tokens(result.response)
+                    result.usage_estimated = not usage
+                    result.cost = budget.settle(platform_id, reserved, result.prompt_tokens,
+                                                result.completion_tokens, result.usage_estimated)["cost"]
+                    yield result
                     
-                    # 打印结果
-                    status = "✓ 提及" if result["is_mentioned"] else "✗ 未提及"
-                    rank_info = f" 排名:{result['rank']}" if result["is_mentioned"] else ""
-                    print(f"    {keyword:20s} -> {status}{rank_info}")
+                    for keyword in members:
+                        if keyword != representative:
+                            yield result.replace(keyword=keyword, attributed_from=representative,
+                                                 prompt_tokens=0, completion_tokens=0, cost=0.0)
                     
                     # 模拟延迟
-                    time.sleep(0.1)
-        
-        print("\n" + "=" * 60)
-        print(f"监测完成！共记录 {len(results)} 条数据")
-        
-        return results
-    
-    def generate_report(self, output_dir="."):
-        """生成 HTML 报告"""
-        stats = self.db.get_stats()
-        recent_records = self.db.get_recent_records(100)
-        
-        # 生成报告 HTML
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>GEO 监测报告 - {datetime.now().strftime('%Y-%m-%d')}</title>
-            <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background: #f5f5f5;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    border-radius: 10px;
-                    margin-bottom: 20px;
-                }}
-                .metrics {{
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                    gap: 15px;
-                    margin-bottom: 20px;
-                }}
-                .card {{
-                    background: white;
-                    padding: 20px;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                .number {{
-                    font-size: 32px;
-                    font-weight: bold;
-                    color: #667eea;
-                }}
-                table {{
-                    width: 100%;
-                    background: white;
-                    border-radius: 8px;
-                    overflow: hidden;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                th, td {{
-                    padding: 12px;
-                    text-align: left;
-                    border-bottom: 1px solid #eee;
-                }}
-                th {{
-                    background: #f8f9fa;
-                    font-weight: 600;
-                }}
-                .mentioned {{ color: #10b981; font-weight: bold; }}
-                .not-mentioned {{ color: #ef4444; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>GEO AI 搜索引擎监测报告</h1>
-                <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            </div>
-            
-            <div class="metrics">
-                <div class="card">
-                    <div class="number">{len(stats)}</div>
-                    <div>监测组合数</div>
-                </div>
+                    if delay:
+                        time.sleep(delay)
+    
+    def monitor(self, brands=None, platforms=None, keywords=None, sinks=None, delay=0.1,
+                representatives_only=False, threshold=0.5, daily_budget=None, run_budget=None):
         """
+        执行监测，结果逐条交给 sinks，内存占用与查询次数无关
         
-        # 添加统计数据
-        for stat in stats[:4]:
-            html_content += f"""
-                <div class="card">
-                    <div class="number">{stat['visibility_rate']:.1f}%</div>
-                    <div>{stat['brand']} @ {stat['platform']}</div>
-                </div>
-            """
+        Args:
+            brands: 品牌列表，如 ["印暨咖啡", "星巴克"]
+            platforms: 平台列表，如 ["kimi", "doubao"]
+            keywords: 关键词列表，如 ["咖啡推荐"]
+            sinks: ResultSink 列表，默认写入数据库并逐条打印
+            delay: 每次查询后的等待秒数
+            representatives_only: 只查询关键词簇的代表，见 iter_monitor()
+            threshold: 关键词聚类的 Jaccard 阈值
+            daily_budget: 每日成本上限（元，含今天已花费），None 表示不限
+            run_budget: 本次监测成本上限（元），None 表示不限
         
-        html_content += """
-            </div>
-            
-            <h2>详细记录</h2>
-            <table>
-                <tr>
-                    <th>时间</th>
-                    <th>品牌</th>
-                    <th>平台</th>
-                    <th>关键词</th>
-                    <th>状态</th>
-                    <th>排名</th>
-                    <th>置信度</th>
-                </tr>
+        Returns:
+            {"run_id", "total", "mentioned", "cost", "budget_stopped"}，
+            mentioned 只计实际查询到的回答，不含沿用代表关键词的结果
         """
+        if sinks is None:
+            sinks = [DatabaseSink(self.db), StreamSink()]
         
-        for record in recent_records[:50]:
-            status_class = "mentioned" if record["is_mentioned"] else "not-mentioned"
-            status_text = "✓ 提及" if record["is_mentioned"] else "✗ 未提及"
-            
-            html_content += f"""
-                <tr>
-                    <td>{record["created_at"]}</td>
-                    <td>{record["brand"]}</td>
-                    <td>{record["platform"]}</td>
-                    <td>{record["keyword"]}</td>
-                    <td class="{status_class}">{status_text}</td>
-                    <td>{record["rank"] if record["rank"] > 0 else "-"}</td>
-                    <td>{record["confidence"]}%</td>
-                </tr>
-            """
+        run_id = self.db.start_run()
+        budget = CostBudget(daily_budget, run_budget, spent_today=self.db.spent_today())
+        sinks = list(sinks) + [UsageSink(self.db, run_id)]
         
-        html_content += """
-            </table>
-        </body>
-        </html>
-        """
+        resolved_brands, resolved_platforms = self._resolve(brands, platforms)
+        total = sum(
+            len(keywords if keywords else b["keywords"]) for b in resolved_brands
+        ) * len(resolved_platforms)
+        
+        print(f"开始监测 {len(resolved_brands)} 个品牌，{len(resolved_platforms)} 个平台...")
+        print("=" * 60)
+        
+        summary = {"run_id": run_id, "total": 0, "mentioned": 0, "cost": 0.0}
+        for sink in sinks:
+            sink.open(total)
+        try:
+            for result in self.iter_monitor(brands, platforms, keywords, delay=delay,
+                                            representatives_only=representatives_only,
+                                            threshold=threshold, budget=budget):
+                for sink in sinks:
+                    sink.write(result)
+                summary["total"] += 1
+                summary["mentioned"] += 1 if result.is_mentioned and not result.attributed_from else 0
+        finally:
+            # 中途中断也要把已缓冲的结果写出
+            for sink in sinks:
+                sink.close()
+            summary["cost"] = budget.spent
+            summary["budget_stopped"] = budget.stopped
+            self.db.finish_run(run_id, summary)
+        
+        if summary["budget_stopped"]:
+            print(f"⚠️  预算不足，停止派发（本次已花费 ¥{summary['cost']:.4f}）")
+        print("\n" + "=" * 60)
+        print(f"监测完成！共记录 {summary['total']} 条数据")
+        # 有效结果 = 提及了品牌的回答（沿用的结果不是新的回答，不重复计入）
+        per_result = f"¥{summary['cost'] / summary['mentioned']:.4f}" if summary["mentioned"] else "-"
+        print(f"成本 ¥{summary['cost']:.4f}，有效结果 {summary['mentioned']} 条，每条有效结果 {per_result}")
         
-        # 保存报告
-        report_file = os.path.join(output_dir, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html")
-        with open(report_file, "w", encoding="utf-8") as f:
-            f.write(html_content)
+        return summary
+    
+    def generate_report(self, output_dir=".", filename="report.html"):
+        """生成 HTML 报告，只重新渲染数据有变化的片段"""
+        result = ReportBuilder(self.db, output_dir=output_dir, filename=filename).build()
         
-        print(f"\n✅ 报告已生成: {report_file}")
-        return report_file
+        print(f"\n✅ 报告已生成: {result['report_file']}")
+        print(f"   重新渲染 {result['rendered']} 个片段，复用 {result['reused']} 个，"
+              f"写入 {result['pages_written']} 个记录页")
+        return result["report_file"]
     
     def generate_demo_data(self, days=7):
         """生成演示数据"""
         print(f"生成过去 {days} 天的演示数据...")
         
-        brands = self.DEFAULT_BRANDS
+        brands = self.brands.all()
         platforms = list(self.PLATFORMS.keys())
         
         total_records = 0
@@ -520,30 +3158,31 @@ class GEOMonitor:
                         result = MockAIClient.query(platform_id, keyword, brand["name"])
                         
                         # 修改时间戳
-                        result["timestamp"] = (date - timedelta(hours=random.randint(0, 23))).isoformat()
+                        result.timestamp = int((date - timedelta(hours=random.randint(0, 23))).timestamp())
                         
                         # 手动插入带指定时间的记录
-                        conn = sqlite3.connect(self.db.db_file)
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            INSERT INTO monitor_records 
-                            (brand, platform, keyword, is_mentioned, rank, confidence, response, created_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (
-                            result["brand"],
-                            result["platform"],
-                            result["keyword"],
-                            1 if result["is_mentioned"] else 0,
-                            result["rank"],
-                            result["confidence"],
-                            result["response"],
-                            result["timestamp"]
-                        ))
-                        conn.commit()
-                        conn.close()
+                        with self.db.connect() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute("""
+                                INSERT INTO monitor_records 
+                                (brand, platform, keyword, is_mentioned, rank, confidence, response, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            """, (
+                                result.brand,
+                                result.platform,
+                                result.keyword,
+                                1 if result.is_mentioned else 0,
+                                result.rank,
+                                result.confidence,
+                                result.response,
+                                result.created_at
+                            ))
+                            conn.commit()
                         
                         total_records += 1
         
+        # 演示数据直接写表，声量统计需要整体重建
+        self.db.rebuild_mentions()
         print(f"✅ 已生成 {total_records} 条演示数据")
         return total_records
 
@@ -557,39 +3196,220 @@ def main():
                        choices=["kimi", "doubao", "qianwen", "deepseek", "wenxin", "hunyuan", "zhipu"],
                        help="选择监测平台")
     parser.add_argument("--brands", "-b", nargs="+",
-                       choices=["印暨咖啡", "瑞幸咖啡", "星巴克", "喜茶", "奈雪的茶"],
-                       help="选择监测品牌")
+                       help="选择监测品牌（名称或别名）")
+    parser.add_argument("--import-brands",
+                       help="从 CSV/JSON 文件批量导入品牌配置")
+    parser.add_argument("--list-brands", action="store_true",
+                       help="列出已配置的品牌")
     parser.add_argument("--keywords", "-k", nargs="+",
                        help="自定义关键词")
+    parser.add_argument("--jsonl",
+                       help="同时把监测结果逐行追加到 JSONL 文件")
+    parser.add_argument("--quiet", "-q", action="store_true",
+                       help="不逐条打印结果，只显示进度")
+    parser.add_argument("--analyze-keywords", action="store_true",
+                       help="聚类近似关键词并报告可节省的查询数")
+    parser.add_argument("--representatives-only", action="store_true",
+                       help="只查询每个关键词簇的代表，结果沿用到簇内其他关键词")
+    parser.add_argument("--keyword-threshold", type=float, default=0.5,
+                       help="关键词聚类的相似度阈值（默认0.5）")
+    parser.add_argument("--changes", action="store_true",
+                       help="查看最近的回答变化事件")
+    parser.add_argument("--share-of-voice", action="store_true",
+                       help="查看各平台品牌声量和共同提及（配合 --brands 只看指定品牌）")
+    parser.add_argument("--rebuild-mentions", action="store_true",
+                       help="按当前品牌配置重建声量与共同提及统计")
+    parser.add_argument("--rescore", action="store_true",
+                       help="按当前提及判定逻辑重新评分历史记录（可断点续跑）")
+    parser.add_argument("--workers", type=int,
+                       help="重新评分的进程数（默认 CPU 核数）")
+    parser.add_argument("--chunk-size", type=int, default=5000,
+                       help="重新评分每批处理的 id 区间长度（默认5000）")
+    parser.add_argument("--restart", action="store_true",
+                       help="忽略断点，从头重新评分")
+    parser.add_argument("--daily-budget", type=float,
+                       help="每日 API 成本上限（元），接近上限时降速，超出前停止")
+    parser.add_argument("--run-budget", type=float,
+                       help="单次监测 API 成本上限（元）")
+    parser.add_argument("--usage", action="store_true",
+                       help="查看最近7天各平台、品牌的 token 用量与成本")
+    parser.add_argument("--storage", choices=list(STORAGE_BACKENDS), default="sqlite",
+                       help="存储后端（默认 sqlite；duckdb 需安装 duckdb；memory 不落盘）")
+    parser.add_argument("--db",
+                       help="数据库文件（默认 sqlite 为 monitor.db，duckdb 为 monitor.duckdb）")
     parser.add_argument("--demo", "-d", action="store_true",
                        help="生成演示数据")
     parser.add_argument("--days", type=int, default=7,
                        help="演示数据天数（默认7天）")
     parser.add_argument("--report", "-r", action="store_true",
                        help="生成报告")
+    parser.add_argument("--compact", action="store_true",
+                       help="汇总并清理过期数据，回收数据库空间")
+    parser.add_argument("--raw-days", type=int, default=30,
+                       help="原始记录保留天数（默认30天）")
+    parser.add_argument("--hourly-days", type=int, default=56,
+                       help="小时汇总保留天数（默认8周）")
+    parser.add_argument("--daily-days", type=int, default=730,
+                       help="天汇总保留天数（默认2年），周汇总永久保留")
+    parser.add_argument("--build-dashboard", action="store_true",
+                       help="预计算看板静态数据包（按品牌和时间范围分片）")
+    parser.add_argument("--output", "-o", default="data",
+                       help="看板数据包输出目录（默认 data）")
+    parser.add_argument("--force", action="store_true",
+                       help="忽略指纹，重新生成全部分片")
     
     args = parser.parse_args()
     
     # 初始化监测器
-    monitor = GEOMonitor()
+    try:
+        backend = {
+            "sqlite": lambda: SQLiteBackend(args.db or "monitor.db"),
+            "memory": MemoryBackend,
+            "duckdb": lambda: DuckDBBackend(args.db or "monitor.duckdb"),
+        }[args.storage]()
+    except ImportError as e:
+        parser.error(str(e))
+    monitor = GEOMonitor(backend=backend)
+    
+    if args.import_brands:
+        # 批量导入品牌
+        count = monitor.brands.import_file(args.import_brands)
+        print(f"✅ 已导入 {count} 个品牌，当前共 {monitor.brands.count()} 个")
+    
+    elif args.list_brands:
+        for brand in monitor.brands.all():
+            aliases = "、".join(brand["aliases"]) or "-"
+            print(f"{brand['name']:12s} {brand['industry'] or '-':6s} 别名: {aliases}  关键词 {len(brand['keywords'])} 个")
+    
+    elif args.analyze_keywords:
+        # 关键词聚类分析
+        try:
+            plan = monitor.analyze_keywords(
+                brands=args.brands,
+                platforms=args.platforms,
+                keywords=args.keywords,
+                threshold=args.keyword_threshold
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        for brand, members in plan["clusters"]:
+            print(f"  {brand}: {' / '.join(members)}")
+        print(f"✅ 发现 {len(plan['clusters'])} 个近似关键词簇")
+        ratio = plan["saved"] / plan["queries"] * 100 if plan["queries"] else 0
+        print(f"   查询数 {plan['queries']} -> {plan['planned_queries']}，"
+              f"只监测代表可节省 {plan['saved']} 次（{ratio:.1f}%）")
+    
+    elif args.usage:
+        # 用量与成本
+        usage = monitor.db.get_usage(days=args.days)
+        for row in usage:
+            print(f"{row['platform']:10s} {row['brand']:12s} 调用 {row['calls']:6d}  "
+                  f"输入 {row['prompt_tokens']:8d}  输出 {row['completion_tokens']:8d}  "
+                  f"¥{row['cost']:.4f}" + (f"（{row['estimated_calls']} 次为估算）" if row["estimated_calls"] else ""))
+        print(f"✅ 最近 {args.days} 天合计 ¥{sum(r['cost'] for r in usage):.4f}")
+    
+    elif args.changes:
+        # 回答变化事件
+        changes = monitor.db.get_answer_changes(limit=50, latest=True)
+        for change in changes:
+            print(f"{change['created_at']}  {change['brand']} @ {change['platform']}  "
+                  f"{change['keyword']}  距离 {change['distance']}  "
+                  f"#{change['previous_id']} -> #{change['record_id']}")
+        print(f"✅ 共 {len(changes)} 条回答变化")
     
-    if args.demo:
+    elif args.rebuild_mentions:
+        # 重建声量统计
+        scanned = monitor.db.rebuild_mentions()
+        print(f"✅ 已按 {monitor.brands.count()} 个品牌重建声量统计，扫描 {scanned} 条记录")
+    
+    elif args.share_of_voice:
+        # 声量与共同提及
+        try:
+            brands = [b["name"] for b in monitor.brands.resolve(args.brands)] if args.brands else [None]
+        except ValueError as e:
+            parser.error(str(e))
+        for brand in brands:
+            for row in monitor.db.get_share_of_voice(brand=brand):
+                if args.platforms and row["platform"] not in args.platforms:
+                    continue
+                print(f"{row['platform']:10s} {row['brand']:12s} 提及 {row['mentions']:6d}  "
+                      f"声量 {row['share']:5.1f}%  提及率 {row['rate']:5.1f}%")
+            if brand:
+                others = monitor.db.get_co_mentions(brand, limit=11)
+                others.pop(brand, None)
+                pairs = "、".join(f"{other} {count}" for other, count in others.items()) or "-"
+                print(f"  与 {brand} 同时出现: {pairs}")
+    
+    elif args.rescore:
+        # 重新评分历史记录
+        started = time.time()
+        
+        def progress(last_id, max_id, scanned, updated):
+            print(f"\r  进度 {last_id}/{max_id}  已扫描 {scanned}  已更新 {updated}", end="", flush=True)
+        
+        result = Rescorer(monitor.db, monitor.brands).run(
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            restart=args.restart,
+            progress=progress
+        )
+        print(f"\n✅ 重新评分完成：扫描 {result['scanned']} 条，更新 {result['updated']} 条，"
+              f"耗时 {time.time() - started:.1f} 秒")
+    
+    elif args.demo:
         # 生成演示数据
         monitor.generate_demo_data(args.days)
         print("\n演示数据已生成！")
         print("提示: 运行 `python monitor.py --report` 生成报告")
-        
+    
     elif args.report:
         # 只生成报告
         monitor.generate_report()
-        
+    
+    elif args.compact:
+        # 汇总与压缩
+        result = monitor.db.compact(
+            raw_days=args.raw_days,
+            hourly_days=args.hourly_days,
+            daily_days=args.daily_days
+        )
+        print(f"✅ 已汇总 {result['rolled_up']} 条新记录")
+        for table, count in result["deleted"].items():
+            print(f"   {table}: 清理 {count} 行")
+        print(f"   回收 {result['reclaimed_pages']} 个数据页")
+    
+    elif args.build_dashboard:
+        # 构建静态看板数据包
+        builder = DashboardBuilder(monitor.db, output_dir=args.output)
+        result = builder.build(force=args.force)
+        print(f"✅ 看板数据包已输出到 {args.output}/")
+        print(f"   生成 {result['built']} 个分片（{result['bytes'] / 1024:.1f} KB），"
+              f"跳过未变化 {result['skipped']} 个，清理 {result['removed']} 个")
+        if brotli is None:
+            print("   提示: 安装 brotli 后可额外生成 .br 压缩版本")
+    
     else:
         # 执行监测
-        results = monitor.monitor(
-            brands=args.brands,
-            platforms=args.platforms,
-            keywords=args.keywords
-        )
+        db_sink = DatabaseSink(monitor.db)
+        sinks = [db_sink]
+        sinks.append(ProgressSink() if args.quiet else StreamSink())
+        if args.jsonl:
+            sinks.append(JsonlSink(args.jsonl))
+        try:
+            monitor.monitor(
+                brands=args.brands,
+                platforms=args.platforms,
+                keywords=args.keywords,
+                sinks=sinks,
+                representatives_only=args.representatives_only,
+                threshold=args.keyword_threshold,
+                daily_budget=args.daily_budget,
+                run_budget=args.run_budget
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        if db_sink.change_count:
+            print(f"⚠️  {db_sink.change_count} 个关键词的回答发生明显变化，运行 --changes 查看")
         
         # 生成报告
         monitor.generate_report()
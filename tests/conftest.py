@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置：让测试既能 import monitor，也能像脚本那样 import hotwords_crawler"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "crawlers")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""AI分析结果磁盘缓存：内容寻址、TTL过期与按体积的LRU淘汰"""
+
+from types import SimpleNamespace
+
+import hotwords_crawler
+from hotwords_crawler import AnalysisCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+    
+    def time(self):
+        return self.now
+
+
+def make_cache(tmp_path, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(hotwords_crawler, "time", SimpleNamespace(time=clock.time))
+    return AnalysisCache(str(tmp_path / "ai_cache.db"), **kwargs), clock
+
+
+def test_key_depends_on_platform_model_and_prompt():
+    key = AnalysisCache.make_key("kimi", "moonshot-v1-8k", "提示词")
+    assert key == AnalysisCache.make_key("kimi", "moonshot-v1-8k", "提示词")
+    assert key != AnalysisCache.make_key("deepseek", "moonshot-v1-8k", "提示词")
+    assert key != AnalysisCache.make_key("kimi", "moonshot-v1-32k", "提示词")
+    assert key != AnalysisCache.make_key("kimi", "moonshot-v1-8k", "提示词 ")
+
+
+def test_hit_and_miss_are_counted_and_persisted(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch, ttl=3600, max_bytes=10_000)
+    assert cache.get("kimi", "m", "p") is None
+    cache.set("kimi", "m", "p", "回复")
+    assert cache.get("kimi", "m", "p") == "回复"
+    assert (cache.hits, cache.misses) == (1, 1)
+    
+    reopened = AnalysisCache(cache.db_file, ttl=3600, max_bytes=10_000)
+    assert reopened.get("kimi", "m", "p") == "回复"
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl=60, max_bytes=10_000)
+    cache.set("kimi", "m", "p", "回复")
+    clock.now += 59
+    assert cache.get("kimi", "m", "p") == "回复"
+    clock.now += 2
+    assert cache.get("kimi", "m", "p") is None
+    conn = cache._connect()
+    assert conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone() == (0,)
+    conn.close()
+
+
+def test_zero_ttl_never_expires(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl=0, max_bytes=10_000)
+    cache.set("kimi", "m", "p", "回复")
+    clock.now += 10 ** 8
+    assert cache.get("kimi", "m", "p") == "回复"
+
+
+def test_least_recently_used_entries_are_evicted_over_size_limit(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl=0, max_bytes=30)
+    for prompt in ("a", "b", "c"):
+        cache.set("kimi", "m", prompt, "x" * 10)
+        clock.now += 1
+    # 访问 a 之后 b 成为最久未使用的条目
+    assert cache.get("kimi", "m", "a") is not None
+    clock.now += 1
+    
+    cache.set("kimi", "m", "d", "x" * 10)
+    
+    assert cache.get("kimi", "m", "b") is None
+    assert all(cache.get("kimi", "m", prompt) is not None for prompt in ("a", "c", "d"))
+
+
+def test_size_is_measured_in_utf8_bytes(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch, ttl=0, max_bytes=10)
+    cache.set("kimi", "m", "p", "热词热词")
+    assert cache.get("kimi", "m", "p") is None
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""按平台的熔断器：状态转换与跨运行持久化"""
+
+import json
+import time
+
+from hotwords_crawler import CircuitBreaker
+
+
+def make_breaker(tmp_path, **kwargs):
+    options = dict(failure_threshold=2, cooldown=60, max_cooldown=240)
+    options.update(kwargs)
+    return CircuitBreaker(str(tmp_path / "circuit_state.json"), **options)
+
+
+def expire_cooldown(breaker, platform):
+    breaker.states[platform]['opened_at'] = time.time() - breaker.states[platform]['cooldown'] - 1
+
+
+def test_opens_after_consecutive_failures(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    assert breaker.allow("kimi")
+    breaker.record_failure("kimi")
+    assert breaker.is_open("kimi")
+    assert not breaker.allow("kimi")
+    assert breaker.allow("deepseek")
+
+
+def test_success_resets_failure_count(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    breaker.record_success("kimi")
+    breaker.record_failure("kimi")
+    assert not breaker.is_open("kimi")
+
+
+def test_state_survives_restart(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    breaker.record_failure("kimi")
+    
+    saved = json.loads((tmp_path / "circuit_state.json").read_text(encoding="utf-8"))
+    assert saved["kimi"]["state"] == CircuitBreaker.OPEN
+    
+    restarted = make_breaker(tmp_path)
+    assert restarted.is_open("kimi")
+    assert not restarted.allow("kimi")
+
+
+def test_half_open_allows_a_single_probe(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    breaker.record_failure("kimi")
+    expire_cooldown(breaker, "kimi")
+    
+    assert breaker.allow("kimi")
+    assert not breaker.allow("kimi")
+    breaker.record_success("kimi")
+    assert breaker.states["kimi"]["state"] == CircuitBreaker.CLOSED
+    assert breaker.allow("kimi")
+    assert make_breaker(tmp_path).states["kimi"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_doubles_cooldown_up_to_limit(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    breaker.record_failure("kimi")
+    for expected in (120, 240, 240):
+        expire_cooldown(breaker, "kimi")
+        assert breaker.allow("kimi")
+        breaker.record_failure("kimi")
+        assert breaker.is_open("kimi")
+        assert breaker.states["kimi"]["cooldown"] == expected
+
+
+def test_half_open_state_is_probed_again_after_restart(tmp_path):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure("kimi")
+    breaker.record_failure("kimi")
+    expire_cooldown(breaker, "kimi")
+    assert breaker.allow("kimi")
+    
+    # 上次运行的探测请求没有结果就退出了，下次运行仍可再探测一次
+    restarted = make_breaker(tmp_path)
+    assert restarted.states["kimi"]["state"] == CircuitBreaker.HALF_OPEN
+    assert restarted.allow("kimi")
+    assert not restarted.allow("kimi")
+
+
+def test_corrupt_state_file_starts_fresh(tmp_path):
+    (tmp_path / "circuit_state.json").write_text("{not json", encoding="utf-8")
+    breaker = make_breaker(tmp_path)
+    assert breaker.states == {}
+    assert breaker.allow("kimi")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""SQLite 连接池：写连接独占与重入、只读连接复用、关闭时等待归还"""
+
+import threading
+import time
+
+import pytest
+
+from monitor import ConnectionPool, GEOMonitor, Rescorer, SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "pool.db"), readers=2)
+    with backend.connect() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+    yield backend
+    backend.close()
+
+
+def test_writer_is_reentrant_and_exclusive(backend):
+    pool = ConnectionPool(backend.open, readers=2)
+    entered = threading.Event()
+    
+    def other_writer():
+        with pool.acquire():
+            entered.set()
+    
+    with pool.acquire() as outer:
+        with pool.acquire() as inner:
+            assert inner._conn is outer._conn
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        assert not entered.wait(0.2)
+    thread.join(timeout=5)
+    assert entered.is_set()
+    pool.close()
+
+
+def test_readers_are_reused_and_overflow_is_closed(backend):
+    pool = ConnectionPool(backend.open, readers=1)
+    with pool.acquire(readonly=True) as first:
+        raw = first._conn
+        with pool.acquire(readonly=True):
+            pass
+    with pool.acquire(readonly=True) as again:
+        assert again._conn is raw
+    assert pool.stats["overflow"] == 1
+    assert pool.stats["opened"] == 2
+    pool.close()
+
+
+def test_close_waits_for_borrowed_readers(backend):
+    pool = ConnectionPool(backend.open, readers=2)
+    reader = pool.acquire(readonly=True)
+    
+    def give_back():
+        time.sleep(0.2)
+        reader.close()
+    
+    thread = threading.Thread(target=give_back)
+    thread.start()
+    start = time.monotonic()
+    pool.close()
+    assert time.monotonic() - start >= 0.15
+    assert pool._idle.empty()
+    thread.join()
+
+
+def test_close_refuses_while_reader_is_out(backend):
+    pool = ConnectionPool(backend.open, readers=2)
+    reader = pool.acquire(readonly=True)
+    with pytest.raises(RuntimeError):
+        pool.close(timeout=0.05)
+    assert reader.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    reader.close()
+    pool.close()
+
+
+def test_rescorer_releases_writer_between_chunks(tmp_path):
+    monitor = GEOMonitor(backend=SQLiteBackend(str(tmp_path / "monitor.db")))
+    monitor.generate_demo_data(days=1)
+    writer_free = []
+    
+    def write_between_chunks(last_id, max_id, scanned, updated):
+        # 另一个线程能在区间之间借到写连接
+        thread = threading.Thread(target=lambda: monitor.db.connect().close())
+        thread.start()
+        thread.join(timeout=2)
+        writer_free.append(not thread.is_alive())
+    
+    result = Rescorer(monitor.db, monitor.brands).run(workers=1, chunk_size=50,
+                                                     progress=write_between_chunks)
+    
+    assert result["last_id"] == result["max_id"]
+    assert len(writer_free) == -(-result["max_id"] // 50)
+    assert all(writer_free)
+    monitor.db.backend.close()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""CostBudget 的预留、结算与预算拦截"""
+
+import pytest
+
+from costs import CostBudget, estimate_tokens
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("咖啡推荐") == 4
+    assert estimate_tokens("abcd" * 5) == 5
+    assert estimate_tokens("咖啡abc") == 3
+
+
+def test_env_prices_override_and_fallback():
+    prices = CostBudget.env_prices({"KIMI_TOKEN_PRICE": "1,2", "DOUBAO_TOKEN_PRICE": "oops",
+                                    "DEEPSEEK_TOKEN_PRICE": "1,2,3"})
+    assert prices["kimi"] == (1.0, 2.0)
+    assert prices["doubao"] == CostBudget.PRICES["doubao"]
+    assert prices["deepseek"] == CostBudget.PRICES["deepseek"]
+
+
+def test_settle_releases_reservation_and_records_usage():
+    seen = []
+    budget = CostBudget(prices={"kimi": (10.0, 20.0)}, on_usage=seen.append, throttle_delay=0)
+    reserved = budget.reserve("kimi", 1000)
+    assert reserved == pytest.approx(budget.cost("kimi", 1000, 1000))
+    assert budget.reserved == pytest.approx(reserved)
+    
+    usage = budget.settle("kimi", reserved, 1000, 500, estimated=True, model="kimi-chat")
+    assert usage["cost"] == pytest.approx((1000 * 10 + 500 * 20) / 1e6)
+    assert budget.reserved == 0
+    assert budget.spent == pytest.approx(usage["cost"])
+    assert (budget.calls, budget.estimated_calls) == (1, 1)
+    assert budget.tokens == {"prompt": 1000, "completion": 500}
+    assert seen == [usage]
+    
+    # 之后的预计成本按已完成调用的平均输出长度估算
+    assert budget.expected_cost("kimi", 1000) == pytest.approx(budget.cost("kimi", 1000, 500))
+
+
+def test_reserve_rejects_when_run_budget_would_be_exceeded():
+    budget = CostBudget(run_budget=0.03, prices={"kimi": (10.0, 10.0)}, throttle_delay=0)
+    first = budget.reserve("kimi", 1000)
+    assert first == pytest.approx(0.02)
+    # 预留的额度也计入已用，第二次预计会超出预算
+    assert budget.reserve("kimi", 1000) is None
+    assert budget.stopped and budget.rejected == 1
+    
+    budget.release(first)
+    assert budget.reserved == 0
+    assert budget.reserve("kimi", 1000) == pytest.approx(0.02)
+
+
+def test_daily_budget_includes_spent_today():
+    budget = CostBudget(daily_budget=1.0, spent_today=0.99, prices={"kimi": (10.0, 10.0)}, throttle_delay=0)
+    assert budget.reserve("kimi", 1000) is None
+    budget.begin_run(spent_today=0.0)
+    assert not budget.stopped
+    assert budget.reserve("kimi", 1000) is not None
+
+
+def test_soft_ratio_throttles(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("costs.time.sleep", sleeps.append)
+    budget = CostBudget(run_budget=0.06, soft_ratio=0.3, throttle_delay=0.3, prices={"kimi": (10.0, 10.0)})
+    budget.reserve("kimi", 1000)
+    assert sleeps == []
+    budget.reserve("kimi", 1000)
+    assert sleeps == [0.3]
+
+
+def test_unknown_platform_costs_nothing():
+    budget = CostBudget(run_budget=0.01, throttle_delay=0)
+    assert budget.cost("unknown", 10 ** 6, 10 ** 6) == 0
+    assert budget.reserve("unknown", 10 ** 6) == 0
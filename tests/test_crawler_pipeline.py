@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""抓取流水线的去重与落库阶段：新簇立即落库，后续变体只更新共识热度"""
+
+import queue
+import threading
+from types import SimpleNamespace
+
+from hotwords_crawler import (_PIPELINE_DONE, HotwordClusterer, HotwordsCrawler, HotwordStore,
+                              StreamingHotwordDeduplicator, TrendTracker)
+
+
+class FakeSink:
+    def notify(self):
+        pass
+
+
+def make_crawler(tmp_path):
+    crawler = HotwordsCrawler.__new__(HotwordsCrawler)
+    crawler.ai_client = SimpleNamespace(clusterer=HotwordClusterer())
+    crawler.store = HotwordStore(str(tmp_path / "hotwords.db"))
+    crawler.trends = TrendTracker(crawler.store)
+    crawler.existing_keywords = set()
+    return crawler
+
+
+def new_stats():
+    return {'raw': 0, 'hotwords': 0, 'unique': 0, 'stored': 0, 'written': 0, 'mock': False}
+
+
+def test_deduplicator_returns_cluster_ids():
+    deduplicator = StreamingHotwordDeduplicator()
+    assert deduplicator.add_item({'热词文本': "淄博烧烤"}) == 0
+    assert deduplicator.add_item({'热词文本': "天气预报"}) == 1
+    assert deduplicator.add_item({'热词文本': "淄博烧烤爆火"}) == 0
+    assert [len(group) for group in deduplicator.groups] == [2, 1]
+
+
+def test_new_cluster_is_emitted_before_analysis_ends(tmp_path):
+    crawler = make_crawler(tmp_path)
+    hotword_queue, write_queue = queue.Queue(), queue.Queue()
+    stats = new_stats()
+    stage = threading.Thread(target=crawler._dedup_stage, args=(hotword_queue, write_queue, stats))
+    stage.start()
+    
+    hotword_queue.put({'热词文本': "淄博烧烤", '平台来源': "Kimi", '热度值': 80})
+    # 分析阶段尚未结束，新簇已经到达写入阶段
+    assert write_queue.get(timeout=5) == ('new', 0, {'热词文本': "淄博烧烤", '平台来源': "Kimi", '热度值': 80})
+    
+    hotword_queue.put({'热词文本': "淄博烧烤爆火", '平台来源': "DeepSeek", '热度值': 60})
+    assert write_queue.get(timeout=5) == ('update', 0, 77)
+    
+    hotword_queue.put(_PIPELINE_DONE)
+    stage.join(timeout=5)
+    assert write_queue.get(timeout=5) is _PIPELINE_DONE
+    assert stats['hotwords'] == 2 and stats['unique'] == 1
+    crawler.store.close()
+
+
+def test_write_stage_stores_consensus_heat_and_observes_trend_once(tmp_path):
+    crawler = make_crawler(tmp_path)
+    run_id = crawler.store.start_run()
+    write_queue = queue.Queue()
+    for message in [('new', 0, {'热词文本': "淄博烧烤", '平台来源': "Kimi", '热度值': 80}),
+                    ('new', 1, {'热词文本': "天气预报", '平台来源': "豆包", '热度值': 50}),
+                    ('update', 0, 77),
+                    _PIPELINE_DONE]:
+        write_queue.put(message)
+    stats = new_stats()
+    sink = FakeSink()
+    
+    crawler._write_stage(write_queue, stats, run_id, sink)
+    crawler.store.flush()
+    
+    assert stats['stored'] == 2
+    rows = dict(crawler.store._conn.execute("SELECT keyword, heat FROM hotwords").fetchall())
+    assert rows == {"淄博烧烤": 77, "天气预报": 50}
+    history = crawler.store._conn.execute(
+        "SELECT keyword, heat FROM heat_history ORDER BY keyword").fetchall()
+    assert sorted(history) == [("天气预报", 50), ("淄博烧烤", 77)]
+    crawler.store.close()
+
+
+def test_updated_hotword_is_resynced_as_update(tmp_path):
+    store = HotwordStore(str(tmp_path / "hotwords.db"))
+    run_id = store.start_run()
+    fields = {'热词文本': "淄博烧烤", '平台来源': "Kimi", '热度值': 80}
+    store.add_hotword(run_id, fields)
+    store.flush()
+    
+    [(hotword_id, _, record_id, revision)] = store.pending_hotwords()
+    assert record_id is None
+    store.mark_synced(hotword_id, "rec1", revision)
+    assert store.pending_hotwords() == []
+    
+    store.update_hotword(run_id, dict(fields, 热度值=90))
+    store.flush()
+    [(_, synced_fields, record_id, new_revision)] = store.pending_hotwords()
+    assert synced_fields['热度值'] == 90
+    assert record_id == "rec1" and new_revision == revision + 1
+    
+    # 同步期间版本已变：记录id保存下来，但仍视为未同步
+    store.mark_synced(hotword_id, None, revision)
+    assert len(store.pending_hotwords()) == 1
+    store.close()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""MinHash/LSH 近似归簇与关键词查询计划"""
+
+from minhash import MinHasher, MinHashIndex
+from monitor import GEOMonitor, KeywordClusterer
+
+
+def test_index_groups_near_duplicates_and_keeps_first_text():
+    index = MinHashIndex(MinHasher(threshold=0.5))
+    assert index.add("淄博烧烤") == 0
+    assert index.add("淄博烧烤爆火") == 0
+    assert index.add("天气预报") == 1
+    assert index.add("淄博烧烤") == 0
+    assert index.texts == ["淄博烧烤", "天气预报"]
+
+
+def test_shingles_ignore_case_and_whitespace():
+    hasher = MinHasher(ngram=2)
+    assert hasher.shingles("Ab C") == {"ab", "bc"}
+    assert hasher.shingles("a") == {"a"}
+    assert hasher.shingles(" ") == set()
+    assert MinHasher.jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+
+
+def test_brand_names_normalized_to_industry():
+    clusterer = KeywordClusterer()
+    clusterer.use_brands(GEOMonitor.DEFAULT_BRANDS)
+    assert clusterer.normalize("星巴克推荐") == "咖啡推荐"
+    assert clusterer.normalize("广州印暨咖啡") == "广州咖啡"
+
+
+def test_plan_clusters_within_each_brand_only():
+    brands = [
+        {"name": "印暨咖啡", "aliases": [], "industry": "咖啡", "keywords": ["咖啡推荐", "广州咖啡", "广州印暨咖啡"]},
+        {"name": "星巴克", "aliases": [], "industry": "咖啡", "keywords": ["星巴克推荐", "星冰乐"]},
+    ]
+    plan = KeywordClusterer().plan(brands, platform_count=2)
+    
+    # 咖啡推荐/星巴克推荐 属于不同品牌，各自仍要查询，不算作簇
+    assert plan["clusters"] == [("印暨咖啡", ["广州咖啡", "广州印暨咖啡"])]
+    assert plan["groups"]["印暨咖啡"] == {"咖啡推荐": ["咖啡推荐"], "广州咖啡": ["广州咖啡", "广州印暨咖啡"]}
+    assert plan["groups"]["星巴克"] == {"星巴克推荐": ["星巴克推荐"], "星冰乐": ["星冰乐"]}
+    assert (plan["queries"], plan["planned_queries"], plan["saved"]) == (10, 8, 2)
+
+
+def test_plan_savings_match_reported_clusters():
+    plan = KeywordClusterer().plan(GEOMonitor.DEFAULT_BRANDS, platform_count=7)
+    collapsed = sum(len(members) - 1 for _, members in plan["clusters"])
+    assert plan["saved"] == collapsed * 7
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""MonitorRecord：字段转换，以及相对逐行字典的内存占用"""
+
+import gc
+import random
+import tracemalloc
+
+import pytest
+
+from monitor import BrandRegistry, DatabaseManager, GEOMonitor, MockAIClient, MonitorRecord, SQLiteBackend
+
+
+def test_dict_round_trip_and_replace():
+    record = MonitorRecord("kimi", "咖啡推荐", "印暨咖啡", True, 1, 90, "推荐印暨咖啡", timestamp=0,
+                           cost=0.01)
+    data = record.as_dict()
+    assert data["cost"] == 0.01 and "attributed_from" not in data
+    
+    copy = MonitorRecord.from_dict(dict(data, timestamp=0))
+    assert (copy.platform, copy.rank, copy.cost, copy.timestamp) == ("kimi", 1, 0.01, 0)
+    
+    attributed = record.replace(keyword="广州咖啡", attributed_from="咖啡推荐")
+    assert attributed.keyword == "广州咖啡" and record.attributed_from is None
+    with pytest.raises(TypeError):
+        record.replace(unknown=1)
+
+
+def test_strings_are_interned():
+    a = MonitorRecord("kimi", "".join(["咖啡", "推荐"]), "印暨咖啡", True, 1, 90, "")
+    b = MonitorRecord("kimi", "".join(["咖啡", "推荐"]), "印暨咖啡", True, 1, 90, "")
+    assert a.keyword is b.keyword
+
+
+def _retained(load):
+    """load() 的返回值在保留期间占用的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = load()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert result
+    return size
+
+
+def test_records_use_less_than_half_the_memory_of_row_dicts(tmp_path):
+    db = DatabaseManager(backend=SQLiteBackend(str(tmp_path / "monitor.db")))
+    registry = BrandRegistry(db, seed=GEOMonitor.DEFAULT_BRANDS)
+    db.mention_finder = registry.mentions
+    state = random.getstate()
+    random.seed(11)
+    brands = registry.all()
+    records = []
+    for i in range(10000):
+        brand = brands[i % len(brands)]
+        records.append(MockAIClient.query(random.choice(["kimi", "deepseek", "doubao"]),
+                                          random.choice(brand["keywords"]), brand["name"]))
+    random.setstate(state)
+    db.save_records(records)
+    
+    def row_dicts():
+        # 改为 MonitorRecord 之前 get_recent_records() 的返回形式
+        with db.connect(readonly=True) as conn:
+            cursor = conn.execute("""
+                SELECT r.id, r.brand, r.platform, r.keyword, r.is_mentioned, r.rank, r.confidence,
+                       COALESCE(r.response, c.response) AS response, r.created_at, r.simhash, r.ref_id
+                FROM monitor_records r
+                LEFT JOIN monitor_records c ON c.id = r.ref_id
+                ORDER BY r.created_at DESC LIMIT 10000
+            """)
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    ratio = _retained(lambda: db.get_recent_records(limit=10000)) / _retained(row_dicts)
+    assert ratio < 0.5
+    db.backend.close()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""监测流程：预算耗尽的提示、有效结果计数与回答评分"""
+
+import random
+
+from monitor import GEOMonitor, MockAIClient, MonitorRecord, ResultSink, SQLiteBackend
+from crawlers.costs import CostBudget
+
+
+class CollectSink(ResultSink):
+    def __init__(self):
+        self.results = []
+    
+    def write(self, result):
+        self.results.append(result)
+
+
+def make_monitor(tmp_path):
+    return GEOMonitor(backend=SQLiteBackend(str(tmp_path / "monitor.db")))
+
+
+def test_iter_monitor_stops_silently_when_budget_is_exhausted(tmp_path, capsys):
+    monitor = make_monitor(tmp_path)
+    budget = CostBudget(run_budget=1e-9, throttle_delay=0)
+    
+    results = list(monitor.iter_monitor(["印暨咖啡"], ["kimi"], delay=0, budget=budget))
+    
+    assert results == []
+    assert budget.stopped
+    assert capsys.readouterr().out == ""
+
+
+def test_monitor_reports_budget_stop(tmp_path, capsys):
+    monitor = make_monitor(tmp_path)
+    
+    summary = monitor.monitor(["印暨咖啡"], ["kimi"], sinks=[], delay=0, run_budget=1e-9)
+    
+    assert summary["budget_stopped"] and summary["total"] == 0
+    assert "预算不足" in capsys.readouterr().out
+
+
+def test_mentioned_counts_only_queried_answers(tmp_path):
+    monitor = make_monitor(tmp_path)
+    sink = CollectSink()
+    random.seed(3)
+    
+    summary = monitor.monitor(["印暨咖啡"], ["kimi", "deepseek"], sinks=[sink], delay=0,
+                              representatives_only=True)
+    
+    attributed = [r for r in sink.results if r.attributed_from]
+    assert attributed, "演示品牌应有沿用代表关键词的结果"
+    assert summary["total"] == len(sink.results)
+    assert summary["mentioned"] == sum(
+        1 for r in sink.results if r.is_mentioned and not r.attributed_from
+    )
+
+
+def test_results_keep_their_own_score(tmp_path, monkeypatch):
+    monitor = make_monitor(tmp_path)
+    monkeypatch.setattr(MockAIClient, "query", staticmethod(
+        lambda platform, keyword, brand: MonitorRecord(platform, keyword, brand, True, 2, 77, "没有提到任何品牌")
+    ))
+    
+    [result] = monitor.iter_monitor(["印暨咖啡"], ["kimi"], ["咖啡推荐"], delay=0)
+    
+    assert (result.is_mentioned, result.rank, result.confidence) == (True, 2, 77)
+
+
+def test_results_without_score_are_scored_from_response(tmp_path, monkeypatch):
+    monitor = make_monitor(tmp_path)
+    response = "推荐印暨咖啡，环境安静"
+    monkeypatch.setattr(MockAIClient, "query", staticmethod(
+        lambda platform, keyword, brand: {"platform": platform, "keyword": keyword, "brand": brand,
+                                          "response": response}
+    ))
+    
+    [result] = monitor.iter_monitor(["印暨咖啡"], ["kimi"], ["咖啡推荐"], delay=0)
+    
+    assert (result.is_mentioned, result.rank, result.confidence) == monitor.brands.score(response, "印暨咖啡")
+    assert result.is_mentioned
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""按主机的AIMD限流器，以及 RetryableSession 归还并发名额的时机"""
+
+import io
+import threading
+import time
+
+import pytest
+import requests
+
+from hotwords_crawler import HostRateLimiter, RateLimiterRegistry, RetryableSession
+
+
+def make_limiter(**kwargs):
+    options = dict(rate=10.0, burst=10.0, concurrency=4, max_concurrency=8)
+    options.update(kwargs)
+    return HostRateLimiter("api.example.com", **options)
+
+
+def make_response(status, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers.update(headers or {})
+    resp.raw = io.BytesIO(b"data: [DONE]\n\n")
+    return resp
+
+
+def test_success_grows_concurrency_additively():
+    limiter = make_limiter()
+    limiter.acquire()
+    limiter.release(200)
+    assert limiter.in_flight == 0
+    assert limiter.concurrency == pytest.approx(4.25)
+    assert limiter.rate == pytest.approx(10.0)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttling_halves_concurrency_and_rate(status):
+    limiter = make_limiter()
+    limiter.acquire()
+    limiter.release(status, {"Retry-After": "2"})
+    assert limiter.concurrency == pytest.approx(2.0)
+    assert limiter.rate == pytest.approx(5.0)
+    assert limiter.throttle_events == 1
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(2.0, abs=0.1)
+
+
+def test_concurrency_and_rate_have_floors_and_recover_to_caps():
+    limiter = make_limiter(concurrency=1, rate=0.15)
+    limiter.release(429, {"Retry-After": "0"})
+    assert limiter.concurrency == 1.0
+    assert limiter.rate == pytest.approx(0.1)
+    for _ in range(100):
+        limiter.release(200)
+    assert limiter.concurrency == pytest.approx(8)
+    assert limiter.rate == pytest.approx(0.15)
+
+
+def test_quota_headers_pause_before_throttling():
+    limiter = make_limiter()
+    limiter.release(200, {"X-RateLimit-Limit-Requests": "120", "X-RateLimit-Remaining-Requests": "0",
+                          "X-RateLimit-Reset-Requests": "1.5s"})
+    assert limiter.max_rate == pytest.approx(2.0)
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(1.5, abs=0.1)
+
+
+def test_acquire_blocks_at_concurrency_limit():
+    limiter = make_limiter(concurrency=1)
+    limiter.acquire()
+    start = time.monotonic()
+    threading.Timer(0.1, limiter.release, args=(200,)).start()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+    assert limiter.in_flight == 1
+
+
+def make_session(responses):
+    registry = RateLimiterRegistry()
+    session = RetryableSession(max_retries=2, limiters=registry)
+    session.session.request = lambda method, url, **kwargs: responses.pop(0)
+    return session, registry.get("https://api.example.com/v1")
+
+
+def test_streamed_response_holds_slot_until_closed():
+    session, limiter = make_session([make_response(200)])
+    resp = session.post("https://api.example.com/v1", stream=True)
+    assert limiter.in_flight == 1
+    with resp:
+        list(resp.iter_lines())
+    assert limiter.in_flight == 0
+    resp.close()
+    assert limiter.in_flight == 0
+
+
+def test_plain_response_releases_slot_immediately():
+    session, limiter = make_session([make_response(200)])
+    session.post("https://api.example.com/v1")
+    assert limiter.in_flight == 0
+
+
+def test_503_is_retried_by_the_limiter_not_urllib3():
+    session, limiter = make_session([make_response(503, {"Retry-After": "0"}), make_response(200)])
+    resp = session.post("https://api.example.com/v1", stream=True)
+    assert resp.status_code == 200
+    assert limiter.throttle_events == 1
+    resp.close()
+    assert limiter.in_flight == 0
+    retry = session.session.get_adapter("https://api.example.com").max_retries
+    assert 503 not in retry.status_forcelist and 429 not in retry.status_forcelist
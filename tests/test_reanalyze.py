@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""离线重新分析：不需要飞书配置，只与本地库去重"""
+
+import pytest
+
+import hotwords_crawler
+from hotwords_crawler import CrawlerConfig, HotwordsCrawler, HotwordStore
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    monkeypatch.setattr(hotwords_crawler, "AI_CACHE_FILE", str(tmp_path / "ai_cache.db"))
+    monkeypatch.setattr(hotwords_crawler, "CIRCUIT_STATE_FILE", str(tmp_path / "circuit_state.json"))
+    store = HotwordStore(str(tmp_path / "hotwords.db"))
+    crawler = HotwordsCrawler(CrawlerConfig(env={}), store=store)
+    crawler.ai_client._available_platforms = lambda: ["kimi"]
+    crawler.ai_client.iter_analysis = lambda platform, prompt: iter([
+        {'热词文本': "淄博烧烤", '热度值': 90},
+        {'热词文本': "天水麻辣烫", '热度值': 70},
+    ])
+    yield crawler
+    store.close()
+
+
+def test_reanalyze_runs_without_feishu_config(crawler):
+    store = crawler.store
+    run_id = store.start_run('crawl')
+    store.add_raw_items(run_id, "微博", [{'title': "淄博烧烤", 'hot': 100}])
+    store.add_hotword(run_id, {'热词文本': "天水麻辣烫", '平台来源': "Kimi", '热度值': 80})
+    store.flush()
+    
+    stats = crawler.reanalyze()
+    
+    # 本地库已有的热词跳过，新热词只写入本地库，留待 --sync 补写
+    assert stats['unique'] == 2 and stats['stored'] == 1
+    assert crawler._feishu is None
+    assert sorted(fields['热词文本'] for _, fields, _, _ in store.pending_hotwords()) == ["天水麻辣烫", "淄博烧烤"]
+
+
+def test_crawl_still_requires_feishu_config(crawler):
+    with pytest.raises(ValueError):
+        crawler.run()
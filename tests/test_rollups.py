@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""小时/天/周汇总、压缩清理，以及 get_stats 合并已清理记录的汇总计数"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from monitor import DatabaseManager, MonitorRecord, SQLiteBackend
+
+NOW = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(backend=SQLiteBackend(str(tmp_path / "monitor.db")))
+    yield db
+    db.backend.close()
+
+
+def save(db, created_at, brand="印暨咖啡", platform="kimi", keyword="咖啡推荐", mentioned=True, rank=1,
+         confidence=80, response=None, attributed_from=None):
+    """保存一条记录并把时间改为 created_at（UTC）"""
+    record = MonitorRecord(platform, keyword, brand, mentioned, rank, confidence,
+                           response or f"{brand} {platform} {keyword} {created_at:%F %H}",
+                           attributed_from=attributed_from)
+    db.save_records([record])
+    with db.connect() as conn:
+        conn.execute("UPDATE monitor_records SET created_at = ? WHERE id = (SELECT MAX(id) FROM monitor_records)",
+                     (created_at.strftime("%Y-%m-%d %H:%M:%S"),))
+        conn.commit()
+
+
+def stats_by_key(stats):
+    return {(s["brand"], s["platform"]): (s["total"], s["mentioned"], s["avg_rank"], s["avg_confidence"])
+            for s in stats}
+
+
+def test_rollup_is_incremental_and_buckets_by_granularity(db):
+    day = (NOW - timedelta(days=3)).replace(hour=10)
+    save(db, day)
+    save(db, day + timedelta(minutes=30), mentioned=False, rank=0, confidence=40)
+    save(db, day + timedelta(hours=2), rank=3, confidence=60)
+    save(db, day, attributed_from="广州咖啡")
+    
+    assert db.rollup() == 4
+    assert db.rollup() == 0
+    
+    hourly = db.get_rollups("hourly", days=7)
+    assert [(r["bucket"], r["total"], r["mentioned"]) for r in hourly] == [
+        (day.strftime("%Y-%m-%d %H:00:00"), 2, 1),
+        ((day + timedelta(hours=2)).strftime("%Y-%m-%d %H:00:00"), 1, 1),
+    ]
+    [daily] = db.get_rollups("daily", days=7)
+    assert (daily["bucket"], daily["total"], daily["mentioned"]) == (day.strftime("%Y-%m-%d"), 3, 2)
+    assert daily["avg_rank"] == pytest.approx(2.0)
+    assert daily["avg_confidence"] == pytest.approx(60.0)
+    [weekly] = db.get_rollups("weekly", days=14)
+    monday = day - timedelta(days=day.weekday())
+    assert weekly["bucket"] == monday.strftime("%Y-%m-%d") and weekly["total"] == 3
+    
+    save(db, NOW)
+    assert db.rollup() == 1
+    assert sum(r["total"] for r in db.get_rollups("daily", days=7)) == 4
+
+
+def test_compaction_keeps_stats_from_rollups(db):
+    old = (NOW - timedelta(days=40)).replace(hour=9)
+    for i in range(3):
+        save(db, old + timedelta(hours=i), mentioned=i != 1, rank=i + 1, confidence=50 + i)
+    save(db, old, platform="doubao", mentioned=False, rank=0, confidence=30)
+    save(db, NOW - timedelta(days=1), rank=2, confidence=90)
+    save(db, NOW - timedelta(days=1), attributed_from="广州咖啡")
+    
+    before = {days: stats_by_key(db.get_stats(days=days)) for days in (None, 60, 7)}
+    result = db.compact(raw_days=30)
+    
+    assert result["deleted"]["monitor_records"] == 4
+    assert len(db.get_recent_records(limit=100)) == 2
+    for days, expected in before.items():
+        assert stats_by_key(db.get_stats(days=days)) == pytest.approx(expected), days
+    # 过滤条件同样作用于汇总表
+    doubao = ("印暨咖啡", "doubao")
+    assert stats_by_key(db.get_stats(platform="doubao", days=None)) == {doubao: before[None][doubao]}
+    assert stats_by_key(db.get_stats(brand="瑞幸咖啡", days=None)) == {}
+
+
+def test_compaction_moves_referenced_response_to_retained_record(db):
+    old = NOW - timedelta(days=40)
+    save(db, old, response="印暨咖啡环境安静，适合办公")
+    save(db, NOW - timedelta(days=1), response="印暨咖啡环境安静，适合办公")
+    with db.connect(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM monitor_records WHERE ref_id IS NOT NULL").fetchone() == (1,)
+    
+    db.compact(raw_days=30)
+    
+    [record] = db.get_recent_records(limit=10)
+    assert record.response == "印暨咖啡环境安静，适合办公"
+    assert record.ref_id is None
+
+
+def test_rollups_past_retention_are_dropped(db):
+    save(db, NOW - timedelta(days=100))
+    result = db.compact(raw_days=30, hourly_days=56, daily_days=730)
+    assert result["deleted"]["rollup_hourly"] == 1
+    assert result["deleted"]["rollup_daily"] == 0
+    assert sum(r["total"] for r in db.get_rollups("daily", days=365)) == 1
+    assert stats_by_key(db.get_stats(days=None)) == {("印暨咖啡", "kimi"): (1, 1, 1.0, 80.0)}
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""各存储后端执行同一组写入和查询，结果与 SQLite 文件库一致"""
+
+import random
+import re
+
+import pytest
+
+from monitor import (BrandRegistry, DashboardBuilder, DatabaseManager, DuckDBBackend, GEOMonitor,
+                     MemoryBackend, MockAIClient, Rescorer, SQLiteBackend, StorageBackend, np)
+
+
+def normalize(value):
+    """把查询结果整理成可直接比较的形式：浮点数按精度取整，元组转列表"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize(v) for v in value]
+        return sorted(items, key=repr) if isinstance(value, set) else items
+    return value
+
+
+def storage_scenario(backend, records=300, seed=7):
+    """
+    在空库上执行一组固定的写入和查询，返回 {检查项: 结果}
+    
+    覆盖记录写入（SimHash 引用、变化事件、声量统计）、各类统计查询、品牌配置热加载、
+    用量记账、汇总、压缩和重新评分。时间相关的值只检查格式，不参与比较。
+    """
+    results = {}
+    db = DatabaseManager(backend=backend)
+    registry = BrandRegistry(db, seed=GEOMonitor.DEFAULT_BRANDS)
+    db.mention_finder = registry.mentions
+    results["brands"] = sorted(registry.names())
+    
+    version = registry.version
+    registry.upsert({"name": "测试品牌", "aliases": ["TestBrand"], "industry": "测试", "keywords": ["测试"]})
+    results["registry_reload"] = [
+        registry.version != version,
+        (registry.get("testbrand") or {}).get("name"),
+        registry.delete("测试品牌"),
+        registry.get("测试品牌") is None
+    ]
+    
+    # 固定随机种子生成记录，同一 (品牌, 平台, 关键词) 反复出现以触发引用和变化事件
+    state = random.getstate()
+    random.seed(seed)
+    brands = registry.all()
+    batch = []
+    for _ in range(records):
+        brand = random.choice(brands)
+        record = MockAIClient.query(random.choice(["kimi", "deepseek", "doubao"]),
+                                    random.choice(brand["keywords"][:3]), brand["name"])
+        record.is_mentioned, record.rank, record.confidence = registry.score(record.response, brand["name"])
+        batch.append(record)
+    random.setstate(state)
+    changes = []
+    for start in range(0, len(batch), 100):
+        changes.extend(db.save_records(batch[start:start + 100]))
+    results["save_changes"] = changes
+    
+    recent = db.get_recent_records(limit=records)
+    results["timestamp_format"] = all(
+        re.fullmatch(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d", record.created_at or "") for record in recent
+    )
+    results["recent_records"] = sorted(
+        ({k: v for k, v in record.as_dict().items() if k not in ("created_at", "timestamp")} for record in recent),
+        key=lambda record: record["id"]
+    )
+    results["stats_all"] = sorted(db.get_stats(days=None), key=lambda s: (s["brand"], s["platform"]))
+    results["stats_filtered"] = db.get_stats(brand=brands[0]["name"], platform="kimi", days=7)
+    results["answer_changes"] = [
+        {k: v for k, v in change.items() if k != "created_at"}
+        for change in db.get_answer_changes(limit=records)
+    ]
+    results["share_of_voice"] = db.get_share_of_voice()
+    results["co_mentions"] = db.get_co_mentions()
+    
+    run_id = db.start_run()
+    db.save_usage(run_id, {(brands[0]["name"], "kimi"): (3, 120, 80, 0.0123, 1)})
+    db.save_usage(run_id, {(brands[0]["name"], "kimi"): (1, 40, 20, 0.004, 0)})
+    db.finish_run(run_id, {"total": 4, "mentioned": 2, "cost": 0.0163})
+    results["usage"] = [run_id, db.get_usage(run_id=run_id), db.get_usage(days=1), db.spent_today()]
+    
+    results["rollup"] = db.rollup()
+    results["rollups"] = {
+        granularity: db.get_rollups(granularity, days=14) for granularity in DatabaseManager.ROLLUP_TABLES
+    }
+    if np is not None:
+        series = db.get_time_series("1d", days=7)
+        results["time_series"] = [series["bucket_seconds"], series["series"]]
+    results["dashboard_fingerprints"] = DashboardBuilder(db).fingerprints(7)
+    
+    # 把前一部分记录改为过期，压缩后引用仍能取到原文
+    with db.connect() as conn:
+        conn.execute("UPDATE monitor_records SET created_at = '2000-01-03 08:00:00' WHERE id <= ?", (records // 3,))
+        conn.commit()
+    compacted = db.compact(raw_days=30)
+    results["compact"] = [compacted["rolled_up"], compacted["deleted"]["monitor_records"]]
+    remaining = db.get_recent_records(limit=records)
+    results["compact_refs"] = [len(remaining), sum(1 for r in remaining if r.response is None)]
+    
+    # 换一套品牌别名后重新评分，结果与汇总表同步
+    registry.upsert({"name": brands[0]["name"], "aliases": ["在"], "industry": brands[0]["industry"],
+                     "keywords": brands[0]["keywords"]})
+    rescored = Rescorer(db, registry).run(workers=1, chunk_size=50)
+    results["rescore"] = [
+        rescored["scanned"], rescored["updated"],
+        sorted(db.get_stats(days=None), key=lambda s: (s["brand"], s["platform"])),
+        db.get_rollups("daily", days=14)
+    ]
+    return results
+
+
+BACKENDS = {
+    "sqlite": lambda tmp_path: SQLiteBackend(str(tmp_path / "check.db")),
+    "memory": lambda tmp_path: MemoryBackend(),
+    "duckdb": lambda tmp_path: DuckDBBackend(str(tmp_path / "check.duckdb")),
+}
+
+
+@pytest.fixture(scope="module")
+def expected(tmp_path_factory):
+    """以临时 SQLite 文件库的结果为基准"""
+    return normalize(storage_scenario(SQLiteBackend(str(tmp_path_factory.mktemp("reference") / "reference.db"))))
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_matches_sqlite(name, expected, tmp_path):
+    if name == "duckdb":
+        pytest.importorskip("duckdb")
+    actual = normalize(storage_scenario(BACKENDS[name](tmp_path)))
+    assert [check for check, value in expected.items() if value is False] == []
+    assert [check for check, value in expected.items() if actual.get(check) != value] == []
+
+
+def test_storage_backend_requires_connect():
+    with pytest.raises(TypeError):
+        StorageBackend()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""流式响应：SSE 事件解析与增量 JSON 数组解析"""
+
+import json
+
+from hotwords_crawler import AIPlatformClient, IncrementalJSONArrayParser
+
+
+ITEMS = [
+    {"热词文本": "淄博烧烤", "热度值": 95, "内容摘要": "含有 {花括号} 和 [方括号] 的\"摘要\""},
+    {"热词文本": "天水麻辣烫", "热度值": 90, "地域属性": ["甘肃"]},
+    {"热词文本": "围炉煮茶", "热度值": 80},
+]
+
+
+def feed_in_pieces(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+def test_objects_are_returned_as_soon_as_complete():
+    text = "以下是分析结果[注：按热度排序]：\n```json\n" + json.dumps(ITEMS, ensure_ascii=False) + "\n```"
+    for size in (1, 3, 7, len(text)):
+        parser = IncrementalJSONArrayParser()
+        assert feed_in_pieces(parser, text, size) == ITEMS
+        assert parser.complete and parser.count == 3
+
+
+def test_first_object_arrives_before_array_closes():
+    text = json.dumps(ITEMS, ensure_ascii=False)
+    first_end = text.index("}, {") + 1
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed(text[:first_end]) == [ITEMS[0]]
+    assert not parser.complete
+
+
+def test_truncated_array_keeps_completed_objects():
+    text = json.dumps(ITEMS, ensure_ascii=False)
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed(text[:text.rindex("{") + 5]) == ITEMS[:2]
+    assert not parser.complete
+
+
+def test_malformed_object_is_skipped():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"热词文本": "a", }, {"热词文本": "b"}]') == [{"热词文本": "b"}]
+    assert parser.count == 1
+    assert parser.feed('[{"热词文本": "c"}]') == []
+
+
+class FakeSSEResponse:
+    def __init__(self, lines):
+        self.lines = lines
+    
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+
+def test_sse_data_events_stop_at_done():
+    resp = FakeSSEResponse([
+        ": keep-alive",
+        'data: {"choices": [{"delta": {"content": "[{"}}]}',
+        "",
+        "data: not json",
+        'data: {"usage": {"prompt_tokens": 3}}',
+        "data: [DONE]",
+        'data: {"ignored": true}',
+    ])
+    assert list(AIPlatformClient._iter_sse_data(resp)) == [
+        {"choices": [{"delta": {"content": "[{"}}]},
+        {"usage": {"prompt_tokens": 3}},
+    ]
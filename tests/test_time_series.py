@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""NumPy 向量化时间序列：分组、分桶、移动平均与环比"""
+
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from monitor import DatabaseManager, MonitorRecord, SQLiteBackend
+
+HOUR = 3600
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(backend=SQLiteBackend(str(tmp_path / "monitor.db")))
+    yield db
+    db.backend.close()
+
+
+def save(db, hours_ago, brand="印暨咖啡", platform="kimi", mentioned=True, rank=1, attributed_from=None):
+    """在当前小时往前第 hours_ago 个小时内保存一条记录"""
+    ts = int(time.time()) // HOUR * HOUR - hours_ago * HOUR + 60
+    record = MonitorRecord(platform, "咖啡推荐", brand, mentioned, rank, 80,
+                           f"{brand} {platform} {ts}", attributed_from=attributed_from)
+    db.save_records([record])
+    with db.connect() as conn:
+        conn.execute("UPDATE monitor_records SET created_at = ? WHERE id = (SELECT MAX(id) FROM monitor_records)",
+                     (datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),))
+        conn.commit()
+
+
+def tail(values, n=4):
+    return values[-n:]
+
+
+def test_parse_bucket():
+    assert DatabaseManager.parse_bucket("15m") == 900
+    assert DatabaseManager.parse_bucket("1h") == HOUR
+    assert DatabaseManager.parse_bucket("d") == 86400
+    assert DatabaseManager.parse_bucket(120) == 120
+    for bad in ("3x", 0):
+        with pytest.raises(ValueError):
+            DatabaseManager.parse_bucket(bad)
+
+
+def test_hourly_series_per_group(db):
+    save(db, 3)
+    save(db, 3, mentioned=False, rank=0)
+    save(db, 1, rank=3)
+    save(db, 0, rank=2)
+    save(db, 0, rank=4)
+    save(db, 0, platform="doubao", mentioned=False, rank=0)
+    save(db, 0, attributed_from="广州咖啡")
+    
+    result = db.get_time_series("1h", days=1, window=2)
+    assert result["bucket_seconds"] == HOUR
+    assert len(result["buckets"]) == 25
+    
+    doubao, kimi = result["series"]
+    assert (doubao["brand"], doubao["platform"]) == ("印暨咖啡", "doubao")
+    assert (kimi["brand"], kimi["platform"]) == ("印暨咖啡", "kimi")
+    assert all(len(s["total"]) == 25 for s in result["series"])
+    
+    assert tail(kimi["total"]) == [2, 0, 1, 2]
+    assert tail(kimi["mentioned"]) == [1, 0, 1, 2]
+    assert tail(kimi["visibility_rate"]) == [50.0, None, 100.0, 100.0]
+    assert tail(kimi["avg_rank"]) == [1.0, None, 3.0, 3.0]
+    # 移动平均按窗口内的提及数/查询数计算，而不是各桶可见率的平均
+    assert tail(kimi["moving_avg"]) == [50.0, 50.0, 100.0, 100.0]
+    assert tail(kimi["delta"]) == [None, None, None, 0.0]
+    assert sum(kimi["total"]) == 5
+    
+    assert tail(doubao["total"]) == [0, 0, 0, 1]
+    assert doubao["visibility_rate"][-1] == 0.0
+    assert doubao["avg_rank"][-1] is None
+
+
+def test_group_by_and_filters(db):
+    save(db, 2)
+    save(db, 2, platform="doubao", mentioned=False, rank=0)
+    save(db, 2, brand="瑞幸咖啡")
+    
+    [by_brand, other] = db.get_time_series("1h", days=1, group_by=("brand",))["series"]
+    assert "platform" not in by_brand
+    assert (by_brand["brand"], by_brand["total"][-3], by_brand["mentioned"][-3]) == ("印暨咖啡", 2, 1)
+    assert (other["brand"], other["total"][-3]) == ("瑞幸咖啡", 1)
+    
+    [kimi] = db.get_time_series("1h", days=1, brands=["印暨咖啡"], platforms=["kimi"])["series"]
+    assert (kimi["brand"], kimi["platform"], sum(kimi["total"])) == ("印暨咖啡", "kimi", 1)
+    
+    with pytest.raises(ValueError):
+        db.get_time_series("1h", days=1, group_by=("keyword",))
+
+
+def test_daily_buckets_match_naive_count(db):
+    rng = np.random.default_rng(7)
+    expected = {}
+    day_now = int(time.time()) // 86400
+    for hours_ago in rng.integers(0, 24 * 6, size=60):
+        hours_ago = int(hours_ago)
+        platform = ["kimi", "doubao", "deepseek"][hours_ago % 3]
+        mentioned = bool(hours_ago % 2)
+        save(db, hours_ago, platform=platform, mentioned=mentioned, rank=1 if mentioned else 0)
+        # 逐条计算所在的天桶（从最后一个桶往前数）
+        days_back = day_now - (int(time.time()) // HOUR * HOUR - hours_ago * HOUR + 60) // 86400
+        counts = expected.setdefault(platform, {})
+        total, hits = counts.get(days_back, (0, 0))
+        counts[days_back] = (total + 1, hits + mentioned)
+    
+    result = db.get_time_series("1d", days=7)
+    n = len(result["buckets"])
+    assert {s["platform"] for s in result["series"]} == set(expected)
+    for series in result["series"]:
+        counts = expected[series["platform"]]
+        assert series["total"] == [counts.get(n - 1 - i, (0, 0))[0] for i in range(n)]
+        assert series["mentioned"] == [counts.get(n - 1 - i, (0, 0))[1] for i in range(n)]
+        for total, hits, rate in zip(series["total"], series["mentioned"], series["visibility_rate"]):
+            assert rate == (None if total == 0 else round(hits / total * 100, 2))
+
+
+def test_arrays_keep_nan_without_as_lists(db):
+    save(db, 0)
+    [series] = db.get_time_series("1h", days=1, as_lists=False)["series"]
+    assert isinstance(series["total"], np.ndarray)
+    assert np.isnan(series["visibility_rate"][0]) and series["visibility_rate"][-1] == 100.0
+
+
+def test_empty_database_has_buckets_but_no_series(db):
+    result = db.get_time_series("1d", days=7)
+    assert result["series"] == [] and len(result["buckets"]) == 8
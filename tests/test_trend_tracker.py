@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""基于EWMA水平值与斜率的热词趋势方向"""
+
+import pytest
+
+from hotwords_crawler import HotwordStore, TrendTracker
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HotwordStore(str(tmp_path / "hotwords.db"))
+    yield store
+    store.close()
+
+
+def make_tracker(store):
+    return TrendTracker(store, alpha=0.5, beta=0.3)
+
+
+def test_first_observation_is_rising_and_saved(store):
+    tracker = make_tracker(store)
+    assert tracker.observe("淄博烧烤", 50) == '上升'
+    store.flush()
+    state = store.trend_state("淄博烧烤")
+    assert (state['level'], state['slope'], state['samples']) == (50, 0, 1)
+
+
+def test_holt_update(store):
+    tracker = make_tracker(store)
+    tracker.observe("淄博烧烤", 50)
+    tracker.observe("淄博烧烤", 60)
+    store.flush()
+    state = store.trend_state("淄博烧烤")
+    assert state['level'] == pytest.approx(55.0)
+    assert state['slope'] == pytest.approx(1.5)
+    assert state['last_heat'] == 60 and state['samples'] == 2
+
+
+@pytest.mark.parametrize("second, direction", [
+    (64, '上升'),
+    (50, '平稳'),
+    (70, '飙升'),
+    (60, '平稳'),
+])
+def test_direction_after_rise_or_jump(store, second, direction):
+    tracker = make_tracker(store)
+    tracker.observe("淄博烧烤", 50)
+    assert tracker.observe("淄博烧烤", second) == direction
+
+
+def test_falling_heat(store):
+    tracker = make_tracker(store)
+    tracker.observe("围炉煮茶", 80)
+    assert tracker.observe("围炉煮茶", 60) == '下降'
+
+
+def test_preview_does_not_update_state(store):
+    tracker = make_tracker(store)
+    tracker.observe("淄博烧烤", 50)
+    assert tracker.observe("淄博烧烤", 90, update=False) == '飙升'
+    assert tracker.observe("淄博烧烤", 90, update=False) == '飙升'
+    store.flush()
+    assert store.trend_state("淄博烧烤")['samples'] == 1
+    history = store._conn.execute("SELECT heat FROM heat_history WHERE keyword = ?", ("淄博烧烤",)).fetchall()
+    assert history == [(50,)]
+
+
+def test_state_is_shared_across_trackers(store):
+    make_tracker(store).observe("淄博烧烤", 50)
+    store.flush()
+    assert make_tracker(store).observe("淄博烧烤", 80) == '飙升'